@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+what every public MCP23017 call costs on the wire and in time
+
+runs each operation against EmulatedSMBus (clean and bugged) and reports
+ops/sec, bus transactions per op, retries per op and the time an op would
+keep a real bus busy (at --bus-hz, on a virtual clock so it costs nothing).
+a result can be saved as baseline and later runs compared against it:
+
+    python benchmarks/bench_board.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_board.py --compare benchmarks/baseline.json
+
+the comparison only looks at what goes over the wire, which is the same on
+every machine.  ops/sec depend on the machine, --check-speed keeps them in
+the baseline and compares them too, against a baseline of the same machine
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from typing import Callable, Dict, List, NamedTuple
+
+from mcp23017.bus_timing import BusTiming, VirtualClock
+from mcp23017.emulated_smbus import EmulatedSMBus
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.verification import Backoff, VerifyAlways
+
+
+class BenchI2C(I2C):
+    """
+    counts transactions, a block transfer is one transaction
+    """
+
+    def __init__(self, smbus):
+        super().__init__(smbus)
+        self.transactions = 0
+        self.retries = 0
+
+    def write(self, address, register, value, retry=0):
+        self.transactions += 1
+        self.retries += retry > 0
+        super().write(address, register, value, retry)
+
+    def read(self, address, register=None):
+        self.transactions += 1
+        return super().read(address, register)
+
+    def write_block(self, address, register, values, retry=0):
+        self.transactions += 1
+        self.retries += retry > 0
+        super().write_block(address, register, values, retry)
+
+    def read_block(self, address, register, length):
+        self.transactions += 1
+        return super().read_block(address, register, length)
+
+
+class Result(NamedTuple):
+    ops_per_s: float
+    transactions_per_op: float
+    retries_per_op: float
+    bus_us_per_op: float
+
+
+def _toggle(board: MCP23017) -> Callable[[int], None]:
+    return lambda n: board.gpio_digital_write(n % 16, n % 2)
+
+
+# name -> function making the operation for a board, the operation gets the
+# number of the call
+OPERATIONS: Dict[str, Callable[[MCP23017], Callable[[int], None]]] = {
+    "gpio_digital_write": _toggle,
+    "gpio_digital_read": lambda b: lambda n: b.gpio_digital_read(n % 16),
+    "gpio_digital_write_all": lambda b: lambda n: b.gpio_digital_write_all(n % 2),
+    "gpio_digital_read_all": lambda b: lambda n: b.gpio_digital_read_all(),
+    "set_gpio_mode": lambda b: lambda n: b.set_gpio_mode(
+        b.Consts.OUTPUT, n % 16, set_low=False
+    ),
+    "set_gpio_mode_all": lambda b: lambda n: b.set_gpio_mode_all(
+        b.Consts.OUTPUT, set_all_low=False
+    ),
+    "get_gpio_mode_all": lambda b: lambda n: b.get_gpio_mode_all(),
+    "set_all_interrupt": lambda b: lambda n: b.set_all_interrupt(n % 2),
+    "set_interrupt": lambda b: lambda n: b.set_interrupt(n % 16, n % 2),
+    "set_interrupt_mirror": lambda b: lambda n: b.set_interrupt_mirror(n % 2),
+    "read_interrupt_state": lambda b: lambda n: b.read_interrupt_state(),
+}
+
+BOARD_VARIANTS: Dict[str, dict] = {
+    "plain": {},
+    "shadowed": {"shadow_registers": True},
+}
+
+
+def bench(operation: str, bugged: bool, board_kwargs: dict,
+          duration_s: float, bus_hz: int = 400_000) -> Result:
+    """
+    run one operation for about :duration_s:
+    """
+    timing = BusTiming(bus_hz, VirtualClock())
+    i2c = BenchI2C(EmulatedSMBus(1, bugged=bugged, timing=timing, seed=0))
+    # no pauses, we want the cost of the calls not of the sleeps
+    board = MCP23017(
+        i2c, 0x20, verification=VerifyAlways(Backoff(0)), **board_kwargs
+    )
+    op = OPERATIONS[operation](board)
+
+    # warm up, fills the shadow
+    for n in range(16):
+        op(n)
+    i2c.transactions = i2c.retries = 0
+    timing.reset()
+
+    n = 0
+    started = time.perf_counter()
+    deadline = started + duration_s
+    while True:
+        # check the clock every few calls only
+        for _ in range(16):
+            op(n)
+            n += 1
+        if time.perf_counter() >= deadline:
+            break
+    elapsed = time.perf_counter() - started
+
+    return Result(
+        n / elapsed, i2c.transactions / n, i2c.retries / n,
+        timing.bus_s / n * 1e6,
+    )
+
+
+def run(duration_s: float, bus_hz: int = 400_000) -> Dict[str, dict]:
+    """
+    :return: "operation/variant/bus" -> Result as dict
+    """
+    results = {}
+    for operation in OPERATIONS:
+        for variant, board_kwargs in BOARD_VARIANTS.items():
+            for bugged in (False, True):
+                key = f"{operation}/{variant}/{'bugged' if bugged else 'clean'}"
+                results[key] = bench(
+                    operation, bugged, board_kwargs, duration_s, bus_hz
+                )._asdict()
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict],
+            tolerance: float, check_speed: bool = False) -> List[str]:
+    """
+    :param tolerance: part of the baseline ops/sec a run may lose
+    :param check_speed: compare ops/sec as well, if the baseline has them
+
+    :return: the regressions as text
+    """
+    regressions = []
+    for key, base in baseline.items():
+        if key not in results:
+            continue
+        now = results[key]
+
+        # the wire cost is exact on a clean bus
+        if key.endswith("/clean") \
+                and now["transactions_per_op"] > base["transactions_per_op"] + 1e-9:
+            regressions.append(
+                f"{key}: {now['transactions_per_op']:.2f} transactions/op, "
+                + f"was {base['transactions_per_op']:.2f}"
+            )
+        if key.endswith("/clean") \
+                and now["retries_per_op"] > base["retries_per_op"] + 1e-9:
+            regressions.append(
+                f"{key}: {now['retries_per_op']:.3f} retries/op, "
+                + f"was {base['retries_per_op']:.3f}"
+            )
+        if key.endswith("/clean") and "bus_us_per_op" in base \
+                and now["bus_us_per_op"] > base["bus_us_per_op"] + 1e-6:
+            regressions.append(
+                f"{key}: {now['bus_us_per_op']:.1f} bus us/op, "
+                + f"was {base['bus_us_per_op']:.1f}"
+            )
+        if check_speed and "ops_per_s" in base \
+                and now["ops_per_s"] < base["ops_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: {now['ops_per_s']:.0f} ops/s, "
+                + f"was {base['ops_per_s']:.0f}"
+            )
+    return regressions
+
+
+def format_results(results: Dict[str, dict]) -> str:
+    lines = [
+        f"{'operation':48} {'ops/s':>10} {'trans/op':>9} {'retry/op':>9}"
+        + f" {'bus us/op':>10}"
+    ]
+    for key, r in results.items():
+        lines.append(
+            f"{key:48} {r['ops_per_s']:10.0f} "
+            + f"{r['transactions_per_op']:9.2f} {r['retries_per_op']:9.3f}"
+            + f" {r['bus_us_per_op']:10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=0.2,
+                        help="seconds per operation and variant")
+    parser.add_argument("--bus-hz", type=int, default=400_000,
+                        help="SCL frequency the bus time is counted for")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--check-speed", action="store_true",
+                        help="save and compare ops/sec too, only for "
+                        + "baselines of this machine")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="ops/sec a run may lose against the baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.duration, args.bus_hz)
+    print(format_results(results))
+
+    if args.save_baseline:
+        saved = results if args.check_speed else {
+            key: {k: v for k, v in r.items() if k != "ops_per_s"}
+            for key, r in results.items()
+        }
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(
+                results, json.load(f), args.tolerance, args.check_speed
+            )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,22 @@ from . import mcp23017
 from . import emulated_smbus
 from . import i2c
 from . import logging_modes
+from . import async_i2c
+from . import async_mcp23017
+from . import scheduler
+from . import verification
+from . import interrupts
+from . import scanner
+from . import tracer
+from . import stats
+from . import bus_timing
+from . import faults
+from . import executor
+from . import config
+from . import sequencer
+from . import pwm
+from . import debounce
+from . import recorder
 
 
 board_types = {
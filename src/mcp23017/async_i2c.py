@@ -0,0 +1,118 @@
+"""
+asyncio version of the layer between an smbus and other code
+"""
+
+import asyncio
+import logging
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .helper import GenericByteT
+from .i2c import I2C
+from .recorder import Recorder
+from .stats import BusStats
+from .tracer import Tracer
+
+
+class AsyncI2C:
+    """
+    awaitable access to one smbus
+
+    the smbus calls block, so they run in a dedicated executor.  an asyncio
+    lock keeps the tasks of the loop from talking over each other, so use
+    one instance per bus.  read-modify-writes go in a :transaction:
+    """
+
+    def __init__(self, smbus, executor: Optional[Executor] = None,
+                 tracer: Optional[Tracer] = None,
+                 stats: Optional[BusStats] = None,
+                 recorder: Optional[Recorder] = None):
+        """
+        :param smbus:
+        :param executor: where the blocking calls run, a single worker
+            thread if None
+        :param tracer: see :I2C:
+        :param stats: see :I2C:, async boards count their retries there too
+        :param recorder: see :I2C:
+        """
+        self.lg = logging.getLogger(self.__class__.__name__)
+
+        # all the actual talking is done by the sync layer
+        self.i2c = I2C(smbus, tracer=tracer, stats=stats, recorder=recorder)
+        self.lock = asyncio.Lock()
+        # address -> lock of the board, see :transaction:
+        self._address_locks: Dict[int, asyncio.Lock] = {}
+
+        self._own_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=self.__class__.__name__
+        )
+
+    @property
+    def stats(self):
+        """the stats of the sync layer, see :I2C:"""
+        return self.i2c.stats
+
+    async def _run(self, func: Callable, *args):
+        """
+        run a blocking call in the executor, one at a time
+        """
+        async with self.lock:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, func, *args
+            )
+
+    def transaction(self, address: GenericByteT) -> asyncio.Lock:
+        """
+        several operations with one board that no other transaction with
+        it gets in between::
+
+            async with i2c.transaction(0x20):
+                value = await i2c.read(0x20, register)
+                await i2c.write(0x20, register, value | 1)
+
+        unlike :I2C.transaction: plain writes do not wait for it, and it
+        can not be nested, asyncio locks are not reentrant
+
+        :param address: the board
+        """
+        lock = self._address_locks.get(address)
+        if lock is None:
+            lock = self._address_locks[address] = asyncio.Lock()
+        return lock
+
+    async def update_bits(self, address: GenericByteT, register: GenericByteT,
+                          mask: int, value: int) -> int:
+        """
+        see :I2C.update_bits:
+        """
+        async with self.transaction(address):
+            before = await self.read(address, register)
+            after = (before & ~mask) | (value & mask)
+            if after != before:
+                await self.write(address, register, after)
+            return after
+
+    async def write(self, address: GenericByteT, register: GenericByteT,
+                    value: GenericByteT, retry: int = 0) -> None:
+        await self._run(self.i2c.write, address, register, value, retry)
+
+    async def read(self, address: GenericByteT,
+                   register: Optional[GenericByteT] = None):
+        return await self._run(self.i2c.read, address, register)
+
+    async def write_block(self, address: GenericByteT, register: GenericByteT,
+                          values: Sequence[GenericByteT], retry: int = 0) -> None:
+        await self._run(self.i2c.write_block, address, register, values, retry)
+
+    async def read_block(self, address: GenericByteT, register: GenericByteT,
+                         length: int) -> List[GenericByteT]:
+        return await self._run(self.i2c.read_block, address, register, length)
+
+    def close(self) -> None:
+        """
+        stop the executor, if we made it ourselves
+        """
+        if self._own_executor:
+            self.executor.shutdown(wait=True)
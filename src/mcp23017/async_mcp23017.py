@@ -0,0 +1,525 @@
+"""
+asyncio version of the MCP23017 board
+"""
+
+import asyncio
+
+from typing import List, Optional
+
+from .async_i2c import AsyncI2C
+from .helper import h
+from .mcp23017 import MCP23017
+from .verification import WriteCheck
+
+from . import logging_modes
+
+
+class AsyncMCP23017(MCP23017):
+    """
+    same api as :MCP23017:, but everything that talks to the board is a
+    coroutine and the retries wait with asyncio.sleep
+
+    constants, pin and register lookups, the shadow and the verification
+    policy are shared with the sync board, only the io is done here.
+    :BackgroundReconcile: needs a sync board, it can not be used here
+    """
+
+    def __init__(self, i2c: AsyncI2C, address, **kwargs) -> None:
+        """
+        :param i2c: the bus the board is on
+        :param address:
+        :param kwargs: see :MCP23017:
+        """
+        super().__init__(i2c, address, **kwargs)
+
+    async def set_gpio_mode(self, mode, gpio: int,
+                            set_low: bool = True) -> None:
+        register, rel_gpio = self.get_register_gpio_tuple(
+            self.Consts.Register.IODIR, gpio
+        )
+
+        async with self._transaction():
+            await self.write(register, await self.get_bit_enabled(
+                register, rel_gpio, True if mode is self.Consts.INPUT else False
+            ))
+
+        if mode == self.Consts.OUTPUT and set_low:
+            await self.gpio_digital_write(gpio, self.Consts.LOW)
+
+    async def set_gpio_mode_all(self, mode,
+                                set_all_low: bool = True) -> None:
+        await self.write_pair(self.Consts.Register.IODIR, [mode, mode])
+
+        if mode == self.Consts.OUTPUT and set_all_low:
+            await self.gpio_digital_write_all(self.Consts.LOW)
+
+    async def get_gpio_mode_all(self) -> List[int]:
+        return await self.read_pair(self.Consts.Register.IODIR)
+
+    async def read(self, register, use_shadow: bool = True):
+        if use_shadow and self.shadow_registers \
+                and register in self.SHADOWED_REGISTERS:
+            if register not in self._shadow:
+                self._shadow[register] = await self.i2c.read(
+                    self.address, register
+                )
+            return self._shadow[register]
+
+        return await self.i2c.read(self.address, register)
+
+    async def resync_shadow(self) -> None:
+        self._shadow = {
+            reg: await self.i2c.read(self.address, reg)
+            for reg in sorted(self.SHADOWED_REGISTERS)
+        }
+
+    async def write(self, reg, value,
+                    check_register: bool | int = True,
+                    desired_value: Optional[int] = None,
+                    check_mask: Optional[int | bool] = None,
+                    check_mask_register: Optional[int] = None,
+                    ) -> None:
+        """see :MCP23017.write:
+        """
+        if self.validate and reg not in self.Consts.Register.lookup:
+            raise ValueError(
+                f"register {h(reg)} is not a valid register to write to"
+            )
+
+        if isinstance(check_register, bool):
+            check_register = reg if check_register else False
+        if desired_value is None:
+            desired_value = value
+
+        if check_mask is True and check_mask_register is None:
+            raise ValueError(
+                f"we need a mask location if {check_mask=} and no mask is provided"
+            )
+
+        await self._bus_write((reg,), (value,))
+
+        if check_register is False:
+            self._shadow_written(reg, value)
+            return
+
+        await self._verify(WriteCheck(
+            (reg,), (value,), (check_register,), (desired_value,),
+            masks=None if check_mask is None or isinstance(check_mask, bool)
+            else (check_mask,),
+            mask_registers=(check_mask_register,) if check_mask is True else None,
+        ))
+
+    async def read_pair(self, registers: tuple[int, int],
+                        use_shadow: bool = True) -> List[int]:
+        if use_shadow and self.shadow_registers \
+                and all(reg in self._shadow for reg in registers):
+            return [self._shadow[reg] for reg in registers]
+
+        values = await self.i2c.read_block(
+            self.address, registers[0], len(registers)
+        )
+
+        if use_shadow and self.shadow_registers:
+            self._shadow.update(
+                (reg, value) for reg, value in zip(registers, values)
+                if reg in self.SHADOWED_REGISTERS
+            )
+
+        return values
+
+    async def write_pair(self, registers: tuple[int, int], values: List[int],
+                         check: bool = True,
+                         check_mask_registers: Optional[tuple[int, int]] = None,
+                         ) -> None:
+        """see :MCP23017.write_pair:
+        """
+        if self.validate and registers not in self.Consts.Register.register_tuples:
+            raise ValueError(
+                f"registers {registers} are not valid registers to write to"
+            )
+
+        await self._bus_write(registers, values)
+
+        if not check:
+            for reg, value in zip(registers, values):
+                self._shadow_written(reg, value)
+            return
+
+        await self._verify(WriteCheck(
+            registers, values, mask_registers=check_mask_registers
+        ))
+
+    async def read_registers(self, register: int, length: int,
+                             use_shadow: bool = True) -> List[int]:
+        return await self.read_pair(
+            tuple(range(register, register + length)), use_shadow=use_shadow
+        )
+
+    async def write_registers(self, register: int, values: List[int],
+                              check: bool = True) -> None:
+        """see :MCP23017.write_registers:
+        """
+        registers = tuple(range(register, register + len(values)))
+        await self._bus_write(registers, values)
+
+        if not check:
+            for reg, value in zip(registers, values):
+                self._shadow_written(reg, value)
+            return
+
+        await self._verify(WriteCheck(registers, values))
+
+    async def _verify(self, check: WriteCheck) -> None:
+        if self.verification.verify_now(check):
+            await self._write_checked(check)
+        else:
+            for reg, value in zip(check.registers, check.values):
+                self._shadow_written(reg, value)
+
+    async def _check_write(self, check: WriteCheck) -> bool:
+        actual = await self._read_registers(
+            check.check_registers, use_shadow=False
+        )
+        desired = check.desired
+
+        masks = check.masks
+        if check.mask_registers is not None:
+            masks = await self._read_registers(check.mask_registers)
+
+        if masks is not None:
+            actual = [a & ~m for a, m in zip(actual, masks)]
+            desired = [d & ~m for d, m in zip(desired, masks)]
+
+        return actual == desired
+
+    async def _write_checked(self, check: WriteCheck) -> None:
+        stats = self.i2c.stats
+        bus_error: Optional[IOError] = None
+
+        try:
+            for try_n in range(self.write_retries + 1):
+                try:
+                    written = await self._check_write(check)
+                except IOError as exc:
+                    self.lg.debug("reading back %s at %#x failed: %s",
+                                  check, self.address, exc)
+                    bus_error, written = exc, False
+
+                if written:
+                    self.lg.hw_debug(
+                        "needed %s tries to write at %#x %s",
+                        try_n, self.address, check
+                    )
+                    for reg, value in zip(check.registers, check.values):
+                        self._shadow_written(reg, value)
+                    return
+
+                if stats is not None:
+                    stats.record_verify_failure(self.address, check.registers[0])
+                if try_n == self.write_retries:
+                    break
+                if stats is not None:
+                    stats.record_retry(self.address, check.registers[0])
+
+                await asyncio.sleep(self.verification.backoff.delay(try_n))
+                try:
+                    await self._send(check, retry=try_n + 1)
+                except IOError as exc:
+                    self.lg.debug("resending %s at %#x failed: %s",
+                                  check, self.address, exc)
+                    bus_error = exc
+
+            if stats is not None:
+                stats.record_failed_write(self.address, check.registers[0])
+
+            raise IOError(
+                f"checked {self.write_retries + 1} times, "
+                + f"can't write {check}, "
+                + f"maybe the board at {h(self.address)} is broken"
+            ) from bus_error
+        except IOError:
+            self._shadow_unknown(check.registers)
+            raise
+
+    async def _bus_write(self, registers: tuple, values, retry: int = 0) -> None:
+        """see :MCP23017._bus_write:
+        """
+        self.invalidate_inputs(registers)
+        try:
+            if len(registers) == 1:
+                await self.i2c.write(
+                    self.address, registers[0], values[0], retry=retry
+                )
+            else:
+                await self.i2c.write_block(
+                    self.address, registers[0], values, retry=retry
+                )
+        except IOError:
+            self._shadow_unknown(registers)
+            raise
+        finally:
+            self.invalidate_inputs(registers)
+
+    async def _send(self, check: WriteCheck, retry: int = 0) -> None:
+        await self._bus_write(check.registers, check.values, retry=retry)
+
+    async def _read_registers(self, registers: tuple,
+                              use_shadow: bool = True) -> List[int]:
+        if len(registers) == 1:
+            return [await self.read(registers[0], use_shadow=use_shadow)]
+        return await self.read_pair(registers, use_shadow=use_shadow)
+
+    async def _read_inputs(self, registers: tuple,
+                           max_age: Optional[float]) -> List[int]:
+        if max_age is None:
+            return await self._read_registers(registers)
+
+        cached = self._cached_inputs(registers, max_age)
+        if cached is not None:
+            return cached
+
+        generation = self._inputs_generation
+        read_at = self.clock()
+        values = await self._read_registers(registers)
+        self._store_inputs(generation, read_at, registers, values)
+        return values
+
+    async def verify_pending(self) -> None:
+        """see :MCP23017.verify_pending:
+        """
+        errors = []
+        async with self._transaction():
+            for check in self.verification.take_pending():
+                if self.verification.superseded(check):
+                    continue
+                try:
+                    await self._write_checked(check)
+                except IOError as exc:
+                    errors.append(exc)
+
+        if errors:
+            raise errors[0]
+
+    async def _mask_inputs(self, v, io_reg: int):
+        return self._without_inputs(
+            v, await self.read(self._get_register_mask_for_io_register(io_reg))
+        )
+
+    async def get_bit_enabled(self, reg, gpio, enable) -> int:
+        return self._with_bit(await self.read(reg), gpio, enable)
+
+    async def gpio_digital_write(self, gpio, state: bool) -> None:
+        state = self._invert_io(state, max_v=1)
+
+        register, rel_gpio = self.get_register_gpio_tuple(
+            self.Consts.Register.GPIO, gpio
+        )
+        base_register = self._get_olat_for_gpio_register(register) \
+            if self.shadow_registers else register
+        async with self._transaction():
+            to_write = await self._mask_inputs(
+                await self.get_bit_enabled(base_register, rel_gpio, state),
+                register
+            )
+            await self.write(
+                register, to_write,
+                desired_value=to_write,
+                check_register=True,
+                check_mask=True,
+                check_mask_register=self.get_mask_reg(register),
+            )
+
+    async def gpio_digital_read(self, gpio,
+                                max_age: Optional[float] = None) -> bool:
+        register, rel_gpio = self.get_register_gpio_tuple(
+            self.Consts.Register.GPIO, gpio
+        )
+        if max_age is None:
+            bits = await self.read(register)
+        else:
+            bits = (await self._read_inputs((register,), max_age))[0]
+
+        return bool(self._invert_io((bits & (1 << rel_gpio)) > 0, max_v=1))
+
+    async def gpio_digital_read_all(self,
+                                    max_age: Optional[float] = None) -> List[int]:
+        registers = self.Consts.Register.GPIO
+        if max_age is None:
+            values = await self.read_pair(registers)
+        else:
+            values = await self._read_inputs(registers, max_age)
+        return [self._invert_io(v) for v in values]
+
+    async def gpio_digital_write_all(self, state: bool):
+        to_write = self._invert_io(self.Consts.HIGH if state else self.Consts.LOW)
+
+        await self.write_pair(
+            self.Consts.Register.GPIO,
+            [to_write, to_write],
+            check=True,
+            check_mask_registers=self.Consts.Register.Mask["GPIO"],
+        )
+
+    async def read_port(self, max_age: Optional[float] = None) -> int:
+        low, high = await self.gpio_digital_read_all(max_age)
+        return low | high << self.Consts.Register.bit_size
+
+    async def write_port(self, mask: int, value: int, check: bool = True) -> None:
+        """see :MCP23017.write_port:
+        """
+        if self.validate and not (0 <= mask <= 0xFFFF and 0 <= value <= 0xFFFF):
+            raise ValueError(f"{mask=:#x} and {value=:#x} must be 16 bit words")
+
+        bits = self.Consts.Register.bit_size
+        max_v = self.Consts.Register.max_value
+        banks = [bank for bank in (0, 1) if mask >> bank * bits & max_v]
+        if not banks:
+            return
+
+        gpio = tuple(self.Consts.Register.GPIO[bank] for bank in banks)
+        modes = tuple(self.Consts.Register.IODIR[bank] for bank in banks)
+        bank_masks = [mask >> bank * bits & max_v for bank in banks]
+        bank_values = [
+            self._invert_io(value >> bank * bits & max_v) for bank in banks
+        ]
+
+        async with self._transaction():
+            if all(m == max_v for m in bank_masks):
+                before = [0] * len(banks)
+            else:
+                before = await self._read_registers(tuple(
+                    self._get_olat_for_gpio_register(reg) for reg in gpio
+                ) if self.shadow_registers else gpio)
+
+            to_write = [
+                self._without_inputs((b & ~m) | (v & m), mode)
+                for b, m, v, mode in zip(
+                    before, bank_masks, bank_values,
+                    await self._read_registers(modes)
+                )
+            ]
+
+            if len(banks) == 2:
+                await self.write_pair(
+                    gpio, to_write, check=check, check_mask_registers=modes
+                )
+            else:
+                await self.write(
+                    gpio[0], to_write[0],
+                    check_register=check,
+                    desired_value=to_write[0],
+                    check_mask=True,
+                    check_mask_register=modes[0],
+                )
+
+    async def stream_port(self, bank: int, values, check: bool = True,
+                          chunk: int = MCP23017.MAX_BLOCK) -> int:
+        """see :MCP23017.stream_port:
+        """
+        if bank not in (0, 1):
+            raise ValueError(f"{bank=} has to be 0 or 1")
+        if not 1 <= chunk <= self.MAX_BLOCK:
+            raise ValueError(f"{chunk=} has to be between 1 and {self.MAX_BLOCK}")
+        if not len(values):
+            return 0
+
+        olat = self.Consts.Register.OLAT[bank]
+        iocon_reg = self.Consts.Register.IOCON[0]
+        seqop = 1 << self.Consts.SettingBit.SEQOP
+
+        async with self._transaction():
+            chunks = self._stream_chunks(
+                values, await self.read(self.Consts.Register.OLAT[1 - bank]),
+                chunk,
+            )
+
+            iocon = await self.read(iocon_reg)
+            if not iocon & seqop:
+                await self.write(iocon_reg, iocon | seqop, check_register=check)
+            self.invalidate_inputs((olat,))
+            try:
+                for block in chunks:
+                    await self.i2c.write_block(self.address, olat, block)
+            except BaseException:
+                self.invalidate_shadow(olat)
+                self.invalidate_inputs((olat,))
+                if not iocon & seqop:
+                    try:
+                        await self.write(iocon_reg, iocon, check_register=check)
+                    except IOError as exc:
+                        self.lg.error(
+                            "can't put back IOCON of %#x after the stream: %s",
+                            self.address, exc
+                        )
+                        self._shadow_unknown((iocon_reg,))
+                raise
+
+            self.invalidate_inputs((olat,))
+            if not iocon & seqop:
+                await self.write(iocon_reg, iocon, check_register=check)
+
+            last = chunks[-1][-1]
+            self._shadow_written(olat, last)
+            if check and await self.read(olat, use_shadow=False) != last:
+                await self.write(olat, last)
+
+        return len(chunks)
+
+    async def set_bit_enabled(self, reg, bit, enable) -> None:
+        async with self._transaction():
+            await self.write(reg, await self.get_bit_enabled(reg, bit, enable))
+
+    async def set_interrupt(self, gpio, enabled: bool) -> None:
+        register, rel_gpio = self.get_register_gpio_tuple(
+            self.Consts.Register.GPINTEN, gpio
+        )
+        await self.set_bit_enabled(register, rel_gpio, enabled)
+
+    async def set_interrupt_compare(self, gpio, compare: bool,
+                                    default_value: bool = False) -> None:
+        register, rel_gpio = self.get_register_gpio_tuple(
+            self.Consts.Register.DEFVAL, gpio
+        )
+        await self.set_bit_enabled(register, rel_gpio, default_value)
+
+        register, rel_gpio = self.get_register_gpio_tuple(
+            self.Consts.Register.INTCON, gpio
+        )
+        await self.set_bit_enabled(register, rel_gpio, compare)
+
+    async def read_interrupt_state(self) -> tuple[int, int]:
+        self.invalidate_inputs()
+        flags = await self.read_pair(self.Consts.Register.INTF)
+        captures = await self.read_pair(self.Consts.Register.INTCAP)
+
+        return (
+            flags[0] | flags[1] << self.Consts.Register.bit_size,
+            captures[0] | captures[1] << self.Consts.Register.bit_size,
+        )
+
+    async def set_all_interrupt(self, enabled):
+        value = 0xFF if enabled else 0x00
+        await self.write_pair(self.Consts.Register.GPINTEN, [value, value])
+
+    async def set_interrupt_mirror(self, enable):
+        for reg in self.Consts.Register.IOCON:
+            await self.set_bit_enabled(reg, self.Consts.SettingBit.MIRROR, enable)
+
+    async def read_interrupt_captures(self):
+        return tuple(
+            self._bits_as_list(v)
+            for v in await self.read_pair(self.Consts.Register.INTCAP)
+        )
+
+    async def read_interrupt_flags(self):
+        return [
+            self._bits_as_list(v)
+            for v in await self.read_pair(self.Consts.Register.INTF)
+        ]
+
+    @staticmethod
+    def _bits_as_list(value: int) -> List[str]:
+        """
+        same format as the sync board, lowest bit first
+        """
+        return list(reversed(f"{value:08b}"))
@@ -0,0 +1,136 @@
+"""
+what the transactions of an emulated bus would cost on the wire
+"""
+
+import threading
+import time
+
+from typing import Optional
+
+
+# a byte on the wire is 8 bits and the ACK/NACK
+BYTE_BITS = 9
+# START, repeated START and STOP take about a clock period each
+START_BITS = 1
+STOP_BITS = 1
+
+
+def write_bits(n_bytes: int) -> int:
+    """
+    :param n_bytes: data bytes after the register
+
+    :return: clock periods of START, address, register, data, STOP
+    """
+    return START_BITS + BYTE_BITS * (2 + n_bytes) + STOP_BITS
+
+
+def read_bits(n_bytes: int, register: bool = True) -> int:
+    """
+    :param n_bytes: data bytes read
+    :param register: False for reads at the address pointer (read_byte)
+
+    :return: clock periods of the register write, repeated START, address,
+        data, STOP
+    """
+    bits = START_BITS + BYTE_BITS * (1 + n_bytes) + STOP_BITS
+    if register:
+        # the write of the register and the repeated START
+        bits += BYTE_BITS * 2 + START_BITS
+    return bits
+
+
+class VirtualClock:
+    """
+    time that only goes on when someone says so
+
+    has the interface of time.monotonic and time.sleep as :now: and :sleep:,
+    so it can stand in for them
+    """
+
+    def __init__(self, start: float = 0.0) -> None:
+        self._now = start
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float) -> None:
+        if seconds < 0:
+            raise ValueError(f"{seconds=} can not go back in time")
+        with self._lock:
+            self._now += seconds
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(max(seconds, 0.0))
+
+
+class BusTiming:
+    """
+    charges every transaction of a bus its time on the wire
+
+    the bus is busy until the last transaction is through, a transaction
+    starting earlier waits for it.  on a :VirtualClock: the waiting moves
+    the clock, otherwise it really sleeps
+    """
+
+    def __init__(self, clock_hz: int = 100_000,
+                 clock: Optional[VirtualClock] = None) -> None:
+        """
+        :param clock_hz: SCL frequency, 100 kHz or 400 kHz for a MCP23017
+            (1.7 MHz in high speed mode)
+        :param clock: virtual time, None for real sleeps
+        """
+        if clock_hz <= 0:
+            raise ValueError(f"{clock_hz=} has to be positive")
+
+        self.clock_hz = clock_hz
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._free_at = 0.0
+
+        # what was charged so far
+        self.transactions = 0
+        self.bits = 0
+
+    @property
+    def bus_s(self) -> float:
+        """time the bus was busy"""
+        return self.bits / self.clock_hz
+
+    def _now(self) -> float:
+        return self.clock.now() if self.clock is not None else time.perf_counter()
+
+    def _wait_until(self, deadline: float) -> None:
+        if self.clock is not None:
+            self.clock.sleep(deadline - self.clock.now())
+            return
+
+        # time.sleep oversleeps by tens of us, that is a byte at 400 kHz,
+        # so the last bit of the wait spins
+        remaining = deadline - time.perf_counter()
+        if remaining > 2e-3:
+            time.sleep(remaining - 1e-3)
+        while time.perf_counter() < deadline:
+            time.sleep(0)
+
+    def charge(self, bits: int) -> None:
+        """
+        occupy the bus for :bits: clock periods and wait until they are over
+        """
+        with self._lock:
+            start = max(self._now(), self._free_at)
+            self._free_at = deadline = start + bits / self.clock_hz
+            self.transactions += 1
+            self.bits += bits
+        self._wait_until(deadline)
+
+    def write(self, n_bytes: int = 1) -> None:
+        self.charge(write_bits(n_bytes))
+
+    def read(self, n_bytes: int = 1, register: bool = True) -> None:
+        self.charge(read_bits(n_bytes, register))
+
+    def reset(self) -> None:
+        with self._lock:
+            self.transactions = 0
+            self.bits = 0
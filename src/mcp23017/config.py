@@ -0,0 +1,231 @@
+"""
+the whole setup of a board in one object, applied with as few
+transactions as possible
+"""
+
+from typing import Dict, List, NamedTuple, Tuple
+
+from .mcp23017 import MCP23017
+
+
+_R = MCP23017.Consts.Register
+_BANK = 1 << MCP23017.Consts.SettingBit.BANK
+_SEQOP = 1 << MCP23017.Consts.SettingBit.SEQOP
+# bit 0 of IOCON is not implemented
+_IOCON_MASK = 0xFE
+
+# the fields of BoardConfig and their registers
+_FIELDS = ("iodir", "ipol", "gpinten", "defval", "intcon", "iocon", "gppu", "olat")
+_PAIRS = (_R.IODIR, _R.IPOL, _R.GPINTEN, _R.DEFVAL, _R.INTCON, _R.IOCON, _R.GPPU,
+          _R.OLAT)
+
+# IODIR to GPPU can be read in one go, without touching INTF/INTCAP/GPIO
+# (reading those clears interrupts)
+_BLOCK_START = _R.IODIR[0]
+_BLOCK_LENGTH = _R.GPPU[1] + 1 - _BLOCK_START
+
+# a new transaction costs START, address, register and STOP, about two
+# bytes of a running burst, so gaps up to this are written through
+MAX_GAP = 2
+
+
+class BoardConfig(NamedTuple):
+    """
+    everything that can be set up on a MCP23017
+
+    the port registers are 16 bit words with GPA0 at bit 0, iocon is the
+    byte of IOCON.  the values go to the registers as they are, the
+    invert_io of the board does not apply.  the defaults are the power on
+    state of the chip
+    """
+    # 1 is input
+    iodir: int = 0xFFFF
+    ipol: int = 0
+    gpinten: int = 0
+    defval: int = 0
+    intcon: int = 0
+    iocon: int = 0
+    gppu: int = 0
+    olat: int = 0
+
+    def registers(self) -> Dict[int, int]:
+        """
+        :return: register -> byte, both IOCON addresses included
+        """
+        regs = {}
+        for field, (reg_a, reg_b) in zip(_FIELDS, _PAIRS):
+            word = getattr(self, field)
+            if field == "iocon":
+                regs[reg_a] = regs[reg_b] = word & _IOCON_MASK
+            else:
+                regs[reg_a] = word & 0xFF
+                regs[reg_b] = word >> 8 & 0xFF
+        return regs
+
+    @classmethod
+    def from_registers(cls, regs: Dict[int, int]) -> "BoardConfig":
+        """
+        :param regs: register -> byte, like :registers: returns it
+        """
+        return cls(**{
+            field: regs[reg_a] if field == "iocon"
+            else regs[reg_a] | regs[reg_b] << 8
+            for field, (reg_a, reg_b) in zip(_FIELDS, _PAIRS)
+        })
+
+    def validate(self) -> None:
+        """
+        :raises ValueError: if the board could not work with this
+        """
+        for field in _FIELDS:
+            limit = 0xFF if field == "iocon" else 0xFFFF
+            if not 0 <= getattr(self, field) <= limit:
+                raise ValueError(
+                    f"{field}={getattr(self, field):#x} does not fit its register"
+                )
+        if self.iocon & _BANK:
+            raise ValueError("the board only works with IOCON.BANK=0")
+
+
+def _registers_from_reads(block: List[int], olat: List[int]) -> Dict[int, int]:
+    regs = dict(zip(range(_BLOCK_START, _BLOCK_START + _BLOCK_LENGTH), block))
+    regs.update(zip(_R.OLAT, olat))
+    return regs
+
+
+def plan(current: Dict[int, int], target: Dict[int, int],
+         sequential: bool) -> List[Tuple[int, List[int]]]:
+    """
+    the writes that turn :current: into :target:, IOCON is left out
+
+    :param current: register -> byte on the board
+    :param target: register -> byte wanted
+    :param sequential: IOCON.SEQOP is clear during the writes, so bursts
+        can span several registers.  in byte mode they stay on a pair
+
+    :return: [(first register, bytes)], one transaction each
+    """
+    changed = sorted(
+        reg for reg, value in target.items()
+        if reg not in _R.IOCON and current[reg] != value
+    )
+
+    writes: List[Tuple[int, List[int]]] = []
+    if not sequential:
+        for reg_a, reg_b in _PAIRS:
+            if reg_a in changed and reg_b in changed:
+                writes.append((reg_a, [target[reg_a], target[reg_b]]))
+            elif reg_a in changed or reg_b in changed:
+                reg = reg_a if reg_a in changed else reg_b
+                writes.append((reg, [target[reg]]))
+        return writes
+
+    for reg in changed:
+        if writes:
+            first, values = writes[-1]
+            last = first + len(values) - 1
+            if reg - last - 1 <= MAX_GAP:
+                # what is in between is written as it is, IOCON too
+                values.extend(
+                    current[r] if r in _R.IOCON else target[r]
+                    for r in range(last + 1, reg + 1)
+                )
+                continue
+        writes.append((reg, [target[reg]]))
+    return writes
+
+
+def _writes(current: Dict[int, int],
+            config: BoardConfig) -> List[Tuple[int, List[int]]]:
+    """
+    :return: all writes to apply :config:, IOCON placed so the bursts run
+        in sequential mode whenever they can
+    """
+    config.validate()
+    target = config.registers()
+
+    iocon_now = current[_R.IOCON[0]]
+    iocon_new = target[_R.IOCON[0]]
+    if iocon_now == iocon_new:
+        return plan(current, target, not iocon_now & _SEQOP)
+
+    if iocon_now & _SEQOP and not iocon_new & _SEQOP:
+        # leave byte mode first, then the rest can be bursts.  they go
+        # over IOCON with its new value
+        current = dict(current)
+        for reg in _R.IOCON:
+            current[reg] = iocon_new
+        return [(_R.IOCON[0], [iocon_new])] + plan(current, target, True)
+    return plan(current, target, not iocon_now & _SEQOP) \
+        + [(_R.IOCON[0], [iocon_new])]
+
+
+def read_config(board: MCP23017) -> BoardConfig:
+    """
+    what a board is set up to, from its shadow where it has it
+
+    two block reads in sequential mode, one per pair in byte mode
+    """
+    iocon = board.read(_R.IOCON[0])
+    if iocon & _SEQOP:
+        regs = {}
+        for pair in _PAIRS:
+            regs.update(zip(pair, board.read_pair(pair)))
+        return BoardConfig.from_registers(regs)
+
+    return BoardConfig.from_registers(_registers_from_reads(
+        board.read_registers(_BLOCK_START, _BLOCK_LENGTH),
+        board.read_pair(_R.OLAT),
+    ))
+
+
+def apply(board: MCP23017, config: BoardConfig, check: bool = True) -> int:
+    """
+    set up a board, reads its state once and writes only what differs
+
+    registers next to each other are written in one burst, with the
+    verification policy of the board checking every burst
+
+    :param board:
+    :param config: what the board should be set up to
+    :param check: verify the writes, see :MCP23017.write:
+
+    :return: number of write transactions
+    """
+    writes = _writes(read_config(board).registers(), config)
+    for register, values in writes:
+        if len(values) == 1:
+            board.write(register, values[0], check_register=check)
+        else:
+            board.write_registers(register, values, check=check)
+    return len(writes)
+
+
+async def read_config_async(board) -> BoardConfig:
+    """
+    :read_config: for an :AsyncMCP23017:
+    """
+    iocon = await board.read(_R.IOCON[0])
+    if iocon & _SEQOP:
+        regs = {}
+        for pair in _PAIRS:
+            regs.update(zip(pair, await board.read_pair(pair)))
+        return BoardConfig.from_registers(regs)
+
+    return BoardConfig.from_registers(_registers_from_reads(
+        await board.read_registers(_BLOCK_START, _BLOCK_LENGTH),
+        await board.read_pair(_R.OLAT),
+    ))
+
+
+async def apply_async(board, config: BoardConfig, check: bool = True) -> int:
+    """
+    :apply: for an :AsyncMCP23017:
+    """
+    writes = _writes((await read_config_async(board)).registers(), config)
+    for register, values in writes:
+        if len(values) == 1:
+            await board.write(register, values[0], check_register=check)
+        else:
+            await board.write_registers(register, values, check=check)
+    return len(writes)
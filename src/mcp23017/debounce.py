@@ -0,0 +1,121 @@
+"""
+debouncing of whole 16 bit port samples with vertical counters
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+PORT_MASK = 0xFFFF
+N_PINS = 16
+
+
+class Debouncer:
+    """
+    debounces the 16 pins of a port at once
+
+    every pin has a counter of the samples in a row that differ from its
+    debounced state, when it reaches the stability count of the pin the
+    state follows.  the counters are kept vertically: bit k of every pin's
+    counter sits in the k-th word of :_planes:, so a sample is a handful of
+    integer operations no matter how many pins change
+
+    feed it the samples of anything periodic, :InputScanner: takes one per
+    board, or::
+
+        debouncer = Debouncer(counts=4)
+        for state in debouncer.filter(iter(board.read_port, None)):
+            ...
+    """
+
+    def __init__(self, counts: Union[int, Dict[int, int]] = 4,
+                 initial: Optional[int] = None) -> None:
+        """
+        :param counts: samples in a row a change has to be seen, for all pins
+            or gpio -> count with 1 for the pins that are left out
+        :param initial: debounced state to start with, the first sample
+            if None
+        """
+        if isinstance(counts, int):
+            counts = {gpio: counts for gpio in range(N_PINS)}
+
+        self._counts = [1] * N_PINS
+        self._thresholds: List[int] = []
+        self._planes: List[int] = []
+        for gpio, count in counts.items():
+            self._set(gpio, count)
+        self._build()
+
+        self.state: Optional[int] = initial
+
+    def _set(self, gpio: int, count: int) -> None:
+        if not 0 <= gpio < N_PINS:
+            raise ValueError(f"{gpio=} is not a pin of a port")
+        if count < 1:
+            raise ValueError(f"{count=} for {gpio=} has to be at least 1")
+        self._counts[gpio] = count
+
+    def _build(self) -> None:
+        """
+        turn the counts into threshold planes and reset the counters
+        """
+        n_planes = max(self._counts).bit_length()
+        self._thresholds = [
+            sum(1 << gpio for gpio, count in enumerate(self._counts)
+                if count >> k & 1)
+            for k in range(n_planes)
+        ]
+        self._planes = [0] * n_planes
+
+    def set_count(self, gpio: int, count: int) -> None:
+        """
+        change the stability count of one pin, the counters start over
+        """
+        self._set(gpio, count)
+        self._build()
+
+    def count(self, gpio: int) -> int:
+        return self._counts[gpio]
+
+    def reset(self, state: Optional[int] = None) -> None:
+        """
+        forget the counters, the next sample is taken as it is if :state:
+        is None
+        """
+        self._planes = [0] * len(self._planes)
+        self.state = state
+
+    def feed(self, sample: int) -> int:
+        """
+        :param sample: raw port as 16 bit word, GPA0 is bit 0
+
+        :return: the pins whose debounced state changed, as 16 bit word
+        """
+        if self.state is None:
+            self.state = sample & PORT_MASK
+            return 0
+
+        # the counters of pins that agree with their state go back to 0,
+        # the others count up by one
+        delta = (sample ^ self.state) & PORT_MASK
+        planes = self._planes
+        carry = delta
+        differs = 0
+        for k, plane in enumerate(planes):
+            new = (plane ^ carry) & delta
+            carry &= plane
+            planes[k] = new
+            differs |= new ^ self._thresholds[k]
+
+        reached = delta & ~differs
+        if reached:
+            self.state ^= reached
+            for k in range(len(planes)):
+                planes[k] &= ~reached
+        return reached
+
+    def filter(self, samples: Iterable[int]) -> Iterator[int]:
+        """
+        :return: the debounced state after every sample
+        """
+        for sample in samples:
+            self.feed(sample)
+            yield self.state
@@ -5,20 +5,39 @@ from .helper import h, GenericByteT
 import logging as lg
 from . import logging_modes
 
-from typing import Dict
+from typing import Callable, Dict, List, Optional, Sequence
 
+from .bus_timing import BusTiming
+from .faults import BitFlipNoise, FaultModel
+
+
+# the emulated device is a MCP23017, so block transfers follow its IOCON
+IOCON = 0x0A
+SEQOP = 1 << 5
 
 class EmulatedSMBus:
     """
     primitive smbus emulation to let i2c modules think
     they interacting  with something pysical
     """
-    def __init__(self, smbus_num, bugged: bool = False):
+    def __init__(self, smbus_num, bugged: bool = False,
+                 timing: Optional[BusTiming] = None, seed=None,
+                 fault_model: Optional[FaultModel] = None):
         """
         :param smbus_num: we ignore that one ig
-        :param bugged: let them clients work for once with some ***randomness***
+        :param bugged: let them clients work for once with some ***randomness***,
+            :BitFlipNoise: if no :fault_model: is given
+        :param timing: charges the transactions their wire time, see
+            :BusTiming:.  None makes them as fast as python is
+        :param seed: seed of the randomness of the faults, the same seed
+            gives the same faults
+        :param fault_model: what goes wrong on the bus, see :faults:
  
         """
+        if fault_model is None and bugged:
+            fault_model = BitFlipNoise()
+        bugged = fault_model is not None
+
         self.logger = lg.getLogger(
             f"EmulatedSMBus-{smbus_num}{'-bugged' if bugged else ''}"
         )
@@ -28,12 +47,13 @@ class EmulatedSMBus:
         self._data: Dict[int, Dict] = {}
         self._address = None
         self.bugged = bugged
+        self.fault_model = fault_model
+        self.rng = random.Random(seed)
+        self.timing = timing
 
         if self.bugged:
             self.logger.info("starting in bugged mode")
 
-        self._i = 1
-
 
     def _check_addr(self):
         """
@@ -47,47 +67,55 @@ class EmulatedSMBus:
         """
         write to a register
 
-        :param address: GPIO to OLAT write through
+        :param address:
         :param register:
         :param value:
 
         :return:
         """
-        self._i += 1
-        if True or self._i > 20:
-            self.logger.hw_debug(f"current state: {[(h(k), v) for k, v in self._data.items()]}")
-            self._i = 0
+        if self.timing is not None:
+            self.timing.write(1)
+        self._write_byte(address, register, value)
 
-        self.logger.hw_debug(f"write at {h(register)}: {h(value)}")
-        if self.bugged:
-            num_flips = min(
-                random.choices(
-                    list(range(5)),
-                    weights=[0.368, 0.368, 0.184, 0.069, 0.011]
-                )[0],
-                8
-            )
+    def _write_byte(self, address: hex, register: int, value: hex) -> None:
+        """
+        store a byte that arrived
 
-            mask = 0
-            while bin(mask).count('1') != num_flips:
-                mask = random.getrandbits(8)
+        :param address: GPIO to OLAT write through
+        :param register:
+        :param value:
 
-            self.logger.hw_debug(f"heheehehe!!, {hex(value ^ mask)} instead of {hex(value)}")
+        :return:
+        """
+        # dumping the state is expensive, only do it when someone looks
+        debug = self.logger.isEnabledFor(logging_modes.HW_DEBUG_lvl)
+        if debug:
+            self.logger.hw_debug(f"current state: {[(h(k), v) for k, v in self._data.items()]}")
 
-            value = value ^ mask
-            self.logger.hw_debug(f"-- writing {hex(value)} instead")
+        self.logger.hw_debug("write at %#x: %#x", register, value)
+        if self.fault_model is not None:
+            sent = value
+            value = self.fault_model.on_write(self.rng, address, register, value)
+            if value != sent:
+                self.logger.hw_debug("heheehehe!!, %#x instead of %#x", value, sent)
 
         if address not in self._data:
             self._data[address] = {}
         
         self._data[address][register] = value
 
-        self.logger.hw_debug(f"fter state: {[(h(k), v) for k, v in self._data.items()]}")
+        if debug:
+            self.logger.hw_debug(f"fter state: {[(h(k), v) for k, v in self._data.items()]}")
 
     def read_byte(self, adr: GenericByteT) -> dict[GenericByteT, GenericByteT]:
         # TODO: need to fill up till some level (edit: what??)
-        self.logger.hw_debug(f"reading everything at {adr=}: {self._data}")
-        return ad if adr in self._data and (ad := self._data[adr]) else 0
+        if self.timing is not None:
+            self.timing.read(1, register=False)
+        self.logger.hw_debug("reading everything at adr=%s: %s", adr, self._data)
+        if adr not in self._data or not self._data[adr]:
+            return 0
+        # every register goes through the faults like a read of its own
+        return {reg: self._read_byte(adr, reg) for reg in list(self._data[adr])}
 
     def read_byte_data(self, adr: GenericByteT, reg: int) -> int:
         """
@@ -96,22 +124,452 @@ class EmulatedSMBus:
 
         :return:
         """
+        if self.timing is not None:
+            self.timing.read(1)
+        return self._read_byte(adr, reg)
+
+    def _read_byte(self, adr: GenericByteT, reg: int) -> int:
         # check if we have access to a value
         if adr in self._data and reg in self._data[adr]:
             data = self._data[adr][reg]
         # we have to make sure we return something
         else:
             data = 0
+        if self.fault_model is not None:
+            data = self.fault_model.on_read(self.rng, adr, reg, data)
         self.logger.hw_debug(
-            f"reading from adr {h(adr)} at reg {h(reg)}: {data}"
+            "reading from adr %#x at reg %#x: %s", adr, reg, data
         )
         return data
 
 
+    def _next_register(self, address: GenericByteT, register: int) -> int:
+        """
+        where the address pointer goes after a byte of a block transfer
+
+        with IOCON.SEQOP set (byte mode) it toggles between the A/B pair,
+        otherwise it just increments
+
+        :param address: device we talk to
+        :param register: register of the last byte
+
+        :return: register for the next byte
+        """
+        if address in self._data and self._data[address].get(IOCON, 0) & SEQOP:
+            return register ^ 1
+        return register + 1
+
+    def write_i2c_block_data(self, address: GenericByteT, register: int,
+                             data: Sequence[int]) -> None:
+        """
+        write :data: starting at :register:
+
+        :param address:
+        :param register: first register
+        :param data: bytes to write
+
+        :return:
+        """
+        if self.timing is not None:
+            self.timing.write(len(data))
+        for value in data:
+            self._write_byte(address, register, value)
+            register = self._next_register(address, register)
+
+    def read_i2c_block_data(self, address: GenericByteT, register: int,
+                            length: int) -> List[int]:
+        """
+        :param address:
+        :param register: first register
+        :param length: number of bytes to read
+
+        :return: the bytes read
+        """
+        if self.timing is not None:
+            self.timing.read(length)
+        data = []
+        for _ in range(length):
+            data.append(self._read_byte(address, register))
+            register = self._next_register(address, register)
+        return data
+
+
+# the registers of a MCP23017 in BANK=0 order, A at the even index and B
+# right after it.  that is where the chip model keeps them, whatever BANK is
+_IODIR, _IPOL, _GPINTEN, _DEFVAL, _INTCON, _IOCON, _GPPU, _INTF, _INTCAP, \
+    _GPIO, _OLAT = range(0, 22, 2)
+_N_REGISTERS = 22
+
+_BANK = 1 << 7
+_MIRROR = 1 << 6
+# bit 0 of IOCON is not implemented and reads as 0
+_IOCON_MASK = 0xFE
+
+
+def _bank1_map() -> tuple:
+    # with BANK=1 port A sits at 0x00-0x0A and port B at 0x10-0x1A
+    m = [None] * 0x1B
+    for kind in range(_N_REGISTERS // 2):
+        m[kind] = 2 * kind
+        m[0x10 + kind] = 2 * kind + 1
+    return tuple(m)
+
+
+# bus register -> index in the chip, None if there is nothing
+_REGISTER_MAP = (tuple(range(_N_REGISTERS)), _bank1_map())
+
+# bus register -> next bus register of a sequential transfer.  BANK=0 wraps
+# after OLATB, BANK=1 goes from OLATA to IODIRB and from OLATB back to IODIRA
+_SEQUENTIAL_NEXT = (
+    tuple((r + 1) % _N_REGISTERS for r in range(_N_REGISTERS)),
+    tuple(
+        0x10 if r == 0x0A else 0x00 if r == 0x1A else r + 1
+        for r in range(0x1B)
+    ),
+)
+
+
+class _Chip:
+    """
+    state of one emulated MCP23017
+    """
+    __slots__ = ("regs", "bank", "driven", "levels", "pointer", "int_lines")
+
+    def __init__(self) -> None:
+        self.regs = bytearray(_N_REGISTERS)
+        # power on: everything is an input
+        self.regs[_IODIR] = self.regs[_IODIR + 1] = 0xFF
+        # 0 or 1, which register map is in use
+        self.bank = 0
+        # per port: pins the outside world drives and the level it drives,
+        # pins not driven float up to GPPU
+        self.driven = [0, 0]
+        self.levels = [0, 0]
+        # register of the next byte of a transfer without register
+        self.pointer = 0
+        # INTA, INTB active
+        self.int_lines = [False, False]
+
+
 class EmulatedSMBusMCP23017(EmulatedSMBus):
-      def wtf_write_byte_data(self, address: hex, reg: int, value: hex) -> None:
-        super().write_byte_data(address, reg, value)
+    """
+    register level model of MCP23017s on a bus
+
+    every device keeps its 22 registers in a bytearray in BANK=0 order and
+    the bus addresses are mapped onto it by IOCON.BANK.  what the chip does
+    is modeled as in the datasheet:
+
+    - IOCON is one register showing up at both its addresses, bit 0 reads 0
+    - writing GPIO writes OLAT, reading GPIO gives OLAT for outputs and the
+      pin level (inverted by IPOL) for inputs
+    - INTF and INTCAP are read only, reading GPIO or INTCAP of a port clears
+      its interrupt.  a pin compared to DEFVAL fires again right away if it
+      still differs
+    - INTA/INTB follow INTF of their port, or both ports with IOCON.MIRROR
+    - transfers go on from register to register (SEQOP clear) or stay on
+      the A/B pair (SEQOP set, BANK=0) or the register (SEQOP set, BANK=1)
+
+    the outside world sets input pins with :drive_pin: and :release_pin:,
+    the INT lines are a callback registered with :connect_interrupt:.
+
+    register access does not log and is a few bytearray operations, that is
+    around a million reads or writes per second in cpython, more on pypy
+    """
+
+    def __init__(self, smbus_num, bugged: bool = False, addresses=None,
+                 timing: Optional[BusTiming] = None, seed=None,
+                 fault_model: Optional[FaultModel] = None):
+        """
+        :param smbus_num:
+        :param bugged: see :EmulatedSMBus:
+        :param timing: see :EmulatedSMBus:
+        :param seed: see :EmulatedSMBus:
+        :param fault_model: see :EmulatedSMBus:, registers are the ones on
+            the bus, so they depend on IOCON.BANK
+        :param addresses: the boards that answer, others raise OSError like
+            a NACK would.  None lets every address answer
+        """
+        super().__init__(
+            smbus_num, bugged=bugged, timing=timing, seed=seed,
+            fault_model=fault_model,
+        )
+        self._chips: Dict[int, _Chip] = {}
+        self._addresses = None if addresses is None else frozenset(addresses)
+        # address -> callbacks for the INT lines
+        self._int_callbacks: Dict[int, List[Callable[[int], None]]] = {}
 
-        o_lat = reg - 2
-        if o_lat in {0x12, 0x13}:
-            super().write_byte_data(address, o_lat, value)
+    def _chip(self, address: int) -> _Chip:
+        chip = self._chips.get(address)
+        if chip is None:
+            if self._addresses is not None and address not in self._addresses:
+                raise OSError(f"no device at {address:#x}")
+            chip = self._chips[address] = _Chip()
+        return chip
+
+    # -- pins and interrupts
+
+    @staticmethod
+    def _port_value(chip: _Chip, port: int) -> int:
+        """
+        :return: what reading GPIO of :port: gives
+        """
+        r = chip.regs
+        inputs = r[_IODIR + port]
+        driven = chip.driven[port]
+        outside = (chip.levels[port] & driven) | (r[_GPPU + port] & ~driven)
+        pins = (r[_OLAT + port] & ~inputs) | (outside & inputs)
+        return (pins ^ (r[_IPOL + port] & inputs)) & 0xFF
+
+    def _update_interrupts(self, address: int, chip: _Chip, port: int,
+                           before: int) -> None:
+        """
+        look for interrupts after something could have changed :port:
+
+        :param before: GPIO of the port before the change
+        """
+        r = chip.regs
+        enabled = r[_GPINTEN + port] & r[_IODIR + port]
+        if not enabled:
+            return
+
+        after = self._port_value(chip, port)
+        compare = r[_INTCON + port]
+        fired = (
+            ((before ^ after) & ~compare) | ((after ^ r[_DEFVAL + port]) & compare)
+        ) & enabled
+        if not fired:
+            return
+
+        if not r[_INTF + port]:
+            # the capture is taken when the interrupt happens
+            r[_INTCAP + port] = after
+        r[_INTF + port] |= fired
+        self._update_int_lines(address, chip)
+
+    def _clear_interrupt(self, address: int, chip: _Chip, port: int) -> None:
+        r = chip.regs
+        if not r[_INTF + port]:
+            return
+        r[_INTF + port] = 0
+
+        # compared pins still differing fire again
+        value = self._port_value(chip, port)
+        fired = (value ^ r[_DEFVAL + port]) & r[_INTCON + port] \
+            & r[_GPINTEN + port] & r[_IODIR + port]
+        if fired:
+            r[_INTCAP + port] = value
+            r[_INTF + port] = fired
+        self._update_int_lines(address, chip)
+
+    def _update_int_lines(self, address: int, chip: _Chip) -> None:
+        r = chip.regs
+        a, b = bool(r[_INTF]), bool(r[_INTF + 1])
+        if r[_IOCON] & _MIRROR:
+            a = b = a or b
+
+        rising = (a and not chip.int_lines[0]) or (b and not chip.int_lines[1])
+        chip.int_lines[0], chip.int_lines[1] = a, b
+        if rising:
+            self.logger.hw_debug("interrupt at %#x", address)
+            for callback in self._int_callbacks.get(address, []):
+                callback(address)
+
+    def connect_interrupt(self, address: GenericByteT,
+                          callback: Callable[[int], None]) -> None:
+        """
+        :param address: the board
+        :param callback: called with the address when INTA or INTB of the
+            board goes active
+        """
+        self._int_callbacks.setdefault(address, []).append(callback)
+
+    def interrupt_active(self, address: GenericByteT, port=None) -> bool:
+        """
+        :param port: 0 for INTA, 1 for INTB, None for any
+
+        :return: True if the INT line is active
+        """
+        chip = self._chip(address)
+        if port is None:
+            return any(chip.int_lines)
+        return chip.int_lines[port]
+
+    def drive_pin(self, address: GenericByteT, pin: int, level: bool) -> None:
+        """
+        set the level the outside world puts on a pin
+
+        :param address: the board
+        :param pin: 0 (GPA0) to 15 (GPB7)
+        :param level: the level
+        """
+        chip = self._chip(address)
+        port, bit = divmod(pin, 8)
+        mask = 1 << bit
+
+        before = self._port_value(chip, port)
+        chip.driven[port] |= mask
+        if level:
+            chip.levels[port] |= mask
+        else:
+            chip.levels[port] &= ~mask
+        self._update_interrupts(address, chip, port, before)
+
+    def release_pin(self, address: GenericByteT, pin: int) -> None:
+        """
+        stop driving a pin, it floats to its pull-up (GPPU) or low
+
+        :param address: the board
+        :param pin: 0 (GPA0) to 15 (GPB7)
+        """
+        chip = self._chip(address)
+        port, bit = divmod(pin, 8)
+
+        before = self._port_value(chip, port)
+        chip.driven[port] &= ~(1 << bit)
+        self._update_interrupts(address, chip, port, before)
+
+    # -- register access
+
+    def _write_register(self, address: int, chip: _Chip, register: int,
+                        value: int) -> None:
+        register_map = _REGISTER_MAP[chip.bank]
+        index = register_map[register] if register < len(register_map) else None
+        if index is None:
+            return
+
+        kind = index & ~1
+        if kind == _IOCON:
+            value &= _IOCON_MASK
+            chip.regs[_IOCON] = chip.regs[_IOCON + 1] = value
+            chip.bank = 1 if value & _BANK else 0
+            self._update_int_lines(address, chip)
+            return
+        if kind == _INTF or kind == _INTCAP:
+            return
+        if kind == _GPIO:
+            index += _OLAT - _GPIO
+
+        r = chip.regs
+        port = index & 1
+        # most writes are to ports without interrupts, skip the work for them
+        if not (r[_GPINTEN + port] & r[_IODIR + port]) and kind != _GPINTEN \
+                and kind != _IODIR:
+            r[index] = value
+            return
+
+        before = self._port_value(chip, port)
+        r[index] = value
+        self._update_interrupts(address, chip, port, before)
+
+    def _read_register(self, address: int, chip: _Chip, register: int) -> int:
+        register_map = _REGISTER_MAP[chip.bank]
+        index = register_map[register] if register < len(register_map) else None
+        if index is None:
+            return 0
+
+        kind = index & ~1
+        if kind == _GPIO:
+            # _port_value, inlined for the most common read
+            r = chip.regs
+            port = index & 1
+            inputs = r[_IODIR + port]
+            driven = chip.driven[port]
+            outside = (chip.levels[port] & driven) | (r[_GPPU + port] & ~driven)
+            value = ((r[_OLAT + port] & ~inputs) | (outside & inputs)) \
+                ^ (r[_IPOL + port] & inputs)
+            value &= 0xFF
+            if r[_INTF + port]:
+                self._clear_interrupt(address, chip, port)
+            return value
+        if kind == _INTCAP:
+            value = chip.regs[index]
+            if chip.regs[_INTF + (index & 1)]:
+                self._clear_interrupt(address, chip, index & 1)
+            return value
+        return chip.regs[index]
+
+    @staticmethod
+    def _advance(chip: _Chip, register: int) -> int:
+        """
+        :return: the register after :register: in a transfer
+        """
+        if chip.regs[_IOCON] & SEQOP:
+            return register ^ 1 if chip.bank == 0 else register
+        sequential = _SEQUENTIAL_NEXT[chip.bank]
+        return sequential[register] if register < len(sequential) else 0
+
+    def _next_register(self, address: GenericByteT, register: int) -> int:
+        return self._advance(self._chip(address), register)
+
+    def write_byte_data(self, address: hex, register: int, value: hex) -> None:
+        chip = self._chips.get(address) or self._chip(address)
+        if self.timing is not None:
+            self.timing.write(1)
+        if self.fault_model is not None:
+            value = self.fault_model.on_write(self.rng, address, register, value)
+        self._write_register(address, chip, register, value & 0xFF)
+        chip.pointer = self._advance(chip, register)
+
+    def read_byte_data(self, adr: GenericByteT, reg: int) -> int:
+        chip = self._chips.get(adr) or self._chip(adr)
+        if self.timing is not None:
+            self.timing.read(1)
+        value = self._read_register(adr, chip, reg)
+        chip.pointer = self._advance(chip, reg)
+        if self.fault_model is not None:
+            value = self.fault_model.on_read(self.rng, adr, reg, value)
+        return value
+
+    def read_byte(self, adr: GenericByteT) -> int:
+        """
+        read at the address pointer, where the last transfer left it
+        """
+        chip = self._chip(adr)
+        if self.timing is not None:
+            self.timing.read(1, register=False)
+        register = chip.pointer
+        value = self._read_register(adr, chip, register)
+        chip.pointer = self._advance(chip, register)
+        if self.fault_model is not None:
+            value = self.fault_model.on_read(self.rng, adr, register, value)
+        return value
+
+    def write_i2c_block_data(self, address: GenericByteT, register: int,
+                             data: Sequence[int]) -> None:
+        chip = self._chips.get(address) or self._chip(address)
+        if self.timing is not None:
+            self.timing.write(len(data))
+        write, advance, faults = self._write_register, self._advance, self.fault_model
+        for value in data:
+            if faults is not None:
+                value = faults.on_write(self.rng, address, register, value)
+            write(address, chip, register, value & 0xFF)
+            register = advance(chip, register)
+        chip.pointer = register
+
+    def read_i2c_block_data(self, address: GenericByteT, register: int,
+                            length: int) -> List[int]:
+        chip = self._chips.get(address) or self._chip(address)
+        if self.timing is not None:
+            self.timing.read(length)
+        read, advance, faults = self._read_register, self._advance, self.fault_model
+        data = []
+        for _ in range(length):
+            value = read(address, chip, register)
+            if faults is not None:
+                value = faults.on_read(self.rng, address, register, value)
+            data.append(value)
+            register = advance(chip, register)
+        chip.pointer = register
+        return data
+
+    def registers(self, address: GenericByteT) -> bytes:
+        """
+        :return: the 22 registers of a board in BANK=0 order, without the
+            side effects of reading them
+        """
+        chip = self._chip(address)
+        regs = bytearray(chip.regs)
+        regs[_GPIO] = self._port_value(chip, 0)
+        regs[_GPIO + 1] = self._port_value(chip, 1)
+        return bytes(regs)
@@ -0,0 +1,116 @@
+"""
+run the calls of boards on several buses in parallel, one thread per bus
+"""
+
+import logging
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+
+from .mcp23017 import MCP23017
+
+
+def bus_of(board: MCP23017) -> Any:
+    """
+    :return: what identifies the bus of a board, its smbus object
+    """
+    i2c = board.i2c
+    # a ScheduledI2C is in front of the I2C of its scheduler
+    scheduler = getattr(i2c, "scheduler", None)
+    if scheduler is not None:
+        i2c = scheduler.i2c
+    return getattr(i2c, "smbus", i2c)
+
+
+class BusExecutor:
+    """
+    one worker thread per bus, the calls of a board run on the worker of
+    its bus
+
+    a bus can only do one thing at a time anyway, so the calls of one bus
+    run one after the other while the buses work in parallel.  the smbus
+    calls release the GIL while they wait for the wire
+    """
+
+    def __init__(self) -> None:
+        self.lg = logging.getLogger(self.__class__.__name__)
+        # bus -> its worker
+        self._workers: Dict[Any, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+        self._shut_down = False
+
+    def _worker(self, board: MCP23017) -> ThreadPoolExecutor:
+        bus = bus_of(board)
+        with self._lock:
+            if self._shut_down:
+                raise RuntimeError("the executor was shut down")
+
+            worker = self._workers.get(bus)
+            if worker is None:
+                worker = self._workers[bus] = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix=f"{self.__class__.__name__}-{len(self._workers)}",
+                )
+                self.lg.debug("new worker for bus %s", bus)
+            return worker
+
+    @property
+    def n_buses(self) -> int:
+        """number of buses that got a worker so far"""
+        return len(self._workers)
+
+    def submit(self, board: MCP23017, func: Callable, *args,
+               **kwargs) -> Future:
+        """
+        run :func: with the board and the other arguments on the worker of
+        the bus of the board
+
+        :return: future of what :func: returns
+        """
+        return self._worker(board).submit(func, board, *args, **kwargs)
+
+    def call(self, board: MCP23017, method: str, *args, **kwargs) -> Future:
+        """
+        run a method of a board on the worker of its bus::
+
+            executor.call(board, "gpio_digital_write", 3, True)
+
+        :return: future of what the method returns
+        """
+        return self._worker(board).submit(
+            getattr(board, method), *args, **kwargs
+        )
+
+    def fan_out(self, boards: Iterable[MCP23017], method: str, *args,
+                **kwargs) -> List[Future]:
+        """
+        call the same method of every board, the buses in parallel
+
+        :return: the futures, in the order of :boards:
+        """
+        return [self.call(board, method, *args, **kwargs) for board in boards]
+
+    def read_all_gpios(self, boards: Iterable[MCP23017]) -> List[Future]:
+        """
+        :return: futures of gpio_digital_read_all of every board
+        """
+        return self.fan_out(boards, "gpio_digital_read_all")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        stop the workers, after what was submitted if :wait:
+        """
+        with self._lock:
+            self._shut_down = True
+            workers = list(self._workers.values())
+            self._workers.clear()
+
+        for worker in workers:
+            worker.shutdown(wait=wait)
+
+    def __enter__(self) -> "BusExecutor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
@@ -0,0 +1,223 @@
+"""
+what can go wrong between the client and an emulated device
+
+a fault model sees every byte written to and read from a device and
+returns what arrives instead.  the randomness comes from the random.Random
+of the bus, so a seeded bus gives the same faults on every run
+"""
+
+import errno
+
+from bisect import bisect
+from itertools import accumulate
+from random import Random
+from typing import Dict, Optional, Sequence
+
+
+# bytes with k bits set, by k
+MASKS_BY_POPCOUNT = tuple(
+    tuple(m for m in range(256) if bin(m).count("1") == k) for k in range(9)
+)
+
+# how many bits a corrupted write of the old bugged mode had flipped
+DEFAULT_FLIP_WEIGHTS = (0.368, 0.368, 0.184, 0.069, 0.011)
+
+
+class FaultModel:
+    """
+    no faults, the base of the others
+    """
+
+    def on_write(self, rng: Random, address: int, register: int,
+                 value: int) -> int:
+        """
+        :return: the byte the device gets
+        """
+        return value
+
+    def on_read(self, rng: Random, address: int, register: int,
+                value: int) -> int:
+        """
+        :return: the byte the client gets
+
+        :raises OSError: if the read does not go through
+        """
+        return value
+
+
+class BitFlipNoise(FaultModel):
+    """
+    flips a random number of bits of written bytes
+    """
+
+    def __init__(self, weights: Sequence[float] = DEFAULT_FLIP_WEIGHTS,
+                 reads: bool = False) -> None:
+        """
+        :param weights: weights[k] is how likely k bits flip, up to 8
+        :param reads: flip bits of read bytes too
+        """
+        if not 0 < len(weights) <= 9:
+            raise ValueError(f"{weights=} needs 1 to 9 entries")
+
+        total = sum(weights)
+        self._cumulative = [w / total for w in accumulate(weights)]
+        # rounding must not let rng.random() fall off the end
+        self._cumulative[-1] = 1.0
+        self.reads = reads
+
+    def flip(self, rng: Random, value: int) -> int:
+        n = bisect(self._cumulative, rng.random())
+        if not n:
+            return value
+        return value ^ rng.choice(MASKS_BY_POPCOUNT[n])
+
+    def on_write(self, rng, address, register, value):
+        return self.flip(rng, value)
+
+    def on_read(self, rng, address, register, value):
+        return self.flip(rng, value) if self.reads else value
+
+
+class StuckAtBits(FaultModel):
+    """
+    bits of a register that do not change, like a shorted pin
+    """
+
+    def __init__(self, register: int, stuck_high: int = 0,
+                 stuck_low: int = 0) -> None:
+        """
+        :param register: the register the bits belong to
+        :param stuck_high: bits always 1
+        :param stuck_low: bits always 0
+        """
+        self.register = register
+        self.stuck_high = stuck_high
+        self.stuck_low = stuck_low
+
+    def _stick(self, register: int, value: int) -> int:
+        if register != self.register:
+            return value
+        return (value | self.stuck_high) & ~self.stuck_low & 0xFF
+
+    def on_write(self, rng, address, register, value):
+        return self._stick(register, value)
+
+    def on_read(self, rng, address, register, value):
+        return self._stick(register, value)
+
+
+class BurstNoise(FaultModel):
+    """
+    noise that comes in bursts: the bus is either quiet or noisy and every
+    byte can switch it (a Gilbert-Elliott channel)
+    """
+
+    def __init__(self, p_burst: float = 0.01, mean_length: float = 8.0,
+                 noise: Optional[FaultModel] = None) -> None:
+        """
+        :param p_burst: chance that a byte starts a burst
+        :param mean_length: bytes a burst lasts on average
+        :param noise: what happens to the bytes of a burst, every byte
+            with at least one flipped bit if None
+        """
+        if mean_length < 1:
+            raise ValueError(f"{mean_length=} has to be at least 1")
+
+        self.p_burst = p_burst
+        self.p_end = 1 / mean_length
+        self.noise = noise if noise is not None else BitFlipNoise(
+            (0,) + DEFAULT_FLIP_WEIGHTS[1:], reads=True
+        )
+        self.in_burst = False
+
+    def _step(self, rng: Random) -> bool:
+        if self.in_burst:
+            self.in_burst = rng.random() >= self.p_end
+        else:
+            self.in_burst = rng.random() < self.p_burst
+        return self.in_burst
+
+    def on_write(self, rng, address, register, value):
+        if self._step(rng):
+            return self.noise.on_write(rng, address, register, value)
+        return value
+
+    def on_read(self, rng, address, register, value):
+        if self._step(rng):
+            return self.noise.on_read(rng, address, register, value)
+        return value
+
+
+class ReadNack(FaultModel):
+    """
+    reads that are not acknowledged and fail with OSError like on linux
+    """
+
+    def __init__(self, rate: float = 0.01) -> None:
+        """
+        :param rate: part of the reads that fail
+        """
+        self.rate = rate
+
+    def on_read(self, rng, address, register, value):
+        if rng.random() < self.rate:
+            raise OSError(
+                errno.EREMOTEIO,
+                f"emulated NACK reading {register:#x} at {address:#x}"
+            )
+        return value
+
+
+class PerRegisterFaults(FaultModel):
+    """
+    different faults for different registers
+    """
+
+    def __init__(self, models: Dict[int, FaultModel],
+                 default: Optional[FaultModel] = None) -> None:
+        """
+        :param models: register -> its faults
+        :param default: faults of the other registers, none if None
+        """
+        self.models = dict(models)
+        self.default = default if default is not None else FaultModel()
+
+    def on_write(self, rng, address, register, value):
+        return self.models.get(register, self.default).on_write(
+            rng, address, register, value
+        )
+
+    def on_read(self, rng, address, register, value):
+        return self.models.get(register, self.default).on_read(
+            rng, address, register, value
+        )
+
+
+class Faults(FaultModel):
+    """
+    several fault models, applied in order
+    """
+
+    def __init__(self, *models: FaultModel) -> None:
+        self.models = models
+
+    def on_write(self, rng, address, register, value):
+        for model in self.models:
+            value = model.on_write(rng, address, register, value)
+        return value
+
+    def on_read(self, rng, address, register, value):
+        for model in self.models:
+            value = model.on_read(rng, address, register, value)
+        return value
+
+
+def per_register_rates(rates: Dict[int, float]) -> PerRegisterFaults:
+    """
+    single bit flips of written bytes with a chance per register
+
+    :param rates: register -> part of the writes that get a bit flipped
+    """
+    return PerRegisterFaults({
+        register: BitFlipNoise((1 - rate, rate)) for register, rate in rates.items()
+    })
@@ -31,11 +31,20 @@ def compose_all_no_subclass(cls):
 
     get the elements together for iteration in some of the
 
+    we also build the flat lookup tables once, so the hot paths dont have
+    to scan the constants:
+
+    - lookup: element -> (name of the constant, index in the tuple or None)
+    - whatever the class adds in its :_precompute: classmethod
+
     :param cls:
 
     :return: cls
 
     """
+    # every class gets its own set, otherwise they all share the one of
+    # AllConsts
+    cls.all_elements_in_tuple = set()
     cls.all_constants = {
         key: value for key, value in cls.__dict__.items()
         if not key.startswith("_") and key.isupper() and not isinstance(value, type)
@@ -50,6 +59,16 @@ def compose_all_no_subclass(cls):
                     cls.all_elements_in_tuple.add(e)
             else:
                 cls.all_elements_in_tuple.add(obj)
+
+    cls.lookup = {}
+    for key, value in cls.all_constants.items():
+        if isinstance(value, tuple):
+            for index, element in enumerate(value):
+                cls.lookup[element] = (key, index)
+        elif isinstance(value, Hashable):
+            cls.lookup[value] = (key, None)
+
+    cls._precompute()
     return cls
 
 
@@ -59,3 +78,10 @@ class AllConsts:
     """
     all_constants: Dict = {}
     all_elements_in_tuple: set = set()
+    lookup: Dict = {}
+
+    @classmethod
+    def _precompute(cls) -> None:
+        """build class specific lookup tables, called once when decorated
+        with :compose_all_no_subclass:
+        """
@@ -2,48 +2,328 @@
 layer between the communication of an smbus and other code, thread safe
 """
 
+import errno
 import logging
 
 import threading
+import time
 
-from typing import Optional, TypeVar
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
 
 from .helper import GenericByteT, h
+from .recorder import Recorder
+from .stats import BusStats
+from .tracer import Tracer, READ, WRITE, READ_BLOCK, WRITE_BLOCK
+
+from . import logging_modes
+
+
+class _Flight:
+    """
+    a read on the bus that others can wait for instead of reading too
+    """
+    __slots__ = ("done", "value", "error", "done_at")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+        self.done_at: Optional[float] = None
 
 
 class I2C:
     """
     simple i2c class to handle communiction between
     an smbus and other code
+
+    every transaction holds the bus lock.  writes also hold the lock of
+    their board, so a :transaction: with a board keeps other threads from
+    writing to it in between, while the bus stays free for the others
+
+    with :coalesce: a :read: of a register that is already being read by
+    another thread waits for that read and returns its value, so threads
+    polling the same pins cost one bus read.  a write to the board drops
+    the reads in flight, whoever comes after it reads again
     """
 
-    def __init__(self, smbus):
+    def __init__(self, smbus, tracer: Optional[Tracer] = None,
+                 stats: Optional[BusStats] = None,
+                 coalesce: bool = False,
+                 coalesce_window_s: float = 0.0,
+                 recorder: Optional[Recorder] = None):
         """
         :param smbus:
+        :param tracer: records every transaction if given
+        :param stats: counts every transaction if given
+        :param recorder: logs every transaction and its outcome to a file,
+            for a :Replayer:
+        :param coalesce: share register reads between threads, see above
+        :param coalesce_window_s: a finished read is also handed out to
+            reads that come within this time after it
         """
         # make it not close on exit (edit: what did i mean?)
 
         self.lg = logging.getLogger(self.__class__.__name__)
         self.lock = threading.Condition()
+        # address -> lock of the board, see :transaction:
+        self._address_locks: Dict[int, threading.RLock] = {}
+        self._address_locks_guard = threading.Lock()
 
         self.smbus = smbus
+        self.tracer = tracer
+        self.stats = stats
+        self.recorder = recorder
+
+        self.coalesce = coalesce
+        self.coalesce_window_s = coalesce_window_s
+        # (address, register) -> the last read of it
+        self._flights: Dict[Tuple[int, int], _Flight] = {}
+        self._flights_lock = threading.Lock()
+        # reads that were answered by another one
+        self.coalesced: int = 0
+
+    def _drop_flights(self, address: GenericByteT) -> None:
+        """
+        the reads of :address: so far are outdated, the next ones go to the
+        bus
+        """
+        if not self._flights:
+            return
+        with self._flights_lock:
+            for key in [key for key in self._flights if key[0] == address]:
+                del self._flights[key]
+
+    def _record_failure(self, address: GenericByteT, register, values,
+                        direction: int, exc: OSError) -> None:
+        if self.recorder is not None:
+            self.recorder.record(
+                address, register, values, direction, exc.errno or errno.EIO
+            )
+
+    def address_lock(self, address: GenericByteT) -> threading.RLock:
+        """
+        :return: the lock of the board at :address:
+        """
+        lock = self._address_locks.get(address)
+        if lock is None:
+            with self._address_locks_guard:
+                lock = self._address_locks.setdefault(address, threading.RLock())
+        return lock
+
+    @contextmanager
+    def transaction(self, address: GenericByteT) -> Iterator["I2C"]:
+        """
+        several operations with one board that nobody writes in between,
+        for read-modify-writes::
+
+            with i2c.transaction(0x20):
+                value = i2c.read(0x20, register)
+                i2c.write(0x20, register, value | 1)
+
+        the bus lock is only held per operation, so the other boards are
+        not held up.  transactions can be nested
+
+        :param address: the board
+        """
+        with self.address_lock(address):
+            yield self
+
+    def update_bits(self, address: GenericByteT, register: GenericByteT,
+                    mask: int, value: int) -> int:
+        """
+        set the bits of :mask: in a register to the ones of :value:, in one
+        :transaction:.  nothing is written if they already are
+
+        :return: the new value of the register
+        """
+        with self.transaction(address):
+            before = self.read(address, register)
+            after = (before & ~mask) | (value & mask)
+            if after != before:
+                self.write(address, register, after)
+            return after
 
     def write(self, address: GenericByteT, register: GenericByteT,
-              value: GenericByteT) -> None:
+              value: GenericByteT, retry: int = 0) -> None:
         """
         write to the smbus
 
+        :param retry: how many times the caller tried this before, for the
+            tracer
         """
-        with self.lock:
-            self.lg.hw_debug(f"wrinting {h(value)} at {h(address)}")
-            self.smbus.write_byte_data(address, register, value)
+        stats = self.stats
+        if stats is not None:
+            t_wait = time.perf_counter()
+
+        with self.address_lock(address), self.lock:
+            if stats is not None:
+                t_bus = time.perf_counter()
+
+            self._drop_flights(address)
+            self.lg.hw_debug("wrinting %#x at %#x", value, address)
+            try:
+                self.smbus.write_byte_data(address, register, value)
+            except OSError as exc:
+                self._record_failure(address, register, (value,), WRITE, exc)
+                raise
+            if self.recorder is not None:
+                self.recorder.record(address, register, (value,), WRITE)
+
+            if stats is not None:
+                stats.record_write(
+                    address, register, 1,
+                    t_bus - t_wait, time.perf_counter() - t_bus
+                )
+            if self.tracer is not None:
+                self.tracer.record(address, register, value, WRITE, retry)
 
     def read(self, address: GenericByteT,
              register: Optional[GenericByteT] = None):
+        """
+        read a register, or the one the pointer of the device is at if
+        :register: is None.  the latter is never coalesced, it moves the
+        pointer
+        """
+        if self.coalesce and register is not None:
+            return self._read_coalesced(address, register)
+        return self._read(address, register)
+
+    def _read_coalesced(self, address: GenericByteT,
+                        register: GenericByteT):
+        key = (address, register)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is None or flight.done_at is not None and (
+                time.monotonic() - flight.done_at > self.coalesce_window_s
+            ):
+                flight = self._flights[key] = _Flight()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self._read(address, register)
+            return flight.value
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._flights_lock:
+                flight.done_at = time.monotonic()
+                if (flight.error is not None or not self.coalesce_window_s) \
+                        and self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def _read(self, address: GenericByteT,
+              register: Optional[GenericByteT] = None):
+        stats = self.stats
+        if stats is not None:
+            t_wait = time.perf_counter()
+
+        with self.lock:
+            if stats is not None:
+                t_bus = time.perf_counter()
+
+            try:
+                r = self.smbus.read_byte_data(
+                    address, register
+                ) if register is not None else self.smbus.read_byte(address)
+            except OSError as exc:
+                self._record_failure(address, register, b"\0", READ, exc)
+                raise
+            if self.recorder is not None:
+                self.recorder.record(address, register, (r,), READ)
+
+        if stats is not None:
+            stats.record_read(
+                address, register, 1, t_bus - t_wait, time.perf_counter() - t_bus
+            )
+
+        self.lg.hw_debug("read from %#x at %s: %s", address, register, r)
+
+        if self.tracer is not None:
+            self.tracer.record(address, register, r, READ)
+        return r
+
+    def write_block(self, address: GenericByteT, register: GenericByteT,
+                    values: Sequence[GenericByteT], retry: int = 0) -> None:
+        """
+        write several bytes starting at :register: in one transaction
+
+        where the bytes after the first one end up is up to the device, for
+        the MCP23017 see IOCON.SEQOP
+        """
+        stats = self.stats
+        if stats is not None:
+            t_wait = time.perf_counter()
+
+        with self.address_lock(address), self.lock:
+            if stats is not None:
+                t_bus = time.perf_counter()
+
+            self._drop_flights(address)
+            self.lg.hw_debug(
+                "wrinting %s at %#x from %#x", values, address, register
+            )
+            try:
+                self.smbus.write_i2c_block_data(address, register, list(values))
+            except OSError as exc:
+                self._record_failure(address, register, values, WRITE_BLOCK, exc)
+                raise
+            if self.recorder is not None:
+                self.recorder.record(address, register, values, WRITE_BLOCK)
+
+            if stats is not None:
+                stats.record_write(
+                    address, register, len(values),
+                    t_bus - t_wait, time.perf_counter() - t_bus
+                )
+
+            if self.tracer is not None:
+                self.tracer.record_block(
+                    address, register, values, WRITE_BLOCK, retry
+                )
+
+    def read_block(self, address: GenericByteT, register: GenericByteT,
+                   length: int) -> List[GenericByteT]:
+        """
+        read :length: bytes starting at :register: in one transaction
+        """
+        stats = self.stats
+        if stats is not None:
+            t_wait = time.perf_counter()
+
+        with self.lock:
+            if stats is not None:
+                t_bus = time.perf_counter()
+
+            try:
+                r = self.smbus.read_i2c_block_data(address, register, length)
+            except OSError as exc:
+                self._record_failure(
+                    address, register, bytes(length), READ_BLOCK, exc
+                )
+                raise
+            if self.recorder is not None:
+                self.recorder.record(address, register, r, READ_BLOCK)
+
+        if stats is not None:
+            stats.record_read(
+                address, register, length,
+                t_bus - t_wait, time.perf_counter() - t_bus
+            )
 
-        r = self.smbus.read_byte_data(
-            address, register
-        ) if register is not None else self.smbus.read_byte(address)
+        self.lg.hw_debug("read from %#x at %#x: %s", address, register, r)
 
-        self.lg.hw_debug(f"read from {h(address)} at {h(register)}: {h(r)}")
+        if self.tracer is not None:
+            self.tracer.record_block(address, register, r, READ_BLOCK)
         return r
@@ -0,0 +1,143 @@
+"""
+react to the INT line of a board instead of polling its inputs
+"""
+
+import logging
+import threading
+
+from typing import Callable, Dict, List, Optional
+
+from .mcp23017 import MCP23017
+
+from . import logging_modes
+
+
+PinCallback = Callable[[int, bool], None]
+
+
+class InterruptEngine:
+    """
+    configures interrupt-on-change for pins and calls their callbacks
+
+    the INT line is an Event: whatever watches the line (your gpio layer,
+    :EmulatedSMBusMCP23017.connect_interrupt:) calls :trigger: or sets the
+    event, the engine then reads INTF and INTCAP once and calls the
+    callbacks of every pin that caused the interrupt with the captured value
+    """
+
+    def __init__(self, board: MCP23017,
+                 int_event: Optional[threading.Event] = None,
+                 mirror: bool = True) -> None:
+        """
+        :param board: the board to serve
+        :param int_event: set when the INT line goes active, a new one if
+            None
+        :param mirror: OR the interrupts of both ports on both INT lines,
+            so one line is enough to watch
+        """
+        self.lg = logging.getLogger(
+            f"{self.__class__.__name__}@{hex(board.address)}"
+        )
+
+        self.board = board
+        self.int_event = int_event if int_event is not None else threading.Event()
+
+        # pin -> callbacks
+        self._callbacks: Dict[int, List[PinCallback]] = {}
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        if mirror:
+            self.board.set_interrupt_mirror(True)
+
+    def add_callback(self, gpio: int, callback: PinCallback,
+                     compare_to: Optional[bool] = None) -> None:
+        """
+        call :callback: with (gpio, value) when :gpio: causes an interrupt
+
+        :param gpio: the pin, needs to be an input
+        :param callback: gets the pin and its value at the time of the
+            interrupt
+        :param compare_to: fire while the pin is not at this value, on every
+            change if None
+        """
+        self.board.set_interrupt_compare(
+            gpio, compare_to is not None, bool(compare_to)
+        )
+        self.board.set_interrupt(gpio, True)
+        self._callbacks.setdefault(gpio, []).append(callback)
+
+    def remove_callbacks(self, gpio: int) -> None:
+        """
+        forget the callbacks of :gpio: and turn its interrupt off
+        """
+        self.board.set_interrupt(gpio, False)
+        self._callbacks.pop(gpio, None)
+
+    def trigger(self, *_) -> None:
+        """
+        tell the engine that the INT line went active, can be used as
+        callback directly
+        """
+        self.board.invalidate_inputs()
+        self.int_event.set()
+
+    def service(self) -> int:
+        """
+        read the interrupt state once and call the callbacks
+
+        :return: number of pins that caused the interrupt
+        """
+        flags, captures = self.board.read_interrupt_state()
+
+        n = 0
+        while flags:
+            low_bit = flags & -flags
+            gpio = low_bit.bit_length() - 1
+            flags ^= low_bit
+            n += 1
+
+            value = bool(self.board._invert_io(
+                1 if captures & low_bit else 0, max_v=1
+            ))
+            for callback in self._callbacks.get(gpio, []):
+                try:
+                    callback(gpio, value)
+                except Exception:  # one bad callback must not stop the others
+                    self.lg.exception(f"callback for pin {gpio} failed")
+
+        return n
+
+    def start(self) -> None:
+        """
+        serve interrupts from a thread
+        """
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=self.lg.name, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.int_event.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            self.int_event.wait()
+            if self._stop.is_set():
+                return
+
+            self.int_event.clear()
+            try:
+                self.service()
+            except IOError as exc:
+                self.lg.error(f"reading the interrupt failed: {exc}")
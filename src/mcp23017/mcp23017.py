@@ -1,10 +1,15 @@
 import logging
-from typing import List, Optional, Any, Dict
+import threading
+from contextlib import nullcontext
+from typing import Callable, List, Optional, Any, Dict, Tuple
 
 import time
 
 from .helper import h, bfp, compose_all_no_subclass, AllConsts
 from .i2c import I2C, h, GenericByteT
+from .verification import (
+    Backoff, VerificationPolicy, VerifyAlways, VerifyNever, WriteCheck
+)
 
 from . import logging_modes
 
@@ -56,25 +61,33 @@ class MCP23017:
             GPIO: tuple[int, int] = (0x12, 0x13)
             OLAT: tuple[int, int] = (0x14, 0x15)
 
+            @classmethod
+            def _precompute(cls) -> None:
+                # all valid register tuples, to check arguments
+                cls.register_tuples = frozenset(
+                    value for value in cls.all_constants.values()
+                    if isinstance(value, tuple)
+                )
+                # register -> register holding its mask
+                cls.mask_lookup = {
+                    reg: mask_reg
+                    for name, masks in cls.Mask.items()
+                    for reg, mask_reg in zip(getattr(cls, name), masks)
+                }
+                # GPIO register -> output latch behind it
+                cls.latch_lookup = dict(zip(cls.GPIO, cls.OLAT))
+
             @classmethod
             def get_register_and_index(cls, reg: int) -> tuple[str, int]:
-                for reg_from_t, (low, high) in cls.all_constants.items():
-                    if reg == low:
-                        return (reg_from_t, 0)
-                    elif reg == high:
-                        return (reg_from_t, 1)
-                raise ValueError(f"{h(reg)} is not a register in Consts")
+                try:
+                    return cls.lookup[reg]
+                except KeyError as exc:
+                    raise ValueError(f"{h(reg)} is not a register in Consts") from exc
 
             @classmethod
             def get_all_registers_and_index(cls, reg: int) -> list[tuple[str,int]]:
-                # FIXME
-                matches = []
-                for reg, (low, high) in REGISTERS.items():
-                    if index == low:
-                        matches.append((reg, 0))
-                    elif index == high:
-                        matches.append((reg, 1))
-                return matches
+                # registers dont overlap, so there is one match at most
+                return [cls.lookup[reg]] if reg in cls.lookup else []
 
             @classmethod
             def get_register(cls, register_name: str, index: int) -> int:
@@ -144,6 +157,17 @@ class MCP23017:
             GPB6: int = 14
             GPB7: int = 15
 
+            _bank_size: int = 8
+
+            @classmethod
+            def _precompute(cls) -> None:
+                # pin -> (bank, bit in the bank, bitmask in the bank)
+                cls.pin_lookup = {
+                    pin: (pin // cls._bank_size, pin % cls._bank_size,
+                          1 << (pin % cls._bank_size))
+                    for pin in cls.all_constants.values()
+                }
+
         class SettingBit:
             BANK = 7
             MIRROR = 6
@@ -153,6 +177,22 @@ class MCP23017:
             ODR = 2
             INTPOL = 1
 
+    # registers that only change when we write them.  GPIO, INTF and INTCAP
+    # follow the pins, so they are never shadowed
+    SHADOWED_REGISTERS: frozenset = frozenset(
+        Consts.Register.IODIR + Consts.Register.IPOL + Consts.Register.GPINTEN
+        + Consts.Register.DEFVAL + Consts.Register.INTCON
+        + Consts.Register.IOCON + Consts.Register.GPPU + Consts.Register.OLAT
+    )
+    # most bytes one SMBus block transfer can carry
+    MAX_BLOCK: int = 32
+
+    # registers whose writes change what GPIO reads
+    INPUT_REGISTERS: frozenset = frozenset(
+        Consts.Register.IODIR + Consts.Register.IPOL + Consts.Register.GPPU
+        + Consts.Register.GPIO + Consts.Register.OLAT
+    )
+
     def __init__(
         self,
         i2c: I2C,
@@ -163,8 +203,24 @@ class MCP23017:
         check_write: bool = True,
         write_retries: int = 200,
         time_between_retries_ms: int = 10,
+        shadow_registers: bool = False,
+        validate: bool = True,
+        verification: Optional[VerificationPolicy] = None,
+        clock: Callable[[], float] = time.monotonic,
     ) -> None:
         """
+        :param check_write: if False and no :verification: is given, writes
+            are not checked
+        :param write_retries: how often a write is redone before giving up
+        :param time_between_retries_ms: pause between two tries if no
+            :verification: is given
+        :param validate: check registers and pins passed in, turn it off
+            for hot loops once the calling code is known to be right
+        :param shadow_registers: keep a copy of the configuration and output
+            latch registers (see :SHADOWED_REGISTERS:) and use it instead of
+            reading them from the bus.  only safe if nobody else writes to
+            the board, see :invalidate_shadow: and :resync_shadow:
+        :param clock: timestamps of the input cache, see :gpio_digital_read:
         """
         self.lg = logging.getLogger(f"{__name__}.{uid}@{hex(address)}")
 
@@ -180,6 +236,26 @@ class MCP23017:
 
         self.check_written: bool = False
 
+        if verification is None:
+            verification = VerifyAlways(Backoff(time_between_retries_ms)) \
+                if check_write else VerifyNever()
+        self.verification = verification
+        self.verification.attach(self)
+
+        self.validate = validate
+
+        self.shadow_registers = shadow_registers
+        # register -> last value we know is in there
+        self._shadow: Dict[int, int] = {}
+
+        self.clock = clock
+        # GPIO register -> (time it was read, raw value)
+        self._inputs: Dict[int, Tuple[float, int]] = {}
+        # goes up with every invalidation, so a read that overlapped one
+        # does not end up in the cache
+        self._inputs_generation: int = 0
+        self._inputs_lock = threading.Lock()
+
     def set_gpio_mode(self, mode, gpio: int,
                       set_low: bool = True) -> None:
         """Set a gpio mode of a pin.
@@ -194,9 +270,10 @@ class MCP23017:
             self.Consts.Register.IODIR, gpio
         )
 
-        self.write(register, self.get_bit_enabled(
-            register, rel_gpio, True if mode is self.Consts.INPUT else False
-        ))
+        with self._transaction():
+            self.write(register, self.get_bit_enabled(
+                register, rel_gpio, True if mode is self.Consts.INPUT else False
+            ))
 
         if mode == self.Consts.OUTPUT and set_low:
             self.gpio_digital_write(gpio, self.Consts.LOW)
@@ -205,8 +282,7 @@ class MCP23017:
 
     def set_gpio_mode_all(self, mode,
                           set_all_low: bool = True) -> None:
-        for reg in self.Consts.Register.IODIR:
-            self.write(reg, mode)
+        self.write_pair(self.Consts.Register.IODIR, [mode, mode])
 
         if mode == self.Consts.OUTPUT and set_all_low:
             self.gpio_digital_write_all(self.Consts.LOW)
@@ -223,11 +299,9 @@ class MCP23017:
         raise NotImplementedError("use self.get_mode_all")
 
     def get_gpio_mode_all(self) -> List[int]:
-        return [
-            self.read(reg) for reg in self.Consts.Register.IODIR
-        ]
+        return self.read_pair(self.Consts.Register.IODIR)
 
-    def read(self, register):
+    def read(self, register, use_shadow: bool = True):
         """
         read from register
 
@@ -235,11 +309,169 @@ class MCP23017:
         input are also read there as well as pins set as an output
 
         :param register: read from there
+        :param use_shadow: if shadowing is enabled and the register is
+            shadowed, answer from the shadow (filled from the bus on first use)
 
         :return:
         """
+        if use_shadow and self.shadow_registers \
+                and register in self.SHADOWED_REGISTERS:
+            if register not in self._shadow:
+                self._shadow[register] = self.i2c.read(self.address, register)
+            return self._shadow[register]
+
         return self.i2c.read(self.address, register)
 
+    def invalidate_shadow(self, register: Optional[int] = None) -> None:
+        """forget shadowed values, the next read goes to the bus again
+
+        :param register: only forget this one, everything if None
+        """
+        if register is None:
+            self._shadow.clear()
+        else:
+            self._shadow.pop(register, None)
+
+    def resync_shadow(self) -> None:
+        """read all shadowed registers from the bus again
+
+        use it after someone else (reset, other process) touched the board
+        """
+        self._shadow = {
+            reg: self.i2c.read(self.address, reg)
+            for reg in sorted(self.SHADOWED_REGISTERS)
+        }
+
+    def invalidate_inputs(self, registers: Optional[tuple] = None) -> None:
+        """forget cached GPIO values, the next read goes to the bus again
+
+        :param registers: only the banks these registers are on, if they
+            change the pins (see :INPUT_REGISTERS:), everything if None
+        """
+        if registers is not None and self.INPUT_REGISTERS.isdisjoint(registers):
+            return
+        with self._inputs_lock:
+            self._inputs_generation += 1
+            if registers is None:
+                self._inputs.clear()
+                return
+            for reg in registers:
+                if reg in self.INPUT_REGISTERS:
+                    # with BANK=0 the A registers are even, the B ones odd
+                    self._inputs.pop(self.Consts.Register.GPIO[reg & 1], None)
+
+    def _cached_inputs(self, registers: tuple,
+                       max_age: float) -> Optional[List[int]]:
+        """
+        :return: the cached values of :registers: if all are new enough,
+            None otherwise
+        """
+        if not self._inputs:
+            return None
+        now = self.clock()
+        cached = [self._inputs.get(reg) for reg in registers]
+        if all(c is not None and now - c[0] <= max_age for c in cached):
+            return [c[1] for c in cached]
+        return None
+
+    def _store_inputs(self, generation: int, read_at: float,
+                      registers: tuple, values: List[int]) -> None:
+        """cache what a read got, unless an invalidation came in between
+
+        :param generation: :_inputs_generation: before the read
+        :param read_at: time before the read
+        """
+        with self._inputs_lock:
+            if generation != self._inputs_generation:
+                return
+            for reg, value in zip(registers, values):
+                self._inputs[reg] = (read_at, value)
+
+    def _read_inputs(self, registers: tuple,
+                     max_age: Optional[float]) -> List[int]:
+        """read GPIO registers, from the input cache if it is new enough
+
+        :param registers: GPIO register tuple
+        :param max_age: seconds a cached value may be old, None reads and
+            leaves the cache alone, so boards that do not cache pay nothing
+        """
+        if max_age is None:
+            return self._read_registers(registers)
+
+        cached = self._cached_inputs(registers, max_age)
+        if cached is not None:
+            return cached
+
+        generation = self._inputs_generation
+        read_at = self.clock()
+        values = self._read_registers(registers)
+        self._store_inputs(generation, read_at, registers, values)
+        return values
+
+    def _shadow_written(self, reg: int, value: int) -> None:
+        """keep the shadow in line with a successful write
+
+        :param reg: register that was written
+        :param value: value that is in there now
+        """
+        if not self.shadow_registers:
+            return
+
+        if reg in self.Consts.Register.IOCON:
+            # there is only one IOCON, both addresses point to it
+            for iocon in self.Consts.Register.IOCON:
+                self._shadow[iocon] = value
+        elif reg in self.SHADOWED_REGISTERS:
+            self._shadow[reg] = value
+        elif reg in self.Consts.Register.GPIO:
+            # writing GPIO writes the output latch
+            self._shadow[self._get_olat_for_gpio_register(reg)] = value
+
+    def _shadow_unknown(self, registers) -> None:
+        """a write to :registers: failed, it might have made it or not, so
+        forget what the shadow says about them
+
+        :param registers: registers that were written, GPIO stands for its
+            output latch
+        """
+        for reg in registers:
+            if reg in self.Consts.Register.IOCON:
+                for iocon in self.Consts.Register.IOCON:
+                    self.invalidate_shadow(iocon)
+            elif reg in self.Consts.Register.GPIO:
+                self.invalidate_shadow(self._get_olat_for_gpio_register(reg))
+            else:
+                self.invalidate_shadow(reg)
+
+    def _bus_write(self, registers: tuple, values, retry: int = 0) -> None:
+        """send a write, one register or a block starting at the first one
+
+        :param registers: the registers that get written
+        :param values: one byte for each
+        :param retry: number of the try, for the tracer
+        """
+        # before, so nobody uses the old pins once the write is out, and
+        # after, for the readers that got in while it was on the bus
+        self.invalidate_inputs(registers)
+        try:
+            if len(registers) == 1:
+                self.i2c.write(self.address, registers[0], values[0], retry=retry)
+            else:
+                self.i2c.write_block(self.address, registers[0], values, retry=retry)
+        except IOError:
+            self._shadow_unknown(registers)
+            raise
+        finally:
+            self.invalidate_inputs(registers)
+
+    def _get_olat_for_gpio_register(self, io_reg: int) -> int:
+        """get the output latch that belongs to a gpio register
+
+        :param io_reg: GPIOA or GPIOB
+        :return: OLATA or OLATB
+        """
+        return self.Consts.Register.latch_lookup[io_reg]
+
     def write(self, reg, value,
               check_register: bool | int = True,
               desired_value: Optional[int] = None,
@@ -250,6 +482,7 @@ class MCP23017:
 
         if configured, we check if the write was successful and retry for
         self.write_retries times.  if still not good, return :IOError:
+        when the check happens is up to self.verification
 
         :param reg: register to write to
         :param value: write that to :reg:
@@ -268,7 +501,7 @@ class MCP23017:
 
         # TODO: invert option (if for example we need to mask the inputs not the outputs)
 
-        if reg not in self.Consts.Register.all_elements_in_tuple:
+        if self.validate and reg not in self.Consts.Register.lookup:
             raise ValueError(
                 f"register {h(reg)} is not a valid register to write to"
             )
@@ -278,81 +511,260 @@ class MCP23017:
         if desired_value is None:
             desired_value = value
 
-        else:
+        # only matters if there is a check
+        elif check_register is not False:
             if check_register not in self.Consts.Register.GPIO:
                 raise ValueError(
                     f"register {h(check_register)} is not a valid register for checks"
                 )
 
-        self.lg.hw_debug(f"first write of {h(value)} to {h(reg)}")
-        self.i2c.write(self.address, reg, value)
+        if check_mask is True and check_mask_register is None:
+            raise ValueError(
+                f"we need a mask location if {check_mask=} and no mask is provided"
+            )
 
-        number_of_tries = 0
+        self.lg.hw_debug("first write of %#x to %#x", value, reg)
+        self._bus_write((reg,), (value,))
 
-        # in case we dont go through the retry loop i gets through the check
-        good = True
+        if check_register is False:
+            self._shadow_written(reg, value)
+            return
 
-        if isinstance(check_register, int) or check_register:
-            for try_n in range(self.write_retries):
-                # we obv have to check it again
-                good = False
+        self._verify(WriteCheck(
+            (reg,), (value,), (check_register,), (desired_value,),
+            # a mask of False/None is the same as no mask
+            masks=None if check_mask is None or isinstance(check_mask, bool)
+            else (check_mask,),
+            mask_registers=(check_mask_register,) if check_mask is True else None,
+        ))
 
+    def read_pair(self, registers: tuple[int, int],
+                  use_shadow: bool = True) -> List[int]:
+        """read the A and the B register of a pair in one transaction
 
-                # get the desired value
-                # also:
-                # we dont mask anything here, cause we dont have the contex
-                # that has to be done in upper functions
+        with BANK=0 the pair is next to each other and the address pointer
+        goes from A to B in sequential and in byte mode (IOCON.SEQOP), so
+        this works in both
 
-                # TODO: impl check_register
+        :param registers: register tuple from Consts.Register
+        :param use_shadow: see :read:
 
-                actual = self.read(check_register)
+        :return: [value of A, value of B]
+        """
+        if use_shadow and self.shadow_registers \
+                and all(reg in self._shadow for reg in registers):
+            return [self._shadow[reg] for reg in registers]
 
-                if check_mask is not None:
-                    if isinstance(check_mask, bool):
-                        if check_mask:
-                            if check_mask_register is None:
-                                raise ValueError(f"we need a mask location if {check_mask=} and no mask is provided")
+        values = self.i2c.read_block(self.address, registers[0], len(registers))
 
+        if use_shadow and self.shadow_registers:
+            self._shadow.update(
+                (reg, value) for reg, value in zip(registers, values)
+                if reg in self.SHADOWED_REGISTERS
+            )
 
-                            self.lg.hw_debug(f"getting mask from {h(check_mask_register)}")
-                            g_mask = self.read(check_mask_register)
-                            self.lg.hw_debug(f"applying mask {h(g_mask)} to {actual=}")
-                            actual = actual & ~g_mask
+        return values
 
-                    else:
-                        # we just apply it then
-                        self.lg.hw_debug(f"got actual value at {h(check_register)}. " +
-                                         f"applying mask {h(check_mask)}")
-                        actual = actual & ~check_mask
-                    self.lg.hw_debug(
-                        f"new actual after mask is: {h(actual)}"
-                    )
+    def write_pair(self, registers: tuple[int, int], values: List[int],
+                   check: bool = True,
+                   check_mask_registers: Optional[tuple[int, int]] = None,
+                   ) -> None:
+        """write the A and the B register of a pair in one transaction
+
+        same as :write: for both registers, but the write and every check
+        is a single block transfer, see :read_pair:
+
+        :param registers: register tuple from Consts.Register
+        :param values: [value for A, value for B]
+        :param check: read back and retry if its not what we wrote
+        :param check_mask_registers: bits set in these registers are
+            ignored for the check on both sides (inputs for GPIO)
+
+        :return:
+        """
+        if self.validate and registers not in self.Consts.Register.register_tuples:
+            raise ValueError(
+                f"registers {registers} are not valid registers to write to"
+            )
+
+        self.lg.hw_debug("first write of %s to %s", values, registers)
+        self._bus_write(registers, values)
+
+        if not check:
+            for reg, value in zip(registers, values):
+                self._shadow_written(reg, value)
+            return
+
+        self._verify(WriteCheck(
+            registers, values, mask_registers=check_mask_registers
+        ))
+
+    def read_registers(self, register: int, length: int,
+                       use_shadow: bool = True) -> List[int]:
+        """read :length: consecutive registers in one transaction
+
+        only with IOCON.SEQOP clear, in byte mode the address pointer stays
+        on the A/B pair of :register:
+
+        :param register: the first register
+        :param length: number of registers
+        :param use_shadow: see :read:
+        """
+        return self.read_pair(
+            tuple(range(register, register + length)), use_shadow=use_shadow
+        )
+
+    def write_registers(self, register: int, values: List[int],
+                        check: bool = True) -> None:
+        """write consecutive registers in one transaction
+
+        only with IOCON.SEQOP clear, see :read_registers:
+
+        :param register: the first register
+        :param values: one byte per register
+        :param check: read back and retry if its not what we wrote
+        """
+        registers = tuple(range(register, register + len(values)))
+        self._bus_write(registers, values)
+
+        if not check:
+            for reg, value in zip(registers, values):
+                self._shadow_written(reg, value)
+            return
+
+        self._verify(WriteCheck(registers, values))
 
+    def _verify(self, check: WriteCheck) -> None:
+        """hand a sent write to the verification policy
 
-                if (des := desired_value) == actual:
+        :param check: the write that was sent
+        """
+        if self.verification.verify_now(check):
+            self._write_checked(check)
+        else:
+            # we trust it for now, :verify_pending: fixes the shadow if not
+            for reg, value in zip(check.registers, check.values):
+                self._shadow_written(reg, value)
+
+    def _check_write(self, check: WriteCheck) -> bool:
+        """read back once
+
+        :param check: the write to check
+
+        :return: True if the registers hold what we wanted
+        """
+        actual = self._read_registers(check.check_registers, use_shadow=False)
+        desired = check.desired
+
+        masks = check.masks
+        if check.mask_registers is not None:
+            self.lg.hw_debug("getting mask from %s", check.mask_registers)
+            masks = self._read_registers(check.mask_registers)
+
+        if masks is not None:
+            self.lg.hw_debug("applying masks %s to actual=%s", masks, actual)
+            actual = [a & ~m for a, m in zip(actual, masks)]
+            desired = [d & ~m for d, m in zip(desired, masks)]
+
+        return actual == desired
+
+    def _write_checked(self, check: WriteCheck) -> None:
+        """check the write and redo it until its there
+
+        resends self.write_retries times with the pauses of the policy, every
+        resend is checked too.  a read back or resend the bus fails is a
+        failed try like a wrong value
+
+        :param check: the write that was sent
+
+        :return: IOError if it never got there
+        """
+        # only the sync I2C counts, the scheduler client has no stats
+        stats = getattr(self.i2c, "stats", None)
+        # the last failure of the bus itself, the cause if we give up
+        bus_error: Optional[IOError] = None
+
+        try:
+            for try_n in range(self.write_retries + 1):
+                try:
+                    written = self._check_write(check)
+                except IOError as exc:
+                    self.lg.debug("reading back %s at %#x failed: %s",
+                                  check, self.address, exc)
+                    bus_error, written = exc, False
+
+                if written:
                     self.lg.hw_debug(
-                        f"needed {number_of_tries} tries to write at "
-                        + f"{h(self.address)} "
-                        + f"register {h(reg)}: {h(value)}. " +
-                        f"checked that {h(des)} is at {check_register}"
+                        "needed %s tries to write at %#x %s",
+                        try_n, self.address, check
                     )
-                    good = True
+                    for reg, value in zip(check.registers, check.values):
+                        self._shadow_written(reg, value)
+                    return
+
+                if stats is not None:
+                    stats.record_verify_failure(self.address, check.registers[0])
+                if try_n == self.write_retries:
                     break
+                if stats is not None:
+                    stats.record_retry(self.address, check.registers[0])
 
-                if self.time_between_retries_ms:
-                    time.sleep(self.time_between_retries_ms / 1000)
-                self.i2c.write(self.address, reg, value)
+                time.sleep(self.verification.backoff.delay(try_n))
+                try:
+                    self._send(check, retry=try_n + 1)
+                except IOError as exc:
+                    self.lg.debug("resending %s at %#x failed: %s",
+                                  check, self.address, exc)
+                    bus_error = exc
+
+            if stats is not None:
+                stats.record_failed_write(self.address, check.registers[0])
+
+            raise IOError(
+                f"checked {self.write_retries + 1} times, "
+                + f"can't write {check}, "
+                + f"maybe the board at {h(self.address)} is broken"
+            ) from bus_error
+        except IOError:
+            # we dont know what is in there now
+            self._shadow_unknown(check.registers)
+            raise
+
+    def _send(self, check: WriteCheck, retry: int = 0) -> None:
+        """(re)send the write of a check
+
+        :param retry: number of the try, for the tracer
+        """
+        self._bus_write(check.registers, check.values, retry=retry)
 
-                number_of_tries = try_n
+    def _read_registers(self, registers: tuple, use_shadow: bool = True) -> List[int]:
+        """read one register or a pair in one transaction
+        """
+        if len(registers) == 1:
+            return [self.read(registers[0], use_shadow=use_shadow)]
+        return self.read_pair(registers, use_shadow=use_shadow)
 
-            if not good:
-                raise IOError(
-                    f"tried {number_of_tries} times, " +
-                    f"can't write  {h(value)} at {h(reg)}, " +
-                    f"maybe the board at {h(self.address)} is broken" +
-                    f". {desired_value=}" +
-                    f"\n --- its atm: {h(self.read(reg))}, chck_reg: {h(check_register)}"
-                )
+    def verify_pending(self) -> None:
+        """check the writes the verification policy put aside
+
+        every one of them gets retried, then the first failure is raised.
+        nobody writes to the board in between, a check of a register that
+        was written again since it was taken is dropped
+
+        :return: IOError if a write could not be fixed
+        """
+        errors = []
+        with self._transaction():
+            for check in self.verification.take_pending():
+                if self.verification.superseded(check):
+                    continue
+                try:
+                    self._write_checked(check)
+                except IOError as exc:
+                    errors.append(exc)
+
+        if errors:
+            raise errors[0]
 
     def get_mask_reg(self, reg: int) -> int:
         """get the mask from the Consts corresponding with reg
@@ -360,16 +772,10 @@ class MCP23017:
         :param reg: the register we need the mask for
         :return: register to get the mask
         """
-        register_name, register_index = self.Consts.Register.get_register_and_index(reg)
-
-        #mask = self.Consts.Register.get_register(
-        #    register_name=self.Consts.Register.Mask[register_name],
-        #    # FIXME: is that safe? think so
-        #    index=register_index
-        #)
-        mask = self.Consts.Register.Mask[register_name][register_index]
-
-        return mask
+        try:
+            return self.Consts.Register.mask_lookup[reg]
+        except KeyError as exc:
+            raise KeyError(f"register {h(reg)} has no mask") from exc
 
     def _get_register_mask_for_io_register(self, io_reg: int) -> int:
         """get the register needed for the masking
@@ -377,10 +783,7 @@ class MCP23017:
         :param io_reg: the gpio register that we need the mask for
         :return: register to pull the mask
         """
-        return self.Consts.Register.get_register_by_tuple(
-            self.Consts.Register.Mask["GPIO"],
-            self.Consts.Register.get_index(self.Consts.Register.GPIO, io_reg)
-        )
+        return self.Consts.Register.mask_lookup[io_reg]
 
     def _mask_inputs(self, v: GenericByteT, io_reg: int) -> GenericByteT:
         """
@@ -396,19 +799,30 @@ class MCP23017:
         """
         # the register to pull to mask
         mask_register = self._get_register_mask_for_io_register(io_reg)
-        self.lg.hw_debug(f"using as mask register for write validation: {h(mask_register)}")
+        self.lg.hw_debug("using as mask register for write validation: %#x", mask_register)
 
-        # we dont need to find out what is input and what output as its dynamic const
-        r = self.read(mask_register)
-        mask = r if self.Consts.bINPUT else invert(r, self.Consts.Register.bit_size)
+        return self._without_inputs(v, self.read(mask_register))
 
-        self.lg.hw_debug("the input mask is: " +
-                         f"{bfp(mask, self.Consts.Register.bit_size)}")
+    def _without_inputs(self, v: GenericByteT, modes: int) -> GenericByteT:
+        """
+        the io part of :_mask_inputs:
+
+        :param v: value to mask
+        :param modes: content of the IODIR register
+
+        :return: the masked value
+        """
+        # we dont need to find out what is input and what output as its dynamic const
+        mask = modes if self.Consts.bINPUT else invert(modes, self.Consts.Register.bit_size)
 
         masked_v = v & ~mask
 
-        self.lg.hw_debug("the masked value is: " +
-                         f" {bfp(masked_v), self.Consts.Register.bit_size}")
+        # bfp is not free, only format when someone looks
+        if self.lg.isEnabledFor(logging_modes.HW_DEBUG_lvl):
+            self.lg.hw_debug("the input mask is: " +
+                             f"{bfp(mask, self.Consts.Register.bit_size)}")
+            self.lg.hw_debug("the masked value is: " +
+                             f" {bfp(masked_v, self.Consts.Register.bit_size)}")
 
         return masked_v
 
@@ -424,53 +838,227 @@ class MCP23017:
         register, rel_gpio = self.get_register_gpio_tuple(
             self.Consts.Register.GPIO, gpio
         )
-        to_write = self._mask_inputs(
-            self.get_bit_enabled(register, rel_gpio, state),
-            register
-        )
-        self.write(
-            register, to_write,
-            # FIXME: am i using the right register for masking?
-            desired_value=to_write,
-            check_register=True,
-            check_mask=True,
-            check_mask_register=self.get_mask_reg(register),
-        )
+        # with a shadow the output latch is known, no need to read the pins
+        base_register = self._get_olat_for_gpio_register(register) \
+            if self.shadow_registers else register
+        with self._transaction():
+            to_write = self._mask_inputs(
+                self.get_bit_enabled(base_register, rel_gpio, state),
+                register
+            )
+            self.write(
+                register, to_write,
+                # FIXME: am i using the right register for masking?
+                desired_value=to_write,
+                check_register=True,
+                check_mask=True,
+                check_mask_register=self.get_mask_reg(register),
+            )
 
-    def gpio_digital_read(self, gpio) -> bool:
+    def gpio_digital_read(self, gpio, max_age: Optional[float] = None) -> bool:
         """
         Reads the current direction of the given GPIO
         :param gpio: the GPIO to read from
+        :param max_age: seconds the value may be old.  if the bank was read
+            that recently it comes from the input cache, without the bus.
+            only reads with a max_age fill the cache.  writes that change
+            the pins and interrupts drop it
         :return:
         """
 
         pair = self.get_register_gpio_tuple(self.Consts.Register.GPIO, gpio)
-        bits = self.read(pair[0])
+        if max_age is None:
+            bits = self.read(pair[0])
+        else:
+            bits = self._read_inputs((pair[0],), max_age)[0]
 
         # FIXME: im not consulting Consts.HIGH
         return bool(self._invert_io((bits & (1 << pair[1])) > 0, max_v=1))
 
-    def gpio_digital_read_all(self) -> List[int]:
+    def gpio_digital_read_all(self, max_age: Optional[float] = None) -> List[int]:
         """
+        :param max_age: see :gpio_digital_read:
         :return: list of state for each io bus
         """
-        return [
-            self._invert_io(self.read(reg))
-            for reg in self.Consts.Register.GPIO
-        ]
+        registers = self.Consts.Register.GPIO
+        if max_age is None:
+            values = self.read_pair(registers)
+        else:
+            values = self._read_inputs(registers, max_age)
+        return [self._invert_io(v) for v in values]
 
     def gpio_digital_write_all(self, state: bool):
-        for reg in self.Consts.Register.GPIO:
-            to_write = self._invert_io(self.Consts.HIGH if state else self.Consts.LOW)
+        to_write = self._invert_io(self.Consts.HIGH if state else self.Consts.LOW)
 
-            self.write(
-                reg=reg,
-                value=to_write,
-                check_register=True,
-                check_mask=True,
-                check_mask_register=self.get_mask_reg(reg)
+        self.write_pair(
+            self.Consts.Register.GPIO,
+            [to_write, to_write],
+            check=True,
+            check_mask_registers=self.Consts.Register.Mask["GPIO"],
+        )
+
+    def read_port(self, max_age: Optional[float] = None) -> int:
+        """
+        :param max_age: see :gpio_digital_read:
+        :return: all pins as 16 bit word, GPA0 is bit 0
+        """
+        low, high = self.gpio_digital_read_all(max_age)
+        return low | high << self.Consts.Register.bit_size
+
+    def write_port(self, mask: int, value: int, check: bool = True) -> None:
+        """set the pins in :mask: to their bits in :value:, the others stay
+
+        one write for both banks, the state before is only read for banks
+        that are partly in :mask:
+
+        :param mask: 16 bit word of the pins to set, GPA0 is bit 0
+        :param value: 16 bit word of their states
+        :param check: read back and retry if its not what we wrote
+        """
+        if self.validate and not (0 <= mask <= 0xFFFF and 0 <= value <= 0xFFFF):
+            raise ValueError(f"{mask=:#x} and {value=:#x} must be 16 bit words")
+
+        bits = self.Consts.Register.bit_size
+        max_v = self.Consts.Register.max_value
+        banks = [bank for bank in (0, 1) if mask >> bank * bits & max_v]
+        if not banks:
+            return
+
+        gpio = tuple(self.Consts.Register.GPIO[bank] for bank in banks)
+        modes = tuple(self.Consts.Register.IODIR[bank] for bank in banks)
+        bank_masks = [mask >> bank * bits & max_v for bank in banks]
+        bank_values = [
+            self._invert_io(value >> bank * bits & max_v) for bank in banks
+        ]
+
+        with self._transaction():
+            if all(m == max_v for m in bank_masks):
+                before = [0] * len(banks)
+            else:
+                # with a shadow the output latch is known, no need to read
+                before = self._read_registers(tuple(
+                    self._get_olat_for_gpio_register(reg) for reg in gpio
+                ) if self.shadow_registers else gpio)
+
+            to_write = [
+                self._without_inputs((b & ~m) | (v & m), mode)
+                for b, m, v, mode in zip(
+                    before, bank_masks, bank_values, self._read_registers(modes)
+                )
+            ]
+
+            if len(banks) == 2:
+                self.write_pair(
+                    gpio, to_write, check=check, check_mask_registers=modes
+                )
+            else:
+                self.write(
+                    gpio[0], to_write[0],
+                    check_register=check,
+                    desired_value=to_write[0],
+                    check_mask=True,
+                    check_mask_register=modes[0],
+                )
+
+    def _stream_chunks(self, values, other: int, chunk: int) -> List[bytearray]:
+        """the block writes of :stream_port:
+
+        every chunk starts at the latch of the bank, the pointer toggles
+        to the other latch after each byte, so that one gets :other: in
+        between
+
+        :param values: latch values of the bank
+        :param other: raw value of the latch of the other bank
+        :param chunk: most bytes per block
+        """
+        data = bytes(values)
+        if self.invert_io:
+            data = data.translate(_INVERT_BYTES)
+
+        stream = bytearray(2 * len(data))
+        stream[0::2] = data
+        stream[1::2] = bytes((other,)) * len(data)
+
+        # an odd length, so the last byte of a chunk is one of the bank
+        step = 2 * ((chunk + 1) // 2)
+        end = len(stream) - 1
+        return [
+            stream[start:min(start + step - 1, end)]
+            for start in range(0, end, step)
+        ]
+
+    def stream_port(self, bank: int, values, check: bool = True,
+                    chunk: int = MAX_BLOCK) -> int:
+        """write successive values to the output latch of a bank, in as few
+        transactions as possible
+
+        IOCON.SEQOP is set for the stream, in byte mode the address pointer
+        toggles between OLATA and OLATB, so a block write carries a new value
+        in every other byte and the current value of the other bank in
+        between.  IOCON is put back afterwards.  the values are not
+        verified one by one, other threads can not write to the board
+        while it streams
+
+        :param bank: 0 for the GPA pins, 1 for GPB
+        :param values: bytes, bytearray or memoryview of the latch values,
+            in the order they are to go out.  invert_io applies
+        :param check: read the latch back at the end and write the last
+            value again if it did not make it, verify the IOCON writes
+        :param chunk: bytes per transaction, the SMBus limit is 32
+
+        :return: number of block writes of the stream
+        """
+        if bank not in (0, 1):
+            raise ValueError(f"{bank=} has to be 0 or 1")
+        if not 1 <= chunk <= self.MAX_BLOCK:
+            raise ValueError(f"{chunk=} has to be between 1 and {self.MAX_BLOCK}")
+        if not len(values):
+            return 0
+
+        olat = self.Consts.Register.OLAT[bank]
+        iocon_reg = self.Consts.Register.IOCON[0]
+        seqop = 1 << self.Consts.SettingBit.SEQOP
+
+        with self._transaction():
+            chunks = self._stream_chunks(
+                values, self.read(self.Consts.Register.OLAT[1 - bank]), chunk
             )
 
+            iocon = self.read(iocon_reg)
+            if not iocon & seqop:
+                self.write(iocon_reg, iocon | seqop, check_register=check)
+            self.invalidate_inputs((olat,))
+            try:
+                for block in chunks:
+                    self.i2c.write_block(self.address, olat, block)
+            except BaseException:
+                # some of the stream is out, nobody knows how much
+                self.invalidate_shadow(olat)
+                self.invalidate_inputs((olat,))
+                if not iocon & seqop:
+                    try:
+                        self.write(iocon_reg, iocon, check_register=check)
+                    except IOError as exc:
+                        # the bus is bad, the error of the stream is the
+                        # one to raise.  SEQOP might still be set
+                        self.lg.error(
+                            "can't put back IOCON of %#x after the stream: %s",
+                            self.address, exc
+                        )
+                        self._shadow_unknown((iocon_reg,))
+                raise
+
+            self.invalidate_inputs((olat,))
+            if not iocon & seqop:
+                self.write(iocon_reg, iocon, check_register=check)
+
+            last = chunks[-1][-1]
+            self._shadow_written(olat, last)
+            if check and self.read(olat, use_shadow=False) != last:
+                self.write(olat, last)
+
+        return len(chunks)
+
     def get_register_gpio_tuple(self, registers, gpio) -> tuple:
         """
         chooses the right register and pin in that register
@@ -478,23 +1066,24 @@ class MCP23017:
         :param gpio:
         :return: register: int, gpio: int
         """
-        # DOC: we dont really use this in prod that much soon, so that should be not that big of a slowdown
-        if all(
-            offset not in self.Consts.Register.all_elements_in_tuple
-            for offset in registers
-        ):
-            raise TypeError(
-                "registers must be valid. See description for help")
-        if gpio not in self.Consts.IO.all_elements_in_tuple:
-            raise TypeError(
-                "pin must be one of GPAn or GPBn. See description for help")
+        if self.validate:
+            if registers not in self.Consts.Register.register_tuples:
+                raise TypeError(
+                    "registers must be valid. See description for help")
+            if gpio not in self.Consts.IO.pin_lookup:
+                raise TypeError(
+                    "pin must be one of GPAn or GPBn. See description for help")
 
-        bank = gpio // 8
-        return registers[bank], gpio % 8
+        bank, bit, _ = self.Consts.IO.pin_lookup[gpio]
+        return registers[bank], bit
 
     def get_bit_enabled(self, reg, gpio, enable) -> int:
-        state_before = self.read(reg)
+        return self._with_bit(self.read(reg), gpio, enable)
 
+    def _with_bit(self, state_before: int, gpio, enable) -> int:
+        """
+        the io free part of :get_bit_enabled:
+        """
         return (state_before | self.bitmask(
             gpio,
             self.Consts.Register.bit_size
@@ -507,14 +1096,64 @@ class MCP23017:
     def bitmask(gpio, bit_size: int = 8):
         return 1 << (gpio % bit_size)
 
-    # FIXME: these might not work, they old
+    def set_bit_enabled(self, reg, bit, enable) -> None:
+        """
+        set or clear a single bit of a register
+
+        :param reg: register to change
+        :param bit: bit in that register
+        :param enable: set if True, clear if False
+        """
+        with self._transaction():
+            self.write(reg, self.get_bit_enabled(reg, bit, enable))
+
+    def _transaction(self):
+        """
+        keeps other threads from writing to the board during a
+        read-modify-write, if the i2c object can (see :I2C.transaction:)
+        """
+        transaction = getattr(self.i2c, "transaction", None)
+        return transaction(self.address) if transaction is not None \
+            else nullcontext()
+
     def set_all_interrupt(self, enabled):
         """
         Enables or disables the interrupt of a all GPIOs
         :param enabled: enable or disable the interrupt
         """
-        self.write(self.Consts.Register.GPINTEN[0], 0xFF if enabled else 0x00)
-        self.write(self.Consts.Register.GPINTEN[1], 0xFF if enabled else 0x00)
+        value = 0xFF if enabled else 0x00
+        self.write_pair(self.Consts.Register.GPINTEN, [value, value])
+
+    def set_interrupt(self, gpio, enabled: bool) -> None:
+        """
+        Enables or disables interrupt-on-change of one GPIO
+        :param gpio: the GPIO
+        :param enabled: enable or disable the interrupt
+        """
+        register, rel_gpio = self.get_register_gpio_tuple(
+            self.Consts.Register.GPINTEN, gpio
+        )
+        self.set_bit_enabled(register, rel_gpio, enabled)
+
+    def set_interrupt_compare(self, gpio, compare: bool,
+                              default_value: bool = False) -> None:
+        """
+        choose what a GPIO is compared to for its interrupt
+
+        :param gpio: the GPIO
+        :param compare: if True the interrupt fires while the pin differs
+            from :default_value:, if False on every change of the pin
+        :param default_value: the value the pin is compared to
+        """
+        register, rel_gpio = self.get_register_gpio_tuple(
+            self.Consts.Register.DEFVAL, gpio
+        )
+        self.set_bit_enabled(register, rel_gpio, default_value)
+
+        register, rel_gpio = self.get_register_gpio_tuple(
+            self.Consts.Register.INTCON, gpio
+        )
+        self.set_bit_enabled(register, rel_gpio, compare)
 
     def set_interrupt_mirror(self, enable):
         """
@@ -567,6 +1206,24 @@ class MCP23017:
             for reg in self.Consts.Register.INTF
         ]
 
+    def read_interrupt_state(self) -> tuple[int, int]:
+        """
+        read the interrupt flags and captures of both ports
+
+        reading the captures clears the interrupt on the board
+
+        :return: (flags, captures) as 16 bit words, GPA0 is bit 0
+        """
+        # something changed on the pins
+        self.invalidate_inputs()
+        flags = self.read_pair(self.Consts.Register.INTF)
+        captures = self.read_pair(self.Consts.Register.INTCAP)
+
+        return (
+            flags[0] | flags[1] << self.Consts.Register.bit_size,
+            captures[0] | captures[1] << self.Consts.Register.bit_size,
+        )
+
     def _invert_io(self, v: int, max_v: Optional[int] = None) -> int:
         """
         invert based on bus lenght
@@ -601,3 +1258,7 @@ def invert(v: int, size: int) -> int:
     :return: invert of :v: with size of :size:
     """
     return ~v & size
+
+
+# every byte inverted, for bytes.translate
+_INVERT_BYTES = bytes(invert(v, 0xFF) for v in range(256))
@@ -0,0 +1,235 @@
+"""
+software PWM for the output pins of a board
+"""
+
+import logging
+import threading
+import time
+
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .mcp23017 import MCP23017
+
+
+class PWMReport(NamedTuple):
+    # what was asked for and what the bus made of it
+    target_frequency_hz: float
+    frequency_hz: float
+    periods: int
+    # slots that started a whole slot late
+    missed_slots: int
+    writes_per_s: float
+    # gpio -> measured duty minus requested duty
+    duty_error: Dict[int, float]
+
+
+class SoftwarePWM:
+    """
+    PWM on any number of output pins of a board
+
+    a period is cut into :resolution: slots, a pin with duty d is on for
+    the first round(d * resolution) of them.  the words of all slots are
+    computed when a duty changes, playing a slot is one unverified
+    :MCP23017.write_port: for both banks and only if the word differs from
+    the slot before.  the first slot of a period is always written, that
+    repairs what a noisy bus did to the last period
+
+    use a board with shadow_registers, otherwise every write has to read
+    the pins that are not part of the PWM first
+    """
+
+    def __init__(self, board: MCP23017, frequency_hz: float = 100.0,
+                 resolution: int = 10,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Optional[Callable[[float], None]] = None) -> None:
+        """
+        :param board: the board the pins are on
+        :param frequency_hz: PWM frequency
+        :param resolution: slots per period, the duty goes in steps of
+            1 / resolution
+        :param clock: where the time comes from
+        :param sleep: how to wait for a slot, None waits for real.  give
+            the sleep of a :VirtualClock: with its clock
+        """
+        if frequency_hz <= 0 or resolution < 1:
+            raise ValueError(f"{frequency_hz=} and {resolution=} must be positive")
+
+        self.lg = logging.getLogger(self.__class__.__name__)
+
+        self.board = board
+        self.frequency_hz = frequency_hz
+        self.resolution = resolution
+        self.slot_s = 1 / (frequency_hz * resolution)
+        self.clock = clock
+        self.sleep = sleep
+
+        self._lock = threading.Lock()
+        # gpio -> (bit in the port word, duty)
+        self._duties: Dict[int, tuple] = {}
+        self._mask = 0
+        self._slots: List[int] = [0] * resolution
+
+        # gpio -> since when it is on, and its on time over whole periods
+        self._on_since: Dict[int, float] = {}
+        self._on_s: Dict[int, float] = {}
+        # _on_s at the start of the last period, what the report goes by
+        self._booked: Dict[int, float] = {}
+
+        self.periods: int = 0
+        self.missed_slots: int = 0
+        self.writes: int = 0
+        self._first_period: Optional[float] = None
+        self._last_period: Optional[float] = None
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _bit(self, gpio) -> int:
+        bank, bit, _ = self.board.Consts.IO.pin_lookup[gpio]
+        return bank * self.board.Consts.Register.bit_size + bit
+
+    def _build(self) -> None:
+        """
+        compute the words of the slots, the lock has to be held
+        """
+        slots = [0] * self.resolution
+        mask = 0
+        for bit, duty in self._duties.values():
+            mask |= 1 << bit
+            for slot in range(round(duty * self.resolution)):
+                slots[slot] |= 1 << bit
+        self._slots = slots
+        self._mask = mask
+
+    def set_duty(self, gpio, duty: float) -> None:
+        """
+        :param gpio: the pin, has to be an output
+        :param duty: 0 to 1, part of the period the pin is on
+        """
+        if not 0 <= duty <= 1:
+            raise ValueError(f"{duty=} has to be between 0 and 1")
+
+        with self._lock:
+            self._duties[gpio] = (self._bit(gpio), duty)
+            self._build()
+
+    def remove(self, gpio) -> None:
+        """
+        stop the PWM of a pin, it keeps the state it has
+        """
+        with self._lock:
+            self._duties.pop(gpio, None)
+            self._on_s.pop(gpio, None)
+            self._booked.pop(gpio, None)
+            self._on_since.pop(gpio, None)
+            self._build()
+
+    def _wait_until(self, deadline: float) -> None:
+        remaining = deadline - self.clock()
+        if remaining <= 0:
+            return
+        if self.sleep is not None:
+            self.sleep(remaining)
+        else:
+            self._stop.wait(remaining)
+
+    def _account(self, now: float, value: int, duties: Dict[int, tuple]) -> None:
+        """
+        book the on time of the pins that changed with the write at :now:
+        """
+        for gpio, (bit, _) in duties.items():
+            on = bool(value >> bit & 1)
+            since = self._on_since.get(gpio)
+            if since is not None and not on:
+                self._on_s[gpio] = self._on_s.get(gpio, 0.0) + now - since
+                del self._on_since[gpio]
+            elif since is None and on:
+                self._on_since[gpio] = now
+
+    def run_period(self) -> None:
+        """
+        play one period on this thread
+        """
+        with self._lock:
+            slots, mask = self._slots, self._mask
+            duties = dict(self._duties)
+
+        start = self.clock()
+        # book the on time of pins that stay on over the period boundary
+        for gpio, since in list(self._on_since.items()):
+            self._on_s[gpio] = self._on_s.get(gpio, 0.0) + start - since
+            self._on_since[gpio] = start
+        if self._first_period is None:
+            self._first_period = start
+            self._on_s.clear()
+        self._booked = dict(self._on_s)
+        self._last_period = start
+        self.periods += 1
+
+        if not mask:
+            self._wait_until(start + self.resolution * self.slot_s)
+            return
+
+        last = None
+        for slot, value in enumerate(slots):
+            deadline = start + slot * self.slot_s
+            self._wait_until(deadline)
+            if self.clock() - deadline >= self.slot_s:
+                self.missed_slots += 1
+
+            if value == last:
+                continue
+            try:
+                self.board.write_port(mask, value, check=False)
+            except IOError as exc:
+                self.lg.error(f"PWM write to {hex(self.board.address)} failed: {exc}")
+                continue
+            self.writes += 1
+            last = value
+            self._account(self.clock(), value, duties)
+
+        self._wait_until(start + self.resolution * self.slot_s)
+
+    def report(self) -> PWMReport:
+        """
+        :return: how well the PWM kept up so far, over whole periods
+        """
+        periods = self.periods - 1
+        elapsed = (self._last_period - self._first_period) \
+            if periods > 0 else 0.0
+
+        duty_error = {}
+        if elapsed > 0:
+            with self._lock:
+                duties = dict(self._duties)
+            for gpio, (_, duty) in duties.items():
+                duty_error[gpio] = self._booked.get(gpio, 0.0) / elapsed - duty
+
+        return PWMReport(
+            target_frequency_hz=self.frequency_hz,
+            frequency_hz=periods / elapsed if elapsed > 0 else 0.0,
+            periods=periods,
+            missed_slots=self.missed_slots,
+            writes_per_s=self.writes / elapsed if elapsed > 0 else 0.0,
+            duty_error=duty_error,
+        )
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=self.__class__.__name__, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.run_period()
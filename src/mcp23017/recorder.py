@@ -0,0 +1,255 @@
+"""
+record the traffic of an :I2C: to a compact binary file and replay it
+against an emulated bus
+"""
+
+import errno
+import logging
+import struct
+import threading
+import time
+
+from typing import BinaryIO, Callable, Iterator, List, NamedTuple, Optional, Union
+
+from .tracer import NO_REGISTER, READ, READ_BLOCK, WRITE, WRITE_BLOCK
+
+MAGIC = b"MCPR"
+VERSION = 1
+
+# direction, result, address, register, number of bytes and the time since
+# the transaction before in us.  the bytes follow.  a direction is never
+# the first byte of MAGIC, that tells transactions and headers apart
+_HEADER = struct.Struct("<BBBBBI")
+_MAX_DELTA_US = 0xFFFFFFFF
+
+# result of a transaction that went through
+OK = 0
+
+
+class LogEntry(NamedTuple):
+    # seconds since the first transaction of the log
+    timestamp: float
+    address: int
+    # NO_REGISTER for reads without one
+    register: int
+    direction: int
+    # OK or the errno the smbus raised
+    result: int
+    # zeros for reads that failed, as many as were asked for
+    values: bytes
+
+
+class Recorder:
+    """
+    appends every transaction of an :I2C: to a file, give it as its
+    :recorder:
+
+    a transaction is 9 bytes plus its data, nothing is formatted.  the
+    file is written through a buffer, :flush: or :close: it before reading
+    it.  several recordings can go to one file, each starts over with its
+    own header
+    """
+
+    def __init__(self, file: Union[str, BinaryIO],
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param file: path, opened for appending, or a binary file
+        :param clock: where the timestamps come from
+        """
+        self._own_file = isinstance(file, str)
+        self.file = open(file, "ab") if self._own_file else file
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._last_us: Optional[int] = None
+        self.recorded: int = 0
+
+        self.file.write(MAGIC + bytes((VERSION,)))
+
+    def record(self, address: int, register, values, direction: int,
+               result: int = OK) -> None:
+        """
+        :param address:
+        :param register: None for reads without a register
+        :param values: the bytes written or read, zeros for the length of a
+            read that failed
+        :param direction: READ, WRITE, READ_BLOCK or WRITE_BLOCK
+        :param result: OK or the errno of the failure
+        """
+        now_us = int(self.clock() * 1e6)
+        data = bytes(values)
+
+        with self._lock:
+            delta = 0 if self._last_us is None else now_us - self._last_us
+            self._last_us = now_us
+            self.file.write(_HEADER.pack(
+                direction, result & 0xFF, address & 0xFF,
+                NO_REGISTER if register is None else register & 0xFF,
+                len(data), min(max(delta, 0), _MAX_DELTA_US),
+            ) + data)
+            self.recorded += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            self.file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self.file.flush()
+            if self._own_file:
+                self.file.close()
+
+    def __enter__(self) -> "Recorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_log(file: Union[str, BinaryIO]) -> Iterator[LogEntry]:
+    """
+    :param file: path or binary file of a :Recorder:
+
+    :return: the transactions, in the order they happened
+    """
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            yield from read_log(f)
+        return
+
+    timestamp_us = 0
+    while True:
+        first = file.read(1)
+        if not first:
+            return
+        if first == MAGIC[:1]:
+            head = first + file.read(len(MAGIC))
+            if head != MAGIC + bytes((VERSION,)):
+                raise ValueError(f"{head!r} is not the header of a version {VERSION} log")
+            continue
+
+        header = first + file.read(_HEADER.size - 1)
+        if len(header) < _HEADER.size:
+            # the recording was cut off in the middle of a transaction
+            return
+        direction, result, address, register, n, delta = _HEADER.unpack(header)
+        values = file.read(n)
+        if len(values) < n:
+            return
+
+        timestamp_us += delta
+        yield LogEntry(
+            timestamp_us / 1e6, address, register, direction, result, values
+        )
+
+
+class Divergence(NamedTuple):
+    # position in the log
+    index: int
+    entry: LogEntry
+    # what the replay got instead
+    result: int
+    values: bytes
+
+
+class ReplayReport(NamedTuple):
+    transactions: int
+    elapsed_s: float
+    transactions_per_s: float
+    # transactions that did not do what they did in the log
+    diverged: int
+    # the first of them
+    divergences: List[Divergence]
+
+
+class Replayer:
+    """
+    runs a log against an smbus, usually an :EmulatedSMBus:
+
+    reads are compared with the log, so is the outcome of every
+    transaction.  writes are sent as they are recorded
+    """
+
+    def __init__(self, smbus, clock: Callable[[], float] = time.perf_counter,
+                 sleep: Callable[[float], None] = time.sleep,
+                 max_divergences: int = 100) -> None:
+        """
+        :param smbus: where the log goes to
+        :param clock: where the time for real time replays and the
+            throughput comes from
+        :param sleep: how to wait in real time replays
+        :param max_divergences: number of divergences the report keeps
+        """
+        self.lg = logging.getLogger(self.__class__.__name__)
+
+        self.smbus = smbus
+        self.clock = clock
+        self.sleep = sleep
+        self.max_divergences = max_divergences
+
+    def _run_one(self, entry: LogEntry) -> bytes:
+        address, register = entry.address, entry.register
+        direction = entry.direction
+        if direction == WRITE:
+            self.smbus.write_byte_data(address, register, entry.values[0])
+        elif direction == WRITE_BLOCK:
+            self.smbus.write_i2c_block_data(address, register, list(entry.values))
+        elif direction == READ:
+            return bytes((
+                self.smbus.read_byte(address) if register == NO_REGISTER
+                else self.smbus.read_byte_data(address, register),
+            ))
+        elif direction == READ_BLOCK:
+            return bytes(self.smbus.read_i2c_block_data(
+                address, register, len(entry.values)
+            ))
+        else:
+            raise ValueError(f"unknown direction {direction} in {entry}")
+        return entry.values
+
+    def run(self, entries, real_time: bool = False) -> ReplayReport:
+        """
+        :param entries: the log, see :read_log:
+        :param real_time: keep the time between the transactions as
+            recorded, otherwise as fast as possible
+        """
+        divergences: List[Divergence] = []
+        diverged = 0
+        n = 0
+
+        start = self.clock()
+        first: Optional[float] = None
+        for index, entry in enumerate(entries):
+            if real_time:
+                if first is None:
+                    first = entry.timestamp
+                remaining = start + entry.timestamp - first - self.clock()
+                if remaining > 0:
+                    self.sleep(remaining)
+
+            try:
+                values = self._run_one(entry)
+                result = OK
+            except OSError as exc:
+                values = bytes(len(entry.values))
+                result = (exc.errno or errno.EIO) & 0xFF
+            n += 1
+
+            if result != entry.result or (
+                result == OK and values != entry.values
+            ):
+                diverged += 1
+                if len(divergences) < self.max_divergences:
+                    divergences.append(Divergence(index, entry, result, values))
+                self.lg.debug(
+                    "%d: %s replayed as %s %s", index, entry, result, values
+                )
+
+        elapsed = self.clock() - start
+        return ReplayReport(
+            transactions=n,
+            elapsed_s=elapsed,
+            transactions_per_s=n / elapsed if elapsed > 0 else 0.0,
+            diverged=diverged,
+            divergences=divergences,
+        )
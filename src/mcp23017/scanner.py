@@ -0,0 +1,179 @@
+"""
+one shared polling loop for the inputs of boards without a wired INT line
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from typing import Callable, List, NamedTuple, Optional
+
+from .debounce import Debouncer
+from .mcp23017 import MCP23017
+
+from . import logging_modes
+
+
+class EdgeEvent(NamedTuple):
+    board: MCP23017
+    gpio: int
+    old: bool
+    new: bool
+    timestamp: float
+
+
+class _ScannedBoard:
+    __slots__ = ("board", "mask", "debouncer", "previous")
+
+    def __init__(self, board: MCP23017, mask: int,
+                 debouncer: Optional[Debouncer]) -> None:
+        self.board = board
+        self.mask = mask
+        self.debouncer = debouncer
+        # last sample as 16 bit word, None before the first scan
+        self.previous: Optional[int] = None
+
+
+class InputScanner:
+    """
+    reads the GPIO registers of all registered boards :rate_hz: times a
+    second and publishes an :EdgeEvent: for every pin that changed
+
+    events go to :events: and to the callbacks, the first scan of a board
+    only takes the reference sample
+    """
+
+    def __init__(self, rate_hz: float = 100.0,
+                 events: Optional[queue.Queue] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param rate_hz: scans per second
+        :param events: where the events go, a new unbounded queue if None
+        :param clock: timestamps of the events and the scan deadlines
+        """
+        self.lg = logging.getLogger(self.__class__.__name__)
+
+        self.period = 1 / rate_hz
+        self.events = events if events is not None else queue.Queue()
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._boards: List[_ScannedBoard] = []
+        self._callbacks: List[Callable[[EdgeEvent], None]] = []
+
+        # some numbers to see if the rate is too high for the bus
+        self.scans: int = 0
+        self.overruns: int = 0
+        self.max_scan_s: float = 0.0
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_board(self, board: MCP23017, mask: int = 0xFFFF,
+                  debouncer: Optional[Debouncer] = None) -> None:
+        """
+        :param board: board to scan
+        :param mask: 16 bit word of the pins to report, GPA0 is bit 0
+        :param debouncer: the samples go through it first, edges are those
+            of the debounced state
+        """
+        with self._lock:
+            self._boards.append(_ScannedBoard(board, mask, debouncer))
+
+    def remove_board(self, board: MCP23017) -> None:
+        with self._lock:
+            self._boards = [s for s in self._boards if s.board is not board]
+
+    def add_callback(self, callback: Callable[[EdgeEvent], None]) -> None:
+        """
+        :param callback: called with every event, from the scanning thread
+        """
+        self._callbacks.append(callback)
+
+    @staticmethod
+    def sample(board: MCP23017) -> int:
+        """
+        :return: the inputs of :board: as 16 bit word, GPA0 is bit 0
+        """
+        return board.read_port()
+
+    def scan_once(self) -> int:
+        """
+        read every board once and publish the changes
+
+        :return: number of events
+        """
+        with self._lock:
+            boards = list(self._boards)
+
+        n = 0
+        for scanned in boards:
+            try:
+                current = self.sample(scanned.board)
+            except IOError as exc:
+                self.lg.error(f"scanning {hex(scanned.board.address)} failed: {exc}")
+                continue
+            timestamp = self.clock()
+
+            if scanned.debouncer is not None:
+                scanned.debouncer.feed(current)
+                current = scanned.debouncer.state
+
+            previous = scanned.previous
+            scanned.previous = current
+            if previous is None:
+                continue
+
+            changed = (current ^ previous) & scanned.mask
+            while changed:
+                low_bit = changed & -changed
+                changed ^= low_bit
+
+                event = EdgeEvent(
+                    scanned.board, low_bit.bit_length() - 1,
+                    bool(previous & low_bit), bool(current & low_bit),
+                    timestamp,
+                )
+                self.events.put(event)
+                for callback in self._callbacks:
+                    try:
+                        callback(event)
+                    except Exception:  # dont let one callback stop the scans
+                        self.lg.exception(f"callback failed for {event}")
+                n += 1
+
+        self.scans += 1
+        return n
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=self.__class__.__name__, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        deadline = self.clock()
+        while not self._stop.is_set():
+            started = self.clock()
+            self.scan_once()
+            self.max_scan_s = max(self.max_scan_s, self.clock() - started)
+
+            # scan on a fixed grid, so the rate does not drift with the
+            # time a scan takes
+            deadline += self.period
+            now = self.clock()
+            if now > deadline:
+                self.overruns += 1
+                deadline = now
+            self._stop.wait(deadline - now)
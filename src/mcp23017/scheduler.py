@@ -0,0 +1,356 @@
+"""
+one queue for everything that goes over a bus shared by several boards
+"""
+
+import logging
+import threading
+
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from .helper import GenericByteT, h
+from .i2c import I2C
+from .mcp23017 import MCP23017
+
+from . import logging_modes
+
+
+READ = 0
+WRITE = 1
+READ_BLOCK = 2
+WRITE_BLOCK = 3
+
+
+class _Operation:
+    """
+    one queued bus operation
+    """
+    __slots__ = (
+        "kind", "address", "register", "value", "priority", "retry",
+        "future", "followers",
+    )
+
+    def __init__(self, kind: int, address: int, register: Optional[int],
+                 value, priority: int, retry: int = 0) -> None:
+        self.kind = kind
+        self.address = address
+        self.register = register
+        # the value to write, or the length for block reads
+        self.value = value
+        self.priority = priority
+        # passed on to the I2C object for its tracer
+        self.retry = retry
+        self.future: Future = Future()
+        # futures of writes that were merged into this one
+        self.followers: List[Future] = []
+
+
+class BusScheduler:
+    """
+    owns the I2C object of a bus and dispatches the operations of all boards
+    on it from one worker thread
+
+    - lower priority value goes first
+    - within a priority the boards (addresses) take turns
+    - a queued write to a register in :coalesce_registers: is replaced by a
+      newer write to the same board and register, as long as nothing else
+      for that board was queued in between.  the newer value goes out at
+      the place of the old one, both futures finish with it
+
+    the order of operations of one board is only kept within a priority, so
+    give each board one priority
+    """
+
+    def __init__(self, i2c: I2C,
+                 coalesce_registers: Optional[Iterable[int]] = None) -> None:
+        """
+        :param i2c: the bus, nobody else should use it directly
+        :param coalesce_registers: registers where only the last write
+            counts, GPIO and OLAT if None
+        """
+        self.lg = logging.getLogger(self.__class__.__name__)
+
+        self.i2c = i2c
+        self.coalesce_registers = frozenset(
+            coalesce_registers if coalesce_registers is not None
+            else MCP23017.Consts.Register.GPIO + MCP23017.Consts.Register.OLAT
+        )
+
+        self._cond = threading.Condition()
+        # priority -> address -> operations, addresses in round robin order
+        self._queues: Dict[int, OrderedDict] = {}
+        # (address, register) -> queued write newer writes can merge into
+        self._mergeable: Dict[tuple[int, int], _Operation] = {}
+
+        self.dispatched: int = 0
+        self.coalesced: int = 0
+
+        # address -> lock of the board, see :ScheduledI2C.transaction:
+        self._address_locks: Dict[int, threading.RLock] = {}
+        self._address_locks_guard = threading.Lock()
+
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # set by :stop:, nothing would dispatch what is queued after it
+        self._stopped = False
+
+    def start(self) -> None:
+        """
+        start the worker thread
+        """
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._stopped = False
+
+        self._thread = threading.Thread(
+            target=self._worker, name=self.__class__.__name__, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        dispatch whatever is queued and stop the worker thread
+        """
+        with self._cond:
+            self._running = False
+            self._stopped = True
+            self._cond.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "BusScheduler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def address_lock(self, address: GenericByteT) -> threading.RLock:
+        """
+        :return: the lock of the board at :address:, shared by all clients
+        """
+        with self._address_locks_guard:
+            return self._address_locks.setdefault(address, threading.RLock())
+
+    def client(self, priority: int = 0,
+               wait_writes: bool = True) -> "ScheduledI2C":
+        """
+        something to hand to a board instead of the I2C object
+
+        :param priority: priority of everything the client queues
+        :param wait_writes: block on writes until they are on the bus, if
+            False writes are only queued (and can be merged)
+        """
+        return ScheduledI2C(self, priority, wait_writes)
+
+    def submit(self, kind: int, address: GenericByteT,
+               register: Optional[GenericByteT] = None, value=None,
+               priority: int = 0, retry: int = 0) -> Future:
+        """
+        queue an operation
+
+        :param kind: READ, WRITE, READ_BLOCK or WRITE_BLOCK
+        :param address:
+        :param register:
+        :param value: value for WRITE, values for WRITE_BLOCK and the length
+            for READ_BLOCK
+        :param priority: lower goes first
+        :param retry: see :I2C.write:
+
+        :return: future with the result of the operation
+
+        :raises RuntimeError: if the scheduler was stopped
+        """
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("the scheduler was stopped")
+
+            key = (address, register)
+
+            if kind == WRITE and register in self.coalesce_registers:
+                queued = self._mergeable.get(key)
+                if queued is not None:
+                    self.lg.hw_debug(
+                        "merging write of %#x at %#x register %#x into a queued one",
+                        value, address, register
+                    )
+                    queued.value = value
+                    future = Future()
+                    queued.followers.append(future)
+                    self.coalesced += 1
+                    return future
+
+            # anything else for the board keeps older writes from merging
+            # with newer ones, the order would change otherwise
+            for mergeable_key in [k for k in self._mergeable if k[0] == address]:
+                del self._mergeable[mergeable_key]
+
+            op = _Operation(kind, address, register, value, priority, retry)
+            if kind == WRITE and register in self.coalesce_registers:
+                self._mergeable[key] = op
+
+            queue = self._queues.setdefault(priority, OrderedDict())
+            queue.setdefault(address, deque()).append(op)
+
+            self._cond.notify()
+            return op.future
+
+    def _pop(self) -> Optional[_Operation]:
+        """
+        get the next operation, the lock has to be held
+
+        :return: next operation or None if nothing is queued
+        """
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            address, ops = next(iter(queue.items()))
+            op = ops.popleft()
+
+            if ops:
+                # the board goes to the back of the line
+                queue.move_to_end(address)
+            else:
+                del queue[address]
+            if not queue:
+                del self._queues[priority]
+
+            if self._mergeable.get((op.address, op.register)) is op:
+                del self._mergeable[(op.address, op.register)]
+            return op
+        return None
+
+    def _dispatch(self, op: _Operation) -> None:
+        """
+        run the operation on the bus and finish its futures, if all of
+        them were cancelled it is dropped
+        """
+        futures = [
+            future for future in [op.future, *op.followers]
+            if not future.done() and future.set_running_or_notify_cancel()
+        ]
+        if not futures:
+            return
+
+        try:
+            if op.kind == READ:
+                result = self.i2c.read(op.address, op.register)
+            elif op.kind == WRITE:
+                result = self.i2c.write(
+                    op.address, op.register, op.value, retry=op.retry
+                )
+            elif op.kind == READ_BLOCK:
+                result = self.i2c.read_block(op.address, op.register, op.value)
+            elif op.kind == WRITE_BLOCK:
+                result = self.i2c.write_block(
+                    op.address, op.register, op.value, retry=op.retry
+                )
+            else:
+                raise ValueError(f"unknown operation {op.kind}")
+        except Exception as exc:  # the caller gets it through the future
+            for future in futures:
+                future.set_exception(exc)
+        else:
+            for future in futures:
+                future.set_result(result)
+
+        self.dispatched += 1
+
+    def dispatch_pending(self) -> int:
+        """
+        dispatch everything queued on the calling thread, for use without
+        the worker
+
+        :return: number of operations dispatched
+        """
+        n = 0
+        while True:
+            with self._cond:
+                op = self._pop()
+            if op is None:
+                return n
+            self._dispatch(op)
+            n += 1
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                op = self._pop()
+                while op is None and self._running:
+                    self._cond.wait()
+                    op = self._pop()
+
+            if op is None:
+                return
+            self._dispatch(op)
+
+
+class ScheduledI2C:
+    """
+    looks like :I2C: to a board, but queues everything in a :BusScheduler:
+    """
+
+    def __init__(self, scheduler: BusScheduler, priority: int = 0,
+                 wait_writes: bool = True) -> None:
+        """
+        :param scheduler:
+        :param priority: see :BusScheduler.submit:
+        :param wait_writes: see :BusScheduler.client:
+        """
+        self.scheduler = scheduler
+        self.priority = priority
+        self.wait_writes = wait_writes
+
+    def transaction(self, address: GenericByteT):
+        """
+        see :I2C.transaction:, the lock is shared by all clients of the
+        scheduler
+        """
+        return self.scheduler.address_lock(address)
+
+    def update_bits(self, address: GenericByteT, register: GenericByteT,
+                    mask: int, value: int) -> int:
+        """
+        see :I2C.update_bits:
+        """
+        with self.transaction(address):
+            before = self.read(address, register)
+            after = (before & ~mask) | (value & mask)
+            if after != before:
+                self.write(address, register, after)
+            return after
+
+    def write(self, address: GenericByteT, register: GenericByteT,
+              value: GenericByteT, retry: int = 0) -> None:
+        with self.transaction(address):
+            future = self.scheduler.submit(
+                WRITE, address, register, value, self.priority, retry
+            )
+        if self.wait_writes:
+            future.result()
+
+    def read(self, address: GenericByteT,
+             register: Optional[GenericByteT] = None):
+        return self.scheduler.submit(
+            READ, address, register, priority=self.priority
+        ).result()
+
+    def write_block(self, address: GenericByteT, register: GenericByteT,
+                    values: Sequence[GenericByteT], retry: int = 0) -> None:
+        with self.transaction(address):
+            future = self.scheduler.submit(
+                WRITE_BLOCK, address, register, list(values), self.priority,
+                retry
+            )
+        if self.wait_writes:
+            future.result()
+
+    def read_block(self, address: GenericByteT, register: GenericByteT,
+                   length: int) -> List[GenericByteT]:
+        return self.scheduler.submit(
+            READ_BLOCK, address, register, length, self.priority
+        ).result()
@@ -0,0 +1,236 @@
+"""
+timed output patterns, played on a deadline grid with one write per tick
+"""
+
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+
+from collections import deque
+from typing import Callable, Deque, List, Optional, Sequence, Tuple
+
+from .mcp23017 import MCP23017
+
+
+class SequencePlayer:
+    """
+    plays timed output sequences on the pins of a board
+
+    time is cut into ticks of :tick_s:, everything due within a tick goes
+    out in one :MCP23017.write_port: at the start of the next one, so a
+    tick costs one write for both banks no matter how many pins change.
+    a pin changed twice within a tick gets the later state
+
+    a tick that starts late counts as jitter, one that starts a tick or
+    more late as missed deadline
+    """
+
+    def __init__(self, board: MCP23017, tick_s: float = 0.001,
+                 check: bool = False,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Optional[Callable[[float], None]] = None,
+                 jitter_history: int = 1024) -> None:
+        """
+        :param board: the board the pins are on
+        :param tick_s: resolution of the schedules
+        :param check: verify the writes, off by default as a retry makes
+            the tick late anyway
+        :param clock: where the time comes from
+        :param sleep: how the thread waits, None waits for real and can be
+            woken up by new sequences.  give the sleep of a :VirtualClock:
+            with its clock
+        :param jitter_history: number of ticks :jitter_s: keeps
+        """
+        if tick_s <= 0:
+            raise ValueError(f"{tick_s=} has to be positive")
+
+        self.lg = logging.getLogger(self.__class__.__name__)
+
+        self.board = board
+        self.tick_s = tick_s
+        self.check = check
+        self.clock = clock
+        self.sleep = sleep
+
+        self._lock = threading.Lock()
+        # (due, order, bit, state, loop_s), order keeps the heap stable
+        self._events: List[Tuple[float, int, int, bool, Optional[float]]] = []
+        self._order = itertools.count()
+        # start of the tick grid
+        self._origin = clock()
+        # a change right on the grid must not slip a tick by rounding
+        self._slack = tick_s * 1e-6
+
+        # how late each tick started, newest last
+        self.jitter_s: Deque[float] = deque(maxlen=jitter_history)
+        self.max_jitter_s: float = 0.0
+        self.ticks: int = 0
+        self.missed: int = 0
+        self.writes: int = 0
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _bit(self, gpio) -> int:
+        bank, bit, _ = self.board.Consts.IO.pin_lookup[gpio]
+        return bank * self.board.Consts.Register.bit_size + bit
+
+    def add_sequence(self, gpio, steps: Sequence[Tuple[float, bool]],
+                     start: Optional[float] = None,
+                     loop_s: Optional[float] = None) -> None:
+        """
+        :param gpio: the pin, has to be an output
+        :param steps: (seconds after :start:, state) for every change
+        :param start: clock time the sequence starts at, now if None
+        :param loop_s: play it again every :loop_s: seconds, forever
+        """
+        if loop_s is not None and loop_s <= 0:
+            raise ValueError(f"{loop_s=} has to be positive")
+
+        bit = self._bit(gpio)
+        start = self.clock() if start is None else start
+        with self._lock:
+            for offset, state in steps:
+                heapq.heappush(self._events, (
+                    start + offset, next(self._order), bit, bool(state), loop_s
+                ))
+        self._wake.set()
+
+    def blink(self, gpio, period_s: float, duty: float = 0.5,
+              start: Optional[float] = None) -> None:
+        """
+        switch a pin on and off forever
+
+        :param period_s: time of one on and off
+        :param duty: part of the period the pin is on
+        """
+        self.add_sequence(
+            gpio, [(0.0, True), (period_s * duty, False)], start, period_s
+        )
+
+    def clear(self, gpio=None) -> None:
+        """
+        forget what is scheduled for :gpio:, for every pin if None
+        """
+        with self._lock:
+            if gpio is None:
+                self._events.clear()
+                return
+            bit = self._bit(gpio)
+            self._events = [e for e in self._events if e[2] != bit]
+            heapq.heapify(self._events)
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        :return: start of the tick the next change goes out in, None if
+            nothing is scheduled
+        """
+        with self._lock:
+            if not self._events:
+                return None
+            due = self._events[0][0]
+
+        ticks = math.ceil((due - self._origin - self._slack) / self.tick_s)
+        return self._origin + ticks * self.tick_s
+
+    def run_pending(self, deadline: Optional[float] = None) -> bool:
+        """
+        write everything that is due
+
+        :param deadline: the tick this is for, to measure how late it is
+
+        :return: True if something was written
+        """
+        now = self.clock()
+        if deadline is not None:
+            late = max(now - deadline, 0.0)
+            self.jitter_s.append(late)
+            self.max_jitter_s = max(self.max_jitter_s, late)
+            if late >= self.tick_s:
+                self.missed += 1
+                self.lg.debug("tick at %s missed by %.6fs", deadline, late)
+        self.ticks += 1
+
+        mask = value = 0
+        with self._lock:
+            events = self._events
+            while events and events[0][0] <= now + self._slack:
+                due, _, bit, state, loop_s = heapq.heappop(events)
+                mask |= 1 << bit
+                value = value | 1 << bit if state else value & ~(1 << bit)
+                if loop_s is not None:
+                    heapq.heappush(events, (
+                        due + loop_s, next(self._order), bit, state, loop_s
+                    ))
+
+        if not mask:
+            return False
+
+        try:
+            self.board.write_port(mask, value, check=self.check)
+        except IOError as exc:
+            self.lg.error(f"tick write to {hex(self.board.address)} failed: {exc}")
+            return False
+        self.writes += 1
+        return True
+
+    def _wait(self, seconds: float) -> None:
+        if self.sleep is not None:
+            self.sleep(seconds)
+        else:
+            self._wake.wait(seconds)
+
+    def run_until(self, end: float) -> None:
+        """
+        play on this thread until the clock reaches :end:
+        """
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > end:
+                remaining = end - self.clock()
+                if remaining > 0:
+                    self._wait(remaining)
+                return
+
+            remaining = deadline - self.clock()
+            if remaining > 0:
+                self._wait(remaining)
+            self.run_pending(deadline)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=self.__class__.__name__, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            deadline = self.next_deadline()
+            if deadline is None:
+                # nothing to do until a sequence comes
+                self._wake.wait()
+                continue
+
+            remaining = deadline - self.clock()
+            if remaining > 0:
+                self._wait(remaining)
+                if self.clock() < deadline:
+                    # woken up by a new sequence, it might be due earlier
+                    continue
+            self.run_pending(deadline)
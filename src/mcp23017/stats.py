@@ -0,0 +1,134 @@
+"""
+counters and latency histograms for the traffic of a bus
+"""
+
+import threading
+
+from typing import Dict, Optional
+
+
+# histogram buckets are powers of two in microseconds, the last one takes
+# everything from 2**(HISTOGRAM_BUCKETS - 2) us on
+HISTOGRAM_BUCKETS = 18
+
+_COUNTERS = (
+    "reads", "writes", "bytes_read", "bytes_written", "lock_wait_s", "bus_s",
+    "retries", "verify_failures", "failed_writes",
+)
+
+
+class _RegisterStats:
+    __slots__ = _COUNTERS + ("histogram",)
+
+    def __init__(self) -> None:
+        for name in _COUNTERS:
+            setattr(self, name, 0)
+        # time in the smbus call, see HISTOGRAM_BUCKETS
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def as_dict(self) -> dict:
+        d = {name: getattr(self, name) for name in _COUNTERS}
+        d["histogram"] = list(self.histogram)
+        return d
+
+    def add_to(self, totals: dict) -> None:
+        for name in _COUNTERS:
+            totals[name] += getattr(self, name)
+        totals["histogram"] = [
+            a + b for a, b in zip(totals["histogram"], self.histogram)
+        ]
+
+
+def _empty_totals() -> dict:
+    d = {name: 0 for name in _COUNTERS}
+    d["histogram"] = [0] * HISTOGRAM_BUCKETS
+    return d
+
+
+def histogram_bucket(seconds: float) -> int:
+    """
+    :return: index of the histogram bucket for a duration
+    """
+    return min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)
+
+
+class BusStats:
+    """
+    what went over a bus, per board address and register
+
+    fed by :I2C: (transactions, bytes, time waiting for the lock and in the
+    smbus call) and by :MCP23017: (resends, failed read backs and given up
+    writes).  a write that never makes it with write_retries=n has n
+    retries and n + 1 verify_failures.  block transfers count for the
+    register they started at
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # (address, register) -> stats
+        self._stats: Dict[tuple, _RegisterStats] = {}
+
+    def _get(self, address: int, register: Optional[int]) -> _RegisterStats:
+        key = (address, register)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _RegisterStats()
+        return stats
+
+    def record_read(self, address: int, register: Optional[int], n_bytes: int,
+                    lock_wait_s: float, bus_s: float) -> None:
+        with self._lock:
+            stats = self._get(address, register)
+            stats.reads += 1
+            stats.bytes_read += n_bytes
+            stats.lock_wait_s += lock_wait_s
+            stats.bus_s += bus_s
+            stats.histogram[histogram_bucket(bus_s)] += 1
+
+    def record_write(self, address: int, register: int, n_bytes: int,
+                     lock_wait_s: float, bus_s: float) -> None:
+        with self._lock:
+            stats = self._get(address, register)
+            stats.writes += 1
+            stats.bytes_written += n_bytes
+            stats.lock_wait_s += lock_wait_s
+            stats.bus_s += bus_s
+            stats.histogram[histogram_bucket(bus_s)] += 1
+
+    def record_retry(self, address: int, register: int) -> None:
+        with self._lock:
+            self._get(address, register).retries += 1
+
+    def record_verify_failure(self, address: int, register: int) -> None:
+        with self._lock:
+            self._get(address, register).verify_failures += 1
+
+    def record_failed_write(self, address: int, register: int) -> None:
+        with self._lock:
+            self._get(address, register).failed_writes += 1
+
+    def snapshot(self) -> dict:
+        """
+        :return: {"total": {...}, "addresses": {address: {"total": {...},
+            "registers": {register: {...}}}}}, every {...} has the counters
+            and the histogram
+        """
+        with self._lock:
+            total = _empty_totals()
+            addresses: Dict[int, dict] = {}
+            for (address, register), stats in sorted(
+                    self._stats.items(),
+                    key=lambda kv: (kv[0][0], -1 if kv[0][1] is None else kv[0][1])
+            ):
+                entry = addresses.setdefault(
+                    address, {"total": _empty_totals(), "registers": {}}
+                )
+                entry["registers"][register] = stats.as_dict()
+                stats.add_to(entry["total"])
+                stats.add_to(total)
+
+        return {"total": total, "addresses": addresses}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
@@ -0,0 +1,139 @@
+"""
+cheap recording of the bus transactions, to be read when something went
+wrong
+"""
+
+import threading
+import time
+
+from array import array
+from typing import Callable, List, NamedTuple
+
+
+READ = 0
+WRITE = 1
+READ_BLOCK = 2
+WRITE_BLOCK = 3
+
+_DIRECTION_NAMES = ("R ", "W ", "RB", "WB")
+
+# what is stored as register for reads without one (read_byte)
+NO_REGISTER = 0xFF
+
+
+class TraceEntry(NamedTuple):
+    timestamp: float
+    address: int
+    register: int
+    value: int
+    direction: int
+    retry: int
+
+
+class Tracer:
+    """
+    keeps the last :capacity: transactions in preallocated arrays
+
+    recording is a few array stores, nothing is formatted until :decode: is
+    called.  when :enabled: is False :record: returns right away.  block
+    transfers are recorded byte by byte with the register the transfer
+    started at
+    """
+
+    def __init__(self, capacity: int = 4096, enabled: bool = True,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param capacity: number of transactions kept
+        :param enabled: record from the start
+        :param clock: where the timestamps come from
+        """
+        if capacity < 1:
+            raise ValueError(f"{capacity=} has to be at least 1")
+
+        self.capacity = capacity
+        self.enabled = enabled
+        self.clock = clock
+
+        self._timestamps = array("d", bytes(8 * capacity))
+        self._addresses = array("B", bytes(capacity))
+        self._registers = array("B", bytes(capacity))
+        self._values = array("B", bytes(capacity))
+        self._directions = array("B", bytes(capacity))
+        self._retries = array("H", bytes(2 * capacity))
+
+        self._lock = threading.Lock()
+        # next slot to write and number of transactions ever recorded
+        self._next = 0
+        self.recorded = 0
+
+    def record(self, address: int, register, value: int, direction: int,
+               retry: int = 0) -> None:
+        """
+        :param address:
+        :param register: None for reads without a register
+        :param value: byte written or read
+        :param direction: READ, WRITE, READ_BLOCK or WRITE_BLOCK
+        :param retry: 0 for the first try of a write, then counting up
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            i = self._next
+            self._timestamps[i] = self.clock()
+            self._addresses[i] = address & 0xFF
+            self._registers[i] = NO_REGISTER if register is None else register & 0xFF
+            self._values[i] = value & 0xFF
+            self._directions[i] = direction
+            self._retries[i] = min(retry, 0xFFFF)
+
+            self._next = i + 1 if i + 1 < self.capacity else 0
+            self.recorded += 1
+
+    def record_block(self, address: int, register: int, values,
+                     direction: int, retry: int = 0) -> None:
+        """
+        :param values: the bytes of the block transfer
+        """
+        if not self.enabled:
+            return
+
+        for value in values:
+            self.record(address, register, value, direction, retry)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._next = 0
+            self.recorded = 0
+
+    def entries(self) -> List[TraceEntry]:
+        """
+        :return: the recorded transactions, oldest first
+        """
+        with self._lock:
+            n = min(self.recorded, self.capacity)
+            start = (self._next - n) % self.capacity
+            return [
+                TraceEntry(
+                    self._timestamps[i], self._addresses[i],
+                    self._registers[i], self._values[i],
+                    self._directions[i], self._retries[i],
+                )
+                for i in ((start + k) % self.capacity for k in range(n))
+            ]
+
+    def decode(self) -> str:
+        """
+        :return: the trace as text, one transaction per line
+        """
+        entries = self.entries()
+        if not entries:
+            return ""
+
+        t0 = entries[0].timestamp
+        return "\n".join(
+            f"{(e.timestamp - t0) * 1e6:12.1f}us {_DIRECTION_NAMES[e.direction]}"
+            + f" {e.address:#04x} {e.register:#04x} {e.value:#04x}"
+            + (f" retry {e.retry}" if e.retry else "")
+            for e in entries
+        )
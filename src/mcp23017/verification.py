@@ -0,0 +1,275 @@
+"""
+when and how the board checks that a write made it into the register
+"""
+
+import inspect
+import logging
+import random
+import threading
+
+from typing import Dict, List, Optional, Sequence
+
+from . import logging_modes
+
+
+class Backoff:
+    """
+    pause between two tries of a write
+
+    the pause grows by :factor: each try up to :max_ms:, :jitter: takes a
+    random part of it away so boards on a noisy bus dont retry in lockstep
+    """
+
+    def __init__(self, base_ms: float = 10, factor: float = 1.0,
+                 max_ms: Optional[float] = None, jitter: float = 0.0,
+                 seed: Optional[int] = None) -> None:
+        """
+        :param base_ms: pause before the first retry
+        :param factor: multiply the pause with this for each further retry
+        :param max_ms: upper limit of the pause
+        :param jitter: 0..1, part of the pause that is random
+        :param seed: seed for the jitter
+        """
+        if not 0 <= jitter <= 1:
+            raise ValueError(f"{jitter=} has to be between 0 and 1")
+
+        self.base_ms = base_ms
+        self.factor = factor
+        self.max_ms = max_ms
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+
+    def delay(self, attempt: int) -> float:
+        """
+        :param attempt: number of the retry, starting with 0
+
+        :return: pause in seconds
+        """
+        ms = self.base_ms * self.factor ** attempt
+        if self.max_ms is not None:
+            ms = min(ms, self.max_ms)
+        if self.jitter:
+            ms *= 1 - self.jitter * self._rng.random()
+        return ms / 1000
+
+
+class WriteCheck:
+    """
+    everything needed to check (and redo) a write
+
+    registers are written in one transaction, check_registers are read in
+    one transaction and have to hold :desired: after masking both sides with
+    :masks: or with what is in :mask_registers:
+    """
+    __slots__ = (
+        "registers", "values", "check_registers", "desired", "masks",
+        "mask_registers",
+    )
+
+    def __init__(self, registers: Sequence[int], values: Sequence[int],
+                 check_registers: Optional[Sequence[int]] = None,
+                 desired: Optional[Sequence[int]] = None,
+                 masks: Optional[Sequence[int]] = None,
+                 mask_registers: Optional[Sequence[int]] = None) -> None:
+        self.registers = tuple(registers)
+        self.values = list(values)
+        self.check_registers = tuple(
+            check_registers if check_registers is not None else registers
+        )
+        self.desired = list(desired if desired is not None else values)
+        self.masks = list(masks) if masks is not None else None
+        self.mask_registers = tuple(mask_registers) \
+            if mask_registers is not None else None
+
+    def split(self) -> List["WriteCheck"]:
+        """
+        one check per register, for checks that happen later and must not
+        overrule a newer write to one of the registers
+        """
+        if len(self.registers) == 1:
+            return [self]
+
+        return [
+            WriteCheck(
+                (self.registers[i],), (self.values[i],),
+                (self.check_registers[i],), (self.desired[i],),
+                (self.masks[i],) if self.masks is not None else None,
+                (self.mask_registers[i],) if self.mask_registers is not None
+                else None,
+            )
+            for i in range(len(self.registers))
+        ]
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}({[hex(r) for r in self.registers]}"
+            + f" <- {[hex(v) for v in self.values]})"
+        )
+
+
+class VerificationPolicy:
+    """
+    decides if a write is checked right after it was sent
+
+    the board asks :verify_now: after each write that asked for a check,
+    everything it says no to can be handed back by :take_pending: to be
+    checked by :MCP23017.verify_pending:
+    """
+
+    def __init__(self, backoff: Optional[Backoff] = None) -> None:
+        """
+        :param backoff: pauses between retries, 10 ms each if None
+        """
+        self.backoff = backoff if backoff is not None else Backoff()
+
+    def attach(self, board) -> None:
+        """
+        called by the board the policy is used by
+        """
+
+    def verify_now(self, check: WriteCheck) -> bool:
+        """
+        :param check: the write that was just sent
+
+        :return: True if the board should check it right away
+        """
+        return True
+
+    def take_pending(self) -> List[WriteCheck]:
+        """
+        :return: checks to do now, they are forgotten by the policy
+        """
+        return []
+
+    def superseded(self, check: WriteCheck) -> bool:
+        """
+        :return: True if a newer write to the register of a check taken
+            from :take_pending: came in since, the check must not undo it
+        """
+        return False
+
+
+class VerifyAlways(VerificationPolicy):
+    """
+    check every write, the classic behaviour
+    """
+
+
+class VerifyNever(VerificationPolicy):
+    """
+    trust the bus
+    """
+
+    def verify_now(self, check: WriteCheck) -> bool:
+        return False
+
+
+class VerifyEveryNth(VerificationPolicy):
+    """
+    only check every :n:th write
+    """
+
+    def __init__(self, n: int, backoff: Optional[Backoff] = None) -> None:
+        super().__init__(backoff)
+        if n < 1:
+            raise ValueError(f"{n=} has to be at least 1")
+        self.n = n
+        self._count = 0
+
+    def verify_now(self, check: WriteCheck) -> bool:
+        self._count += 1
+        if self._count >= self.n:
+            self._count = 0
+            return True
+        return False
+
+
+class DeferredVerify(VerificationPolicy):
+    """
+    collect the writes and check them together when
+    :MCP23017.verify_pending: is called
+
+    only the last write to a register is checked.  use it with
+    shadow_registers on the board, otherwise a read-modify-write builds on
+    whatever a bad write left in the register.  the checks are kept by
+    register, so one policy can only be used by one board
+    """
+
+    def __init__(self, backoff: Optional[Backoff] = None) -> None:
+        super().__init__(backoff)
+        self._lock = threading.Lock()
+        # register -> check of the last write to it
+        self._pending: Dict[int, WriteCheck] = {}
+        self._board = None
+
+    def attach(self, board) -> None:
+        if self._board is not None and self._board is not board:
+            raise RuntimeError(
+                f"{self.__class__.__name__} is already used by another board"
+            )
+        self._board = board
+
+    def verify_now(self, check: WriteCheck) -> bool:
+        with self._lock:
+            for single in check.split():
+                self._pending[single.registers[0]] = single
+        return False
+
+    def take_pending(self) -> List[WriteCheck]:
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        return pending
+
+    def superseded(self, check: WriteCheck) -> bool:
+        with self._lock:
+            return check.registers[0] in self._pending
+
+
+class BackgroundReconcile(DeferredVerify):
+    """
+    like :DeferredVerify:, but a thread checks (and fixes) the collected
+    writes every :interval_s:
+
+    only for the sync board, the thread can not run the coroutines of an
+    :AsyncMCP23017:
+    """
+
+    def __init__(self, interval_s: float = 0.1,
+                 backoff: Optional[Backoff] = None) -> None:
+        super().__init__(backoff)
+        self.lg = logging.getLogger(self.__class__.__name__)
+
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, board) -> None:
+        if self._thread is not None:
+            raise RuntimeError(f"{self.__class__.__name__} is already in use")
+        if inspect.iscoroutinefunction(board.verify_pending):
+            raise TypeError(
+                f"{self.__class__.__name__} needs a sync board, not {board}"
+            )
+        super().attach(board)
+
+        self._thread = threading.Thread(
+            target=self._reconcile, args=(board,),
+            name=self.__class__.__name__, daemon=True
+        )
+        self._thread.start()
+
+    def _reconcile(self, board) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                board.verify_pending()
+            except IOError as exc:
+                self.lg.error(f"reconciling failed: {exc}")
+
+    def stop(self) -> None:
+        """
+        stop the thread, whatever is still pending stays pending
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
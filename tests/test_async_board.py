@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import asyncio
+
+import pytest
+from mcp23017.emulated_smbus import EmulatedSMBus
+from mcp23017.async_i2c import AsyncI2C
+from mcp23017.async_mcp23017 import AsyncMCP23017
+from mcp23017.stats import BusStats
+from mcp23017.tracer import Tracer
+
+
+@pytest.mark.parametrize("bugged", [False, True])
+def test_async_board_digital_write(bugged):
+    async def run():
+        i2c = AsyncI2C(EmulatedSMBus(1, bugged=bugged))
+        board = AsyncMCP23017(i2c, 0x20, time_between_retries_ms=1)
+
+        for gpio in board.Consts.IO.all_constants.values():
+            assert await board.gpio_digital_read(gpio) is False
+            await board.gpio_digital_write(gpio, True)
+            assert await board.gpio_digital_read(gpio) is True
+            await board.gpio_digital_write(gpio, False)
+            assert await board.gpio_digital_read(gpio) is False
+
+        await board.gpio_digital_write_all(True)
+        assert await board.gpio_digital_read_all() == [0xFF, 0xFF]
+
+        i2c.close()
+
+    asyncio.run(run())
+
+
+def test_async_boards_share_one_bus():
+    async def run():
+        i2c = AsyncI2C(EmulatedSMBus(1))
+        boards = [
+            AsyncMCP23017(i2c, address, shadow_registers=True)
+            for address in range(0x20, 0x28)
+        ]
+
+        async def toggle(board):
+            for gpio in board.Consts.IO.all_constants.values():
+                await board.gpio_digital_write(gpio, True)
+
+        await asyncio.gather(*(toggle(board) for board in boards))
+
+        results = await asyncio.gather(
+            *(board.gpio_digital_read_all() for board in boards)
+        )
+        assert results == [[0xFF, 0xFF]] * len(boards)
+
+        i2c.close()
+
+    asyncio.run(run())
+
+
+def test_async_tasks_toggling_one_port():
+    async def run():
+        i2c = AsyncI2C(EmulatedSMBus(1))
+        board = AsyncMCP23017(i2c, 0x20, check_write=False)
+        await board.set_gpio_mode_all(board.Consts.OUTPUT)
+
+        async def toggle(gpio):
+            for n in range(10):
+                await board.gpio_digital_write(gpio, n % 2 == 0)
+            await board.gpio_digital_write(gpio, True)
+
+        await asyncio.gather(*(toggle(gpio) for gpio in range(8)))
+        assert await board.gpio_digital_read_all() == [0xFF, 0x00]
+        assert await i2c.update_bits(0x20, 0x12, 0x0F, 0x00) == 0xF0
+
+        await board.write_port(0x0101, 0x0100)
+        assert await board.read_port(max_age=60) == 0x01F0
+        # the write drops the cached bank A, B comes from the cache
+        await board.write_port(0x0001, 0x0001)
+        assert await board.read_port(max_age=60) == 0x01F1
+
+        assert await board.stream_port(1, b"\x10\x20\x30") == 1
+        assert await board.read(0x15, use_shadow=False) == 0x30
+        assert await board.read(0x0A) == 0
+
+        i2c.close()
+
+    asyncio.run(run())
+
+
+class FirstWriteLostSMBus(EmulatedSMBus):
+    lost = False
+
+    def write_byte_data(self, address, register, value):
+        if not self.lost:
+            self.lost = True
+            return
+        super().write_byte_data(address, register, value)
+
+
+def test_async_board_stats_and_trace():
+    async def run():
+        stats = BusStats()
+        tracer = Tracer()
+        i2c = AsyncI2C(FirstWriteLostSMBus(1), stats=stats, tracer=tracer)
+        board = AsyncMCP23017(i2c, 0x20, time_between_retries_ms=0)
+
+        await board.write(board.Consts.Register.OLAT[0], 0x0F)
+        i2c.close()
+        return stats.snapshot()["addresses"][0x20]["registers"][0x14], tracer
+
+    counters, tracer = asyncio.run(run())
+    assert (counters["retries"], counters["verify_failures"],
+            counters["failed_writes"], counters["writes"]) == (1, 1, 0, 2)
+    assert len(tracer.entries()) == 4
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import time
+
+from mcp23017.bus_timing import BusTiming, VirtualClock, read_bits, write_bits
+from mcp23017.emulated_smbus import EmulatedSMBus, EmulatedSMBusMCP23017
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+
+
+def test_bit_counts():
+    # START, address, register, data with their ACKs, STOP
+    assert write_bits(1) == 29
+    # and a repeated START with the address again
+    assert read_bits(1) == 39
+    assert read_bits(1, register=False) == 20
+    assert write_bits(2) - write_bits(1) == 9
+
+
+def test_virtual_clock_is_charged():
+    clock = VirtualClock()
+    timing = BusTiming(100_000, clock)
+    smbus = EmulatedSMBusMCP23017(1, timing=timing)
+
+    smbus.write_byte_data(0x20, 0x14, 0xFF)
+    assert abs(clock.now() - 29e-5) < 1e-9
+
+    # a block transfer is one transaction
+    smbus.read_i2c_block_data(0x20, 0x12, 2)
+    assert timing.transactions == 2
+    assert abs(timing.bus_s - (29 + 48) * 1e-5) < 1e-9
+    assert abs(clock.now() - timing.bus_s) < 1e-9
+
+
+def test_fewer_transactions_less_bus_time():
+    def bus_s(**board_kwargs):
+        timing = BusTiming(400_000, VirtualClock())
+        board = MCP23017(
+            I2C(EmulatedSMBus(1, timing=timing)), 0x20, **board_kwargs
+        )
+        timing.reset()
+        for n in range(16):
+            board.gpio_digital_write(n, True)
+        return timing.bus_s
+
+    assert bus_s(shadow_registers=True) < bus_s()
+
+
+def test_real_sleeps():
+    timing = BusTiming(100_000)
+    smbus = EmulatedSMBus(1, timing=timing)
+
+    started = time.perf_counter()
+    for _ in range(10):
+        smbus.write_byte_data(0x20, 0x14, 0)
+    assert time.perf_counter() - started >= 10 * 29e-5
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import asyncio
+
+import pytest
+
+from mcp23017.async_i2c import AsyncI2C
+from mcp23017.async_mcp23017 import AsyncMCP23017
+from mcp23017.config import BoardConfig, apply, apply_async, plan, read_config
+from mcp23017.emulated_smbus import EmulatedSMBusMCP23017
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+
+
+class CountingI2C(I2C):
+    def __init__(self, smbus):
+        super().__init__(smbus)
+        self.writes = 0
+
+    def write(self, address, register, value, retry=0):
+        self.writes += 1
+        super().write(address, register, value, retry)
+
+    def write_block(self, address, register, values, retry=0):
+        self.writes += 1
+        super().write_block(address, register, values, retry)
+
+
+CONFIG = BoardConfig(
+    iodir=0xFF00, ipol=0x0100, gpinten=0xFF00, intcon=0x0300,
+    defval=0x0300, gppu=0xFFFF, olat=0x00A5, iocon=0x40,
+)
+
+
+def test_registers_round_trip():
+    assert BoardConfig.from_registers(CONFIG.registers()) == CONFIG
+    assert BoardConfig().registers()[0x00] == 0xFF
+
+    with pytest.raises(ValueError):
+        BoardConfig(iocon=0x80).validate()
+    with pytest.raises(ValueError):
+        BoardConfig(olat=0x10000).validate()
+
+
+def test_plan_bursts_and_gaps():
+    current = BoardConfig().registers()
+    target = BoardConfig(iodir=0, gpinten=0x0001, olat=0x0100).registers()
+
+    # IODIR and GPINTENA have a gap of two, one burst, OLATB on its own
+    assert plan(current, target, True) == [
+        (0x00, [0x00, 0x00, 0x00, 0x00, 0x01]), (0x15, [0x01]),
+    ]
+    # byte mode, one write per pair
+    assert plan(current, target, False) == [
+        (0x00, [0x00, 0x00]), (0x04, [0x01]), (0x15, [0x01]),
+    ]
+
+
+@pytest.mark.parametrize("shadow", [False, True])
+def test_apply_writes_only_differences(shadow):
+    smbus = EmulatedSMBusMCP23017(1)
+    i2c = CountingI2C(smbus)
+    board = MCP23017(i2c, 0x20, shadow_registers=shadow)
+
+    # a burst over IODIR..GPPU, OLATA and IOCON
+    assert apply(board, CONFIG) == 3
+    assert read_config(board) == CONFIG
+    assert BoardConfig.from_registers(dict(enumerate(smbus.registers(0x20)))) \
+        == CONFIG
+
+    i2c.writes = 0
+    assert apply(board, CONFIG) == 0
+    assert i2c.writes == 0
+
+    assert apply(board, CONFIG._replace(olat=0x00A4)) == 1
+
+
+def test_apply_leaves_byte_mode_first():
+    smbus = EmulatedSMBusMCP23017(1)
+    board = MCP23017(I2C(smbus), 0x20)
+    board.write(0x0A, 0x20)
+
+    assert read_config(board).iocon == 0x20
+    assert apply(board, CONFIG) == 3
+    assert read_config(board) == CONFIG
+
+    # into byte mode, the pairs go before IOCON
+    seqop = CONFIG._replace(iocon=0x20, iodir=0xFFFF)
+    assert apply(board, seqop) == 2
+    assert read_config(board) == seqop
+
+
+def test_apply_async():
+    async def run():
+        smbus = EmulatedSMBusMCP23017(1)
+        i2c = AsyncI2C(smbus)
+        board = AsyncMCP23017(i2c, 0x20)
+
+        assert await apply_async(board, CONFIG) == 3
+        assert await apply_async(board, CONFIG) == 0
+        i2c.close()
+        return bytes(smbus.registers(0x20))
+
+    regs = asyncio.run(run())
+    assert BoardConfig.from_registers(dict(enumerate(regs))) == CONFIG
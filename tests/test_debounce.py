@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import random
+
+import pytest
+
+from mcp23017.debounce import Debouncer
+from mcp23017.emulated_smbus import EmulatedSMBusMCP23017
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.scanner import InputScanner
+
+
+def reference(samples, counts, state):
+    """the same, one pin at a time"""
+    counters = [0] * 16
+    states = []
+    for sample in samples:
+        for pin in range(16):
+            if (sample ^ state) >> pin & 1:
+                counters[pin] += 1
+                if counters[pin] == counts[pin]:
+                    state ^= 1 << pin
+                    counters[pin] = 0
+            else:
+                counters[pin] = 0
+        states.append(state)
+    return states
+
+
+def test_bouncing_pin():
+    debouncer = Debouncer(counts=3, initial=0)
+
+    assert debouncer.feed(0x0001) == 0
+    assert debouncer.feed(0x0000) == 0
+    assert debouncer.feed(0x0001) == 0
+    assert debouncer.feed(0x0001) == 0
+    assert debouncer.feed(0x0001) == 0x0001
+    assert debouncer.state == 0x0001
+
+
+def test_per_pin_counts():
+    counts = {0: 1, 1: 2, 15: 5}
+    debouncer = Debouncer(counts, initial=0)
+    assert [debouncer.count(gpio) for gpio in (0, 1, 2, 15)] == [1, 2, 1, 5]
+
+    states = list(debouncer.filter([0x8003] * 5))
+    assert states == [0x0001, 0x0003, 0x0003, 0x0003, 0x8003]
+
+
+def test_matches_reference():
+    rng = random.Random(1)
+    counts = [rng.randint(1, 9) for _ in range(16)]
+    samples = [rng.getrandbits(16) & rng.getrandbits(16) | rng.getrandbits(16) & 0xF0F0
+               for _ in range(2000)]
+
+    debouncer = Debouncer(dict(enumerate(counts)), initial=0)
+    assert list(debouncer.filter(samples)) == reference(samples, counts, 0)
+
+
+def test_bad_counts():
+    with pytest.raises(ValueError):
+        Debouncer({3: 0})
+    with pytest.raises(ValueError):
+        Debouncer({16: 2})
+
+
+def test_scanner_reports_debounced_edges():
+    v_smbus = EmulatedSMBusMCP23017(1)
+    board = MCP23017(I2C(v_smbus), 0x20)
+
+    scanner = InputScanner()
+    scanner.add_board(board, debouncer=Debouncer(counts=2))
+    scanner.scan_once()
+
+    # a glitch of one sample does not get through
+    v_smbus.drive_pin(0x20, 4, True)
+    assert scanner.scan_once() == 0
+    v_smbus.drive_pin(0x20, 4, False)
+    assert scanner.scan_once() == 0
+
+    v_smbus.drive_pin(0x20, 4, True)
+    assert scanner.scan_once() == 0
+    assert scanner.scan_once() == 1
+    assert scanner.events.get_nowait().gpio == 4
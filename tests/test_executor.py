@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import threading
+
+from mcp23017.emulated_smbus import EmulatedSMBus
+from mcp23017.executor import BusExecutor, bus_of
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.scheduler import BusScheduler
+
+
+def make_buses(n):
+    return [I2C(EmulatedSMBus(bus)) for bus in range(n)]
+
+
+def test_one_worker_per_bus():
+    buses = make_buses(2)
+    boards = [MCP23017(i2c, address) for i2c in buses for address in (0x20, 0x21)]
+
+    with BusExecutor() as executor:
+        threads = [
+            executor.submit(board, lambda b: threading.current_thread().name).result()
+            for board in boards
+        ]
+        assert executor.n_buses == 2
+
+    # boards of a bus share the thread, the buses do not
+    assert threads[0] == threads[1]
+    assert threads[2] == threads[3]
+    assert threads[0] != threads[2]
+
+
+def test_scheduled_boards_are_on_the_scheduler_bus():
+    i2c = make_buses(1)[0]
+    scheduler = BusScheduler(i2c)
+    assert bus_of(MCP23017(scheduler.client(), 0x20)) is i2c.smbus
+
+
+def test_fan_out_results():
+    boards = [MCP23017(i2c, 0x20) for i2c in make_buses(3)]
+
+    with BusExecutor() as executor:
+        for future in executor.fan_out(
+                boards, "set_gpio_mode_all", MCP23017.Consts.OUTPUT):
+            assert future.result() is None
+        executor.call(boards[1], "gpio_digital_write_all", True).result()
+
+        values = [f.result() for f in executor.read_all_gpios(boards)]
+    assert values == [[0, 0], [0xFF, 0xFF], [0, 0]]
+
+
+def test_buses_run_in_parallel():
+    boards = [MCP23017(i2c, 0x20) for i2c in make_buses(4)]
+    # only lets anyone through once every bus is in it at the same time
+    all_buses = threading.Barrier(len(boards))
+
+    def read(board):
+        all_buses.wait(timeout=10)
+        return board.gpio_digital_read_all()
+
+    with BusExecutor() as executor:
+        futures = [executor.submit(board, read) for board in boards]
+        assert [f.result() for f in futures] == [[0, 0]] * len(boards)
+    assert not all_buses.broken
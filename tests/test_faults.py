@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import random
+
+import pytest
+
+from mcp23017.emulated_smbus import EmulatedSMBus, EmulatedSMBusMCP23017
+from mcp23017.faults import (
+    MASKS_BY_POPCOUNT, BitFlipNoise, BurstNoise, Faults, PerRegisterFaults,
+    ReadNack, StuckAtBits, per_register_rates,
+)
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.stats import BusStats
+
+
+def test_mask_tables():
+    assert [len(masks) for masks in MASKS_BY_POPCOUNT] == \
+        [1, 8, 28, 56, 70, 56, 28, 8, 1]
+
+
+def test_bit_flips_follow_the_weights():
+    noise = BitFlipNoise((0, 0, 1))
+    rng = random.Random(1)
+    for value in range(256):
+        assert bin(noise.on_write(rng, 0x20, 0, value) ^ value).count("1") == 2
+
+
+def test_same_seed_same_faults():
+    def written(seed):
+        smbus = EmulatedSMBus(1, bugged=True, seed=seed)
+        for register in range(64):
+            smbus.write_byte_data(0x20, register, 0x55)
+        return [smbus.read_byte_data(0x20, r) for r in range(64)]
+
+    assert written(3) == written(3)
+    assert written(3) != written(4)
+
+
+def test_stuck_bits_and_nacks():
+    smbus = EmulatedSMBusMCP23017(1, seed=0, fault_model=Faults(
+        StuckAtBits(0x14, stuck_high=0x01, stuck_low=0x80),
+        PerRegisterFaults({0x00: ReadNack(1.0)}),
+    ))
+
+    smbus.write_byte_data(0x20, 0x14, 0xF0)
+    assert smbus.read_byte_data(0x20, 0x14) == 0x71
+    with pytest.raises(OSError):
+        smbus.read_byte_data(0x20, 0x00)
+    # other registers are fine
+    smbus.write_byte_data(0x20, 0x15, 0xF0)
+    assert smbus.read_byte_data(0x20, 0x15) == 0xF0
+
+
+def test_bursts_come_together():
+    burst = BurstNoise(p_burst=0.01, mean_length=20)
+    rng = random.Random(0)
+    corrupted = [burst.on_write(rng, 0x20, 0, 0) != 0 for _ in range(10000)]
+
+    assert 0 < sum(corrupted) < len(corrupted)
+    # far fewer switches between quiet and noisy than corrupted bytes
+    switches = sum(a != b for a, b in zip(corrupted, corrupted[1:]))
+    assert switches < sum(corrupted) / 4
+
+
+def test_board_retries_per_register_faults():
+    # the plain bus has no OLAT, the board writes the latches through GPIO
+    gpio_a = MCP23017.Consts.Register.GPIO[0]
+    smbus = EmulatedSMBus(1, seed=0, fault_model=per_register_rates({gpio_a: 0.5}))
+    stats = BusStats()
+    board = MCP23017(I2C(smbus, stats=stats), 0x20, time_between_retries_ms=0)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+
+    for gpio in range(16):
+        board.gpio_digital_write(gpio, True)
+    assert board.gpio_digital_read_all() == [0xFF, 0xFF]
+    registers = stats.snapshot()["addresses"][0x20]["registers"]
+    assert registers[gpio_a]["retries"] > 0
+    assert registers[MCP23017.Consts.Register.GPIO[1]]["retries"] == 0
+
+
+def test_read_byte_goes_through_the_faults():
+    smbus = EmulatedSMBus(1, seed=0, fault_model=PerRegisterFaults({0x01: ReadNack(1.0)}))
+    smbus.write_byte_data(0x20, 0x00, 0x12)
+    assert smbus.read_byte(0x20) == {0x00: 0x12}
+
+    smbus.write_byte_data(0x20, 0x01, 0x34)
+    with pytest.raises(OSError):
+        smbus.read_byte(0x20)
+
+
+def test_read_back_nacks_are_retried():
+    gpio_a = MCP23017.Consts.Register.GPIO[0]
+    smbus = EmulatedSMBusMCP23017(1, seed=0, fault_model=PerRegisterFaults({
+        gpio_a: ReadNack(0.5),
+    }))
+    stats = BusStats()
+    board = MCP23017(I2C(smbus, stats=stats), 0x20,
+                     write_retries=20, time_between_retries_ms=0)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+
+    for value in range(50):
+        board.write(gpio_a, value)
+        assert smbus.read_byte_data(0x20, 0x14) == value
+    assert stats.snapshot()["addresses"][0x20]["registers"][gpio_a]["retries"] > 0
+
+    # a board that never answers gives up after its retries
+    smbus.fault_model = PerRegisterFaults({gpio_a: ReadNack(1.0)})
+    board.write_retries = 2
+    with pytest.raises(IOError, match="checked 3 times") as info:
+        board.write(gpio_a, 0xAA)
+    assert isinstance(info.value.__cause__, OSError)
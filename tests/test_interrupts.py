@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import threading
+
+from mcp23017.emulated_smbus import EmulatedSMBusMCP23017
+from mcp23017.i2c import I2C
+from mcp23017.interrupts import InterruptEngine
+from mcp23017.mcp23017 import MCP23017
+
+
+def make_board(address=0x20):
+    v_smbus = EmulatedSMBusMCP23017(1)
+    board = MCP23017(I2C(v_smbus), address)
+    board.set_gpio_mode_all(board.Consts.INPUT)
+    return v_smbus, board
+
+
+def test_interrupt_service_dispatches_captures():
+    v_smbus, board = make_board()
+    engine = InterruptEngine(board)
+
+    events = []
+    engine.add_callback(board.Consts.IO.GPA3, lambda *e: events.append(e))
+    engine.add_callback(board.Consts.IO.GPB0, lambda *e: events.append(e),
+                        compare_to=False)
+
+    # no interrupt for pins that are not configured
+    v_smbus.drive_pin(0x20, board.Consts.IO.GPA4, True)
+    assert not v_smbus.interrupt_active(0x20)
+
+    v_smbus.drive_pin(0x20, board.Consts.IO.GPA3, True)
+    v_smbus.drive_pin(0x20, board.Consts.IO.GPB0, True)
+    # a compared pin keeps its interrupt while it differs from the default,
+    # the capture still has the level it fired with
+    v_smbus.drive_pin(0x20, board.Consts.IO.GPB0, False)
+    assert engine.service() == 2
+    assert events == [(board.Consts.IO.GPA3, True), (board.Consts.IO.GPB0, True)]
+
+    # reading the captures cleared it
+    assert not v_smbus.interrupt_active(0x20)
+    assert engine.service() == 0
+
+    # compare mode only fires while away from the default
+    v_smbus.drive_pin(0x20, board.Consts.IO.GPB0, False)
+    assert not v_smbus.interrupt_active(0x20)
+
+
+def test_interrupt_thread_on_int_line():
+    v_smbus, board = make_board(0x21)
+    engine = InterruptEngine(board)
+    v_smbus.connect_interrupt(0x21, engine.trigger)
+
+    got = threading.Event()
+    events = []
+
+    def on_change(gpio, value):
+        events.append((gpio, value))
+        got.set()
+
+    engine.add_callback(board.Consts.IO.GPB7, on_change)
+    engine.start()
+
+    v_smbus.drive_pin(0x21, board.Consts.IO.GPB7, True)
+    assert got.wait(5)
+    engine.stop()
+
+    assert events == [(board.Consts.IO.GPB7, True)]
+
+
+def test_interrupt_board_config():
+    v_smbus, board = make_board(0x22)
+
+    board.set_interrupt_mirror(True)
+    assert board.read(board.Consts.Register.IOCON[0]) & 1 << board.Consts.SettingBit.MIRROR
+
+    board.set_interrupt(board.Consts.IO.GPB2, True)
+    board.set_interrupt_compare(board.Consts.IO.GPB2, True, default_value=True)
+    assert board.read(board.Consts.Register.GPINTEN[1]) == 0b100
+    assert board.read(board.Consts.Register.INTCON[1]) == 0b100
+    assert board.read(board.Consts.Register.DEFVAL[1]) == 0b100
+
+    board.set_all_interrupt(False)
+    assert board.read(board.Consts.Register.GPINTEN[1]) == 0
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import time
+
+from mcp23017.bus_timing import BusTiming, VirtualClock
+from mcp23017.emulated_smbus import EmulatedSMBusMCP23017
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.pwm import SoftwarePWM
+
+
+def make_pwm(clock, timing=None, **kwargs):
+    smbus = EmulatedSMBusMCP23017(1, timing=timing)
+    board = MCP23017(I2C(smbus), 0x20, shadow_registers=True)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+    if timing is not None:
+        timing.reset()
+    return board, SoftwarePWM(board, clock=clock.now, sleep=clock.sleep, **kwargs)
+
+
+def test_one_write_per_change():
+    clock = VirtualClock()
+    board, pwm = make_pwm(clock, frequency_hz=100, resolution=10)
+
+    io = board.Consts.IO
+    pwm.set_duty(io.GPA0, 0.3)
+    pwm.set_duty(io.GPB1, 0.5)
+    pwm.set_duty(io.GPB7, 1.0)
+
+    for _ in range(11):
+        pwm.run_period()
+
+    # on at slot 0, GPA0 off at slot 3, GPB1 off at slot 5
+    assert pwm.writes == 33
+    assert board.read_port() == 0x8000
+
+    report = pwm.report()
+    assert report.periods == 10
+    assert abs(report.frequency_hz - 100) < 1e-6
+    assert report.missed_slots == 0
+    for error in report.duty_error.values():
+        assert abs(error) < 1e-6
+
+
+def test_quantization_is_duty_error():
+    clock = VirtualClock()
+    board, pwm = make_pwm(clock, frequency_hz=100, resolution=4)
+
+    pwm.set_duty(board.Consts.IO.GPA0, 0.3)
+    for _ in range(5):
+        pwm.run_period()
+
+    # 0.3 is one slot of four
+    assert abs(pwm.report().duty_error[board.Consts.IO.GPA0] + 0.05) < 1e-6
+
+
+def test_slow_bus_lowers_frequency():
+    clock = VirtualClock()
+    timing = BusTiming(100_000, clock=clock)
+    board, pwm = make_pwm(clock, timing, frequency_hz=1000, resolution=10)
+
+    pwm.set_duty(board.Consts.IO.GPA0, 0.5)
+    pwm.set_duty(board.Consts.IO.GPB0, 0.2)
+    for _ in range(6):
+        pwm.run_period()
+
+    report = pwm.report()
+    # three writes of a few hundred us do not fit into a 1 ms period
+    assert report.frequency_hz < 1000
+    assert report.missed_slots > 0
+
+
+def test_thread():
+    board = MCP23017(I2C(EmulatedSMBusMCP23017(1)), 0x20, shadow_registers=True)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+    pwm = SoftwarePWM(board, frequency_hz=200, resolution=5)
+    pwm.set_duty(board.Consts.IO.GPA0, 0.4)
+
+    pwm.start()
+    time.sleep(0.1)
+    pwm.stop()
+
+    assert pwm.periods > 1
+    assert pwm.writes >= 2 * (pwm.periods - 1)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import errno
+import io
+
+import pytest
+
+from mcp23017.bus_timing import VirtualClock
+from mcp23017.emulated_smbus import EmulatedSMBusMCP23017
+from mcp23017.faults import ReadNack
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.recorder import OK, Recorder, Replayer, read_log
+from mcp23017.tracer import NO_REGISTER, READ, READ_BLOCK, WRITE, WRITE_BLOCK
+
+
+def record_session(clock, smbus):
+    log = io.BytesIO()
+    recorder = Recorder(log, clock=clock.now)
+    i2c = I2C(smbus, recorder=recorder)
+    board = MCP23017(i2c, 0x20, shadow_registers=True)
+
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+    clock.advance(0.001)
+    board.write_port(0x00FF, 0x0055)
+    clock.advance(0.002)
+    board.read_port()
+    i2c.read(0x20)
+    recorder.flush()
+    log.seek(0)
+    return log, recorder
+
+
+def test_log_round_trip():
+    clock = VirtualClock()
+    log, recorder = record_session(clock, EmulatedSMBusMCP23017(1))
+
+    entries = list(read_log(log))
+    assert len(entries) == recorder.recorded
+    assert entries[0].timestamp == 0.0
+    assert entries[-1].timestamp == pytest.approx(0.003)
+    assert {e.direction for e in entries} == {READ, WRITE, READ_BLOCK, WRITE_BLOCK}
+    assert all(e.result == OK for e in entries)
+    assert entries[-1].register == NO_REGISTER
+
+    # a cut off log ends at the last whole transaction
+    cut = io.BytesIO(log.getvalue()[:-3])
+    assert list(read_log(cut)) == entries[:-1]
+
+
+def test_replay_matches_emulator():
+    clock = VirtualClock()
+    log, _ = record_session(clock, EmulatedSMBusMCP23017(1))
+    entries = list(read_log(log))
+
+    report = Replayer(EmulatedSMBusMCP23017(1)).run(entries)
+    assert report.transactions == len(entries)
+    assert report.diverged == 0
+    assert report.transactions_per_s > 0
+
+    # a bus where every read fails
+    smbus = EmulatedSMBusMCP23017(1, fault_model=ReadNack(rate=1.0))
+    report = Replayer(smbus, max_divergences=2).run(entries)
+    n_reads = sum(e.direction in (READ, READ_BLOCK) for e in entries)
+    assert report.diverged == n_reads
+    assert [d.result for d in report.divergences] == [errno.EREMOTEIO] * 2
+
+
+def test_real_time_replay():
+    clock = VirtualClock()
+    log, _ = record_session(clock, EmulatedSMBusMCP23017(1))
+
+    replay_clock = VirtualClock(100.0)
+    report = Replayer(
+        EmulatedSMBusMCP23017(1), clock=replay_clock.now, sleep=replay_clock.sleep,
+    ).run(read_log(log), real_time=True)
+    assert report.elapsed_s == pytest.approx(0.003)
+
+
+def test_failures_are_recorded():
+    log = io.BytesIO()
+    i2c = I2C(
+        EmulatedSMBusMCP23017(1, fault_model=ReadNack(rate=1.0)),
+        recorder=Recorder(log),
+    )
+    with pytest.raises(OSError):
+        i2c.read_block(0x20, 0x12, 2)
+    log.seek(0)
+
+    entry, = read_log(log)
+    assert entry.result == errno.EREMOTEIO
+    assert entry.values == bytes(2)
+
+    # the clean emulator answers, that is a divergence
+    report = Replayer(EmulatedSMBusMCP23017(1)).run([entry])
+    assert report.diverged == 1
+    assert report.divergences[0].result == OK
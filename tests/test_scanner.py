@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import time
+
+from mcp23017.emulated_smbus import EmulatedSMBusMCP23017
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.scanner import InputScanner
+
+
+def test_scanner_reports_edges():
+    v_smbus = EmulatedSMBusMCP23017(1)
+    boards = [MCP23017(I2C(v_smbus), address) for address in (0x20, 0x21)]
+
+    scanner = InputScanner()
+    for board in boards:
+        scanner.add_board(board, mask=0xFF0F)
+
+    seen = []
+    scanner.add_callback(seen.append)
+
+    # the reference sample
+    assert scanner.scan_once() == 0
+
+    v_smbus.drive_pin(0x20, 1, True)
+    v_smbus.drive_pin(0x21, 9, True)
+    # outside the mask
+    v_smbus.drive_pin(0x21, 4, True)
+    assert scanner.scan_once() == 2
+
+    v_smbus.drive_pin(0x20, 1, False)
+    assert scanner.scan_once() == 1
+    assert scanner.scan_once() == 0
+
+    events = [scanner.events.get_nowait() for _ in range(3)]
+    assert events == seen
+    assert [(e.board, e.gpio, e.old, e.new) for e in events] == [
+        (boards[0], 1, False, True),
+        (boards[1], 9, False, True),
+        (boards[0], 1, True, False),
+    ]
+
+
+def test_scanner_thread():
+    v_smbus = EmulatedSMBusMCP23017(1)
+    board = MCP23017(I2C(v_smbus), 0x20)
+
+    scanner = InputScanner(rate_hz=500)
+    scanner.add_board(board)
+    scanner.start()
+
+    while scanner.scans < 1:
+        time.sleep(0.001)
+    v_smbus.drive_pin(0x20, 15, True)
+
+    event = scanner.events.get(timeout=5)
+    scanner.stop()
+
+    assert (event.gpio, event.old, event.new) == (15, False, True)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import threading
+
+import pytest
+
+from mcp23017.emulated_smbus import EmulatedSMBus
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.scheduler import BusScheduler, READ, WRITE
+
+
+class RecordingSMBus(EmulatedSMBus):
+    """keeps the order of the writes"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writes = []
+
+    def write_byte_data(self, address, register, value):
+        self.writes.append((address, register, value))
+        super().write_byte_data(address, register, value)
+
+
+def test_scheduler_coalesces_writes():
+    v_smbus = RecordingSMBus(1)
+    scheduler = BusScheduler(I2C(v_smbus))
+
+    gpio_a = MCP23017.Consts.Register.GPIO[0]
+    futures = [
+        scheduler.submit(WRITE, 0x20, gpio_a, value) for value in range(5)
+    ]
+    assert scheduler.coalesced == 4
+
+    # a read in between keeps the next write apart
+    read = scheduler.submit(READ, 0x20, gpio_a)
+    futures.append(scheduler.submit(WRITE, 0x20, gpio_a, 0xAA))
+
+    assert scheduler.dispatch_pending() == 3
+    assert v_smbus.writes == [(0x20, gpio_a, 4), (0x20, gpio_a, 0xAA)]
+    assert read.result() == 4
+    assert all(future.done() for future in futures)
+
+
+def test_scheduler_round_robin_and_priority():
+    v_smbus = RecordingSMBus(1)
+    scheduler = BusScheduler(I2C(v_smbus), coalesce_registers=())
+
+    for address in (0x20, 0x21):
+        for value in range(3):
+            scheduler.submit(WRITE, address, 0x00, value)
+    scheduler.submit(WRITE, 0x22, 0x00, 0xFF, priority=-1)
+
+    scheduler.dispatch_pending()
+    assert [(a, v) for a, _, v in v_smbus.writes] == [
+        (0x22, 0xFF),
+        (0x20, 0), (0x21, 0), (0x20, 1), (0x21, 1), (0x20, 2), (0x21, 2),
+    ]
+
+
+def test_boards_through_scheduler():
+    with BusScheduler(I2C(EmulatedSMBus(1))) as scheduler:
+        boards = [
+            MCP23017(scheduler.client(), address)
+            for address in range(0x20, 0x28)
+        ]
+
+        def toggle(board):
+            for gpio in board.Consts.IO.all_constants.values():
+                board.gpio_digital_write(gpio, True)
+
+        threads = [threading.Thread(target=toggle, args=(b,)) for b in boards]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for board in boards:
+            assert board.gpio_digital_read_all() == [0xFF, 0xFF]
+
+
+def test_scheduled_update_bits():
+    with BusScheduler(I2C(EmulatedSMBus(1))) as scheduler:
+        client = scheduler.client()
+        client.write(0x20, 0x14, 0xF0)
+
+        with client.transaction(0x20):
+            assert client.update_bits(0x20, 0x14, 0x0F, 0x05) == 0xF5
+        assert client.read(0x20, 0x14) == 0xF5
+
+
+def test_cancelled_operations_and_stop():
+    v_smbus = RecordingSMBus(1)
+    scheduler = BusScheduler(I2C(v_smbus), coalesce_registers=())
+
+    cancelled = scheduler.submit(WRITE, 0x20, 0x00, 0x01)
+    read = scheduler.submit(READ, 0x20, 0x00)
+    assert cancelled.cancel()
+
+    # the worker survives the cancelled future and runs the rest
+    scheduler.start()
+    assert read.result(timeout=5) == 0
+    assert v_smbus.writes == []
+
+    scheduler.stop()
+    with pytest.raises(RuntimeError):
+        scheduler.submit(READ, 0x20, 0x00)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+import time
+
+from mcp23017.bus_timing import VirtualClock
+from mcp23017.emulated_smbus import EmulatedSMBusMCP23017
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.sequencer import SequencePlayer
+
+
+class RecordingI2C(I2C):
+    """keeps the GPIO writes with the time they happened"""
+    def __init__(self, smbus, clock):
+        super().__init__(smbus)
+        self.clock = clock
+        self.gpio_writes = []
+
+    def write(self, address, register, value, retry=0):
+        self.gpio_writes.append((self.clock.now(), register, value))
+        super().write(address, register, value, retry)
+
+    def write_block(self, address, register, values, retry=0):
+        self.gpio_writes.append((self.clock.now(), register, list(values)))
+        super().write_block(address, register, values, retry)
+
+
+def make_player(clock, **kwargs):
+    i2c = RecordingI2C(EmulatedSMBusMCP23017(1), clock)
+    board = MCP23017(i2c, 0x20, shadow_registers=True)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+    i2c.gpio_writes.clear()
+    return i2c, board, SequencePlayer(
+        board, tick_s=0.01, clock=clock.now, sleep=clock.sleep, **kwargs
+    )
+
+
+def test_changes_in_a_tick_are_one_write():
+    clock = VirtualClock()
+    i2c, board, player = make_player(clock)
+
+    io = board.Consts.IO
+    player.add_sequence(io.GPA0, [(0.001, True), (0.05, False)])
+    player.add_sequence(io.GPB7, [(0.004, True)])
+    player.add_sequence(io.GPA1, [(0.009, True), (0.0095, False)])
+
+    player.run_until(0.02)
+    # all of them went out at the 10 ms tick, both banks in one write
+    assert i2c.gpio_writes == [(0.01, 0x12, [0x01, 0x80])]
+    assert board.read_port() == 0x8001
+
+    player.run_until(0.1)
+    assert [t for t, *_ in i2c.gpio_writes] == [0.01, 0.05]
+    assert board.read_port() == 0x8000
+    assert player.missed == 0
+    assert player.max_jitter_s == 0.0
+
+
+def test_blink_loops():
+    clock = VirtualClock()
+    i2c, board, player = make_player(clock)
+
+    player.blink(board.Consts.IO.GPA2, period_s=0.1, duty=0.3)
+    player.run_until(0.45)
+
+    states = [value for _, _, value in i2c.gpio_writes]
+    assert len(states) == 10
+    assert states[:4] == [0x04, 0x00, 0x04, 0x00]
+
+
+def test_missed_deadlines_are_counted():
+    clock = VirtualClock()
+    i2c, board, player = make_player(clock)
+
+    player.add_sequence(board.Consts.IO.GPA0, [(0.0, True)])
+    clock.advance(0.025)
+    assert player.run_pending(player.next_deadline())
+    assert player.missed == 1
+    assert abs(player.max_jitter_s - 0.025) < 1e-9
+
+
+def test_thread_plays_in_real_time():
+    board = MCP23017(I2C(EmulatedSMBusMCP23017(1)), 0x20)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+    player = SequencePlayer(board, tick_s=0.005)
+
+    player.start()
+    player.add_sequence(board.Consts.IO.GPB0, [(0.01, True)])
+    time.sleep(0.1)
+    player.stop()
+
+    assert board.read_port() == 0x0100
+    assert player.writes == 1
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+from mcp23017.emulated_smbus import EmulatedSMBus
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.stats import BusStats, HISTOGRAM_BUCKETS, histogram_bucket
+
+
+class FirstWriteLostSMBus(EmulatedSMBus):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lost = False
+
+    def write_byte_data(self, address, register, value):
+        if not self.lost:
+            self.lost = True
+            return
+        super().write_byte_data(address, register, value)
+
+
+def test_histogram_bucket():
+    assert histogram_bucket(0) == 0
+    assert histogram_bucket(1e-6) == 1
+    assert histogram_bucket(3e-6) == 2
+    assert histogram_bucket(1000) == HISTOGRAM_BUCKETS - 1
+
+
+def test_stats_per_board_and_register():
+    stats = BusStats()
+    i2c = I2C(FirstWriteLostSMBus(1), stats=stats)
+    boards = [MCP23017(i2c, address, time_between_retries_ms=0)
+              for address in (0x20, 0x21)]
+
+    olat_b = MCP23017.Consts.Register.OLAT[1]
+    gpio_a = MCP23017.Consts.Register.GPIO[0]
+
+    boards[0].write(olat_b, 0x5A)
+    boards[1].gpio_digital_read_all()
+
+    snapshot = stats.snapshot()
+    first = snapshot["addresses"][0x20]["registers"][olat_b]
+    assert (first["writes"], first["reads"], first["bytes_written"]) == (2, 2, 2)
+    assert (first["retries"], first["verify_failures"], first["failed_writes"]) \
+        == (1, 1, 0)
+    assert sum(first["histogram"]) == 4
+
+    second = snapshot["addresses"][0x21]
+    assert second["registers"][gpio_a]["bytes_read"] == 2
+    assert second["total"]["reads"] == 1
+
+    assert snapshot["total"]["reads"] == 3
+    assert snapshot["total"]["writes"] == 2
+
+    stats.reset()
+    assert stats.snapshot()["addresses"] == {}
+
+
+class StuckSMBus(EmulatedSMBus):
+    def write_byte_data(self, address, register, value):
+        pass
+
+
+def test_retries_and_verify_failures():
+    stats = BusStats()
+    board = MCP23017(
+        I2C(StuckSMBus(1), stats=stats), 0x20,
+        write_retries=2, time_between_retries_ms=0,
+    )
+    olat_a = MCP23017.Consts.Register.OLAT[0]
+
+    try:
+        board.write(olat_a, 0x01)
+    except IOError:
+        pass
+    counters = stats.snapshot()["addresses"][0x20]["registers"][olat_a]
+    assert (counters["retries"], counters["verify_failures"],
+            counters["failed_writes"], counters["writes"]) == (2, 3, 1, 3)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+from mcp23017.emulated_smbus import EmulatedSMBus
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.tracer import Tracer, READ, WRITE, READ_BLOCK
+
+
+class FirstWriteLostSMBus(EmulatedSMBus):
+    """the first write does not make it"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lost = False
+
+    def write_byte_data(self, address, register, value):
+        if not self.lost:
+            self.lost = True
+            return
+        super().write_byte_data(address, register, value)
+
+
+def test_tracer_ring_buffer():
+    tracer = Tracer(capacity=4, clock=iter(range(100)).__next__)
+
+    tracer.enabled = False
+    tracer.record(0x20, 0x12, 1, WRITE)
+    assert tracer.entries() == []
+
+    tracer.enabled = True
+    for value in range(6):
+        tracer.record(0x20, 0x12, value, WRITE)
+
+    assert tracer.recorded == 6
+    assert [e.value for e in tracer.entries()] == [2, 3, 4, 5]
+    assert [e.timestamp for e in tracer.entries()] == [2, 3, 4, 5]
+
+    tracer.clear()
+    assert tracer.entries() == []
+
+
+def test_tracer_records_board_traffic_and_retries():
+    tracer = Tracer(clock=lambda: 0.0)
+    board = MCP23017(
+        I2C(FirstWriteLostSMBus(1), tracer=tracer), 0x20,
+        time_between_retries_ms=0,
+    )
+
+    board.write(board.Consts.Register.OLAT[1], 0x5A)
+    board.gpio_digital_read_all()
+
+    assert [
+        (e.direction, e.register, e.value, e.retry) for e in tracer.entries()
+    ] == [
+        (WRITE, 0x15, 0x5A, 0),
+        (READ, 0x15, 0x00, 0),
+        (WRITE, 0x15, 0x5A, 1),
+        (READ, 0x15, 0x5A, 0),
+        (READ_BLOCK, 0x12, 0x00, 0),
+        (READ_BLOCK, 0x12, 0x00, 0),
+    ]
+
+    lines = tracer.decode().splitlines()
+    assert len(lines) == 6
+    assert lines[2].split()[1:] == ["W", "0x20", "0x15", "0x5a", "retry", "1"]
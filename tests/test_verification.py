@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import time
+
+import pytest
+from mcp23017.async_i2c import AsyncI2C
+from mcp23017.async_mcp23017 import AsyncMCP23017
+from mcp23017.emulated_smbus import EmulatedSMBus
+from mcp23017.i2c import I2C
+from mcp23017.mcp23017 import MCP23017
+from mcp23017.verification import (
+    Backoff, BackgroundReconcile, DeferredVerify, VerifyEveryNth, VerifyNever,
+    WriteCheck,
+)
+
+
+class ReadCountingI2C(I2C):
+    def __init__(self, smbus):
+        super().__init__(smbus)
+        self.reads = 0
+
+    def read(self, address, register=None):
+        self.reads += 1
+        return super().read(address, register)
+
+    def read_block(self, address, register, length):
+        self.reads += 1
+        return super().read_block(address, register, length)
+
+
+def test_backoff():
+    fixed = Backoff(10)
+    assert [fixed.delay(n) for n in range(3)] == [0.01, 0.01, 0.01]
+
+    growing = Backoff(1, factor=2, max_ms=5)
+    assert [growing.delay(n) for n in range(5)] == [
+        0.001, 0.002, 0.004, 0.005, 0.005
+    ]
+
+    jittered = Backoff(10, jitter=0.5, seed=1)
+    assert all(0.005 <= jittered.delay(0) <= 0.01 for _ in range(100))
+    assert [Backoff(10, jitter=0.5, seed=1).delay(0) for _ in range(2)] \
+        == [Backoff(10, jitter=0.5, seed=1).delay(0)] * 2
+
+    with pytest.raises(ValueError):
+        Backoff(jitter=2)
+
+
+def test_verify_never_and_every_nth():
+    i2c = ReadCountingI2C(EmulatedSMBus(1))
+    board = MCP23017(i2c, 0x20, verification=VerifyNever())
+
+    board.write(board.Consts.Register.GPIO[0], 0x12)
+    assert i2c.reads == 0
+
+    board = MCP23017(i2c, 0x21, verification=VerifyEveryNth(3))
+    for _ in range(6):
+        board.write(board.Consts.Register.OLAT[0], 0x12)
+    assert i2c.reads == 2
+
+    # the old flag still works
+    board = MCP23017(i2c, 0x22, check_write=False)
+    board.write(board.Consts.Register.GPIO[0], 0x12)
+    assert i2c.reads == 2
+
+
+def test_deferred_verify_fixes_bugged_writes():
+    board = MCP23017(
+        I2C(EmulatedSMBus(1, bugged=True)), 0x23, shadow_registers=True,
+        verification=DeferredVerify(Backoff(0)),
+    )
+
+    for gpio in board.Consts.IO.all_constants.values():
+        board.gpio_digital_write(gpio, gpio % 2)
+
+    board.verify_pending()
+    assert board.gpio_digital_read_all() == [0b10101010, 0b10101010]
+
+
+def test_background_reconcile():
+    policy = BackgroundReconcile(interval_s=0.01, backoff=Backoff(0))
+    board = MCP23017(
+        I2C(EmulatedSMBus(1, bugged=True)), 0x24, verification=policy
+    )
+
+    board.gpio_digital_write_all(True)
+
+    deadline = time.monotonic() + 5
+    while board.gpio_digital_read_all() != [0xFF, 0xFF]:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    policy.stop()
+
+
+def test_deferred_policies_stay_with_one_board():
+    i2c = I2C(EmulatedSMBus(1))
+    policy = DeferredVerify()
+    MCP23017(i2c, 0x20, verification=policy)
+    with pytest.raises(RuntimeError):
+        MCP23017(i2c, 0x21, verification=policy)
+
+    async_i2c = AsyncI2C(EmulatedSMBus(1))
+    with pytest.raises(TypeError):
+        AsyncMCP23017(async_i2c, 0x20, verification=BackgroundReconcile())
+    async_i2c.close()
+
+
+class RacedDeferredVerify(DeferredVerify):
+    """a newer write lands right after the checks were taken"""
+
+    def __init__(self, smbus, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.smbus = smbus
+
+    def take_pending(self):
+        pending = super().take_pending()
+        self.smbus.write_byte_data(0x20, 0x14, 0x02)
+        self.verify_now(WriteCheck((0x14,), (0x02,)))
+        return pending
+
+
+def test_superseded_checks_are_dropped():
+    smbus = EmulatedSMBus(1)
+    board = MCP23017(
+        I2C(smbus), 0x20, verification=RacedDeferredVerify(smbus, Backoff(0)),
+    )
+    board.write(0x14, 0x01)
+
+    # the check of 0x01 must not write over the newer 0x02
+    board.verify_pending()
+    assert smbus.read_byte_data(0x20, 0x14) == 0x02
@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
 
+import errno
 import logging
 import random
+import threading
+import time
 
 from typing import List
 
 import pytest
-from mcp23017.emulated_smbus import EmulatedSMBus
+from mcp23017.bus_timing import VirtualClock
+from mcp23017.emulated_smbus import EmulatedSMBus, EmulatedSMBusMCP23017
 from mcp23017.i2c import I2C
 from mcp23017.mcp23017 import MCP23017
 
@@ -149,3 +153,470 @@ def test_multiple_gpio_toggle_patterns(v_smbus):
             assert board.gpio_digital_read(gpio) is False
 
         assert board.gpio_digital_read_all() == expected_state, "State mismatch after setting GPIOs OFF"
+
+
+class CountingI2C(I2C):
+    """counts the transactions that hit the bus"""
+    def __init__(self, smbus):
+        super().__init__(smbus)
+        self.reads = 0
+        self.writes = 0
+
+    def read(self, address, register=None):
+        self.reads += 1
+        return super().read(address, register)
+
+    def write(self, address, register, value, retry=0):
+        self.writes += 1
+        super().write(address, register, value, retry)
+
+    def read_block(self, address, register, length):
+        self.reads += 1
+        return super().read_block(address, register, length)
+
+    def write_block(self, address, register, values, retry=0):
+        self.writes += 1
+        super().write_block(address, register, values, retry)
+
+
+@pytest.mark.parametrize("v_smbus", gen_smbusss())
+def test_shadowed_board_digital_write(v_smbus):
+    i2c = I2C(v_smbus)
+    board = MCP23017(i2c, 0x24, shadow_registers=True)
+
+    for io_name, gpio in board.Consts.IO.all_constants.items():
+        board.gpio_digital_write(gpio, True)
+        assert board.gpio_digital_read(gpio) is True, io_name
+
+        board.gpio_digital_write(gpio, False)
+        assert board.gpio_digital_read(gpio) is False, io_name
+
+
+def test_shadow_cuts_bus_reads():
+    i2c = CountingI2C(EmulatedSMBus(1))
+    board = MCP23017(i2c, 0x25, shadow_registers=True)
+
+    # fills the shadow for the latch and the mask
+    board.gpio_digital_write(board.Consts.IO.GPA0, True)
+
+    i2c.reads = i2c.writes = 0
+    board.gpio_digital_write(board.Consts.IO.GPA1, True)
+
+    # the write and the read to verify it
+    assert (i2c.writes, i2c.reads) == (1, 1)
+    assert board.read(board.Consts.Register.OLAT[0]) == 0b11
+
+
+def test_shadow_invalidate_and_resync():
+    v_smbus = EmulatedSMBus(1)
+    board = MCP23017(I2C(v_smbus), 0x26, shadow_registers=True)
+
+    iodir_a = board.Consts.Register.IODIR[0]
+    board.write(iodir_a, 0x0F)
+
+    # someone else changes the board behind our back
+    v_smbus.write_byte_data(0x26, iodir_a, 0xF0)
+    assert board.read(iodir_a) == 0x0F
+
+    board.invalidate_shadow(iodir_a)
+    assert board.read(iodir_a) == 0xF0
+
+    v_smbus.write_byte_data(0x26, iodir_a, 0x33)
+    board.resync_shadow()
+    assert board.read(iodir_a) == 0x33
+
+
+class StuckGPIOSMBus(EmulatedSMBus):
+    """the latch takes the writes, but GPIO reads back a stuck 0"""
+    fail_writes = False
+
+    def write_byte_data(self, address, register, value):
+        super().write_byte_data(address, register, value)
+        if register == 0x12:
+            self._write_byte(address, 0x14, value)
+            self._write_byte(address, 0x12, 0)
+
+    def write_i2c_block_data(self, address, register, data):
+        if self.fail_writes:
+            raise OSError("NACK")
+        super().write_i2c_block_data(address, register, data)
+
+
+def test_failed_writes_forget_the_latch_shadow():
+    smbus = StuckGPIOSMBus(1)
+    board = MCP23017(
+        I2C(smbus), 0x20, shadow_registers=True, write_retries=2,
+        time_between_retries_ms=0,
+    )
+    board.write_pair(board.Consts.Register.IODIR, [0, 0])
+    board.write_pair(board.Consts.Register.OLAT, [0, 0])
+    assert board.read(0x14) == 0
+
+    # the write made it into the latch, its check did not pass
+    with pytest.raises(IOError):
+        board.gpio_digital_write(0, True)
+    assert board.read(0x14) == 0x01
+
+    board.read(0x15)
+    smbus.fail_writes = True
+    with pytest.raises(IOError):
+        board.write_pair(board.Consts.Register.OLAT, [0xFF, 0xFF])
+    assert 0x15 not in board._shadow
+
+
+def test_all_calls_use_one_transaction_per_pair():
+    i2c = CountingI2C(EmulatedSMBus(1))
+    board = MCP23017(i2c, 0x27)
+
+    assert board.gpio_digital_read_all() == [0, 0]
+    assert (i2c.writes, i2c.reads) == (0, 1)
+
+    i2c.reads = 0
+    assert board.get_gpio_mode_all() == [0, 0]
+    assert i2c.reads == 1
+
+    i2c.reads = 0
+    board.gpio_digital_write_all(True)
+    # write, read back GPIO and read the IODIR mask
+    assert (i2c.writes, i2c.reads) == (1, 2)
+    assert board.gpio_digital_read_all() == [0xFF, 0xFF]
+
+
+@pytest.mark.parametrize("v_smbus", gen_smbusss())
+def test_write_port(v_smbus):
+    board = MCP23017(I2C(v_smbus), 0x29)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+
+    board.write_port(0x8421, 0xFFFF)
+    assert board.read_port() == 0x8421
+    board.write_port(0x0F0F, 0x0A05)
+    assert board.read_port() == 0x8A25
+    # one bank only
+    board.write_port(0x00FF, 0x0000)
+    assert board.read_port() == 0x8A00
+
+
+def test_write_port_transactions():
+    i2c = CountingI2C(EmulatedSMBus(1))
+    board = MCP23017(i2c, 0x2A, shadow_registers=True)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+
+    i2c.reads = i2c.writes = 0
+    # five pins over both banks: one write and the read to verify it
+    board.write_port(0b1000_0011_0000_0101, 0b1000_0001_0000_0100)
+    assert (i2c.writes, i2c.reads) == (1, 1)
+    assert board.read_port() == 0b1000_0001_0000_0100
+
+
+def test_write_all_ignores_inputs():
+    board = MCP23017(I2C(EmulatedSMBus(1)), 0x28, write_retries=2)
+
+    board.write(board.Consts.Register.IODIR[1], board.Consts.INPUT)
+
+    # the inputs never take the value, that must not count as a failed write
+    board.gpio_digital_write_all(True)
+    assert board.gpio_digital_read_all()[0] == 0xFF
+
+
+def test_precomputed_lookup_tables():
+    register = MCP23017.Consts.Register
+
+    for name, registers in register.all_constants.items():
+        for index, reg in enumerate(registers):
+            assert register.get_register_and_index(reg) == (name, index)
+            assert register.get_all_registers_and_index(reg) == [(name, index)]
+
+    with pytest.raises(ValueError):
+        register.get_register_and_index(0x16)
+
+    assert register.mask_lookup == dict(zip(register.GPIO, register.IODIR))
+
+    for pin in MCP23017.Consts.IO.all_constants.values():
+        assert MCP23017.Consts.IO.pin_lookup[pin] == (
+            pin // 8, pin % 8, MCP23017.bitmask(pin)
+        )
+
+
+def test_validation_off():
+    board = MCP23017(I2C(EmulatedSMBus(1)), 0x29, validate=False)
+    checked_board = MCP23017(I2C(EmulatedSMBus(1)), 0x29)
+
+    board.gpio_digital_write(board.Consts.IO.GPB3, True)
+    assert board.gpio_digital_read(board.Consts.IO.GPB3) is True
+
+    with pytest.raises(TypeError):
+        checked_board.get_register_gpio_tuple(board.Consts.Register.GPIO, 16)
+    with pytest.raises(ValueError):
+        checked_board.write(0x30, 0)
+
+
+class SlowSMBus(EmulatedSMBus):
+    """
+    lets other threads in between the reads and writes of a
+    read-modify-write
+    """
+
+    def read_byte_data(self, adr, reg):
+        value = super().read_byte_data(adr, reg)
+        time.sleep(0)
+        return value
+
+
+def test_update_bits():
+    i2c = I2C(EmulatedSMBus(1))
+    i2c.write(0x20, 0x14, 0xF0)
+
+    assert i2c.update_bits(0x20, 0x14, 0x0F, 0x05) == 0xF5
+    assert i2c.update_bits(0x20, 0x14, 0x80, 0x00) == 0x75
+    assert i2c.read(0x20, 0x14) == 0x75
+
+
+def test_threads_toggling_one_port():
+    board = MCP23017(I2C(SlowSMBus(1)), 0x20, check_write=False)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+
+    def toggle(gpio):
+        for n in range(50):
+            board.gpio_digital_write(gpio, n % 2 == 0)
+        board.gpio_digital_write(gpio, True)
+
+    threads = [threading.Thread(target=toggle, args=(gpio,)) for gpio in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert board.gpio_digital_read_all()[0] == 0xFF
+
+
+class GatedSMBus(EmulatedSMBus):
+    """holds every register read until :gate: is set"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+        self.reads = 0
+
+    def read_byte_data(self, adr, reg):
+        self.reads += 1
+        self.entered.set()
+        self.gate.wait()
+        return super().read_byte_data(adr, reg)
+
+
+def test_coalesced_reads():
+    smbus = GatedSMBus(1)
+    smbus.write_byte_data(0x20, 0x12, 0x5A)
+    i2c = I2C(smbus, coalesce=True)
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(i2c.read(0x20, 0x12)))
+    first.start()
+    smbus.entered.wait()
+
+    # these come while the first read is on the bus
+    others = [
+        threading.Thread(target=lambda: results.append(i2c.read(0x20, 0x12)))
+        for _ in range(4)
+    ]
+    for thread in others:
+        thread.start()
+    while i2c.coalesced < 4:
+        time.sleep(0.001)
+    smbus.gate.set()
+    for thread in [first] + others:
+        thread.join()
+
+    assert results == [0x5A] * 5
+    assert smbus.reads == 1
+
+    # nothing in flight, no window: a new read
+    assert i2c.read(0x20, 0x12) == 0x5A
+    assert smbus.reads == 2
+
+
+def test_coalesce_window_and_writes():
+    smbus = GatedSMBus(1)
+    smbus.gate.set()
+    i2c = I2C(smbus, coalesce=True, coalesce_window_s=60)
+
+    assert i2c.read(0x20, 0x14) == 0
+    assert i2c.read(0x20, 0x14) == 0
+    assert smbus.reads == 1
+
+    # a write to the board ends the window
+    i2c.write(0x20, 0x15, 0x01)
+    i2c.write(0x20, 0x14, 0x33)
+    assert i2c.read(0x20, 0x14) == 0x33
+    assert smbus.reads == 2
+
+
+def test_max_age_reads():
+    clock = VirtualClock()
+    v_smbus = EmulatedSMBusMCP23017(1)
+    i2c = I2C(v_smbus)
+    board = MCP23017(i2c, 0x20, clock=clock.now)
+    reads = []
+    i2c_read_block = i2c.read_block
+    i2c_read = i2c.read
+    i2c.read_block = lambda *a: reads.append(a) or i2c_read_block(*a)
+    i2c.read = lambda *a: reads.append(a) or i2c_read(*a)
+
+    v_smbus.drive_pin(0x20, 3, True)
+    # reads without a max_age are not cached
+    assert board.read_port() == 0x0008
+    assert board.read_port(max_age=0.005) == 0x0008
+    assert len(reads) == 2
+
+    # the pin changes, but a cached value is good enough
+    v_smbus.drive_pin(0x20, 3, False)
+    clock.advance(0.004)
+    assert board.read_port(max_age=0.005) == 0x0008
+    assert board.gpio_digital_read(3, max_age=0.005)
+    assert len(reads) == 2
+
+    # too old
+    clock.advance(0.002)
+    assert not board.gpio_digital_read(3, max_age=0.005)
+    assert len(reads) == 3
+    # only bank A was read again
+    assert board.read_port(max_age=0.005) == 0
+    assert len(reads) == 4
+
+    # writes that change the pins drop the bank
+    board.gpio_digital_read_all(max_age=1)
+    n = len(reads)
+    board.write(board.Consts.Register.GPPU[1], 0xFF, check_register=False)
+    board.gpio_digital_read(0, max_age=1)
+    assert len(reads) == n
+    assert board.read_port(max_age=1) == 0xFF00
+    assert len(reads) == n + 1
+
+    # so does reading the interrupt state
+    board.read_interrupt_state()
+    n = len(reads)
+    board.read_port(max_age=1)
+    assert len(reads) == n + 1
+
+
+class ReadDuringWriteSMBus(EmulatedSMBusMCP23017):
+    """lets someone read the board while a write is on the bus"""
+
+    on_write = None
+
+    def write_byte_data(self, address, register, value):
+        if self.on_write is not None:
+            on_write, self.on_write = self.on_write, None
+            on_write()
+        super().write_byte_data(address, register, value)
+
+
+def test_reads_during_a_write_are_not_cached():
+    v_smbus = ReadDuringWriteSMBus(1)
+    board = MCP23017(I2C(v_smbus), 0x20)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+
+    v_smbus.on_write = lambda: board.read_port(max_age=60)
+    board.gpio_digital_write(0, True)
+    assert board.read_port(max_age=60) == 0x0001
+
+
+class BlockRecordingSMBus(EmulatedSMBusMCP23017):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.blocks = []
+        self.olat_a = []
+
+    def write_i2c_block_data(self, address, register, data):
+        self.blocks.append((register, list(data)))
+        super().write_i2c_block_data(address, register, data)
+
+    def _write_register(self, address, chip, register, value):
+        if register == 0x14:
+            self.olat_a.append(value)
+        super()._write_register(address, chip, register, value)
+
+
+@pytest.mark.parametrize("shadow", [False, True])
+def test_stream_port(shadow):
+    smbus = BlockRecordingSMBus(1)
+    board = MCP23017(I2C(smbus), 0x20, shadow_registers=shadow)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+    board.write_port(0xFF00, 0x5A00)
+    smbus.blocks.clear()
+    smbus.olat_a.clear()
+
+    pattern = bytes(range(40))
+    assert board.stream_port(0, memoryview(pattern)) == 3
+
+    # 16 + 16 + 8 values, GPB keeps its value in between
+    assert [len(data) for _, data in smbus.blocks] == [31, 31, 15]
+    assert all(register == 0x14 for register, _ in smbus.blocks)
+    assert all(data[1::2] == [0x5A] * (len(data) // 2) for _, data in smbus.blocks)
+    assert smbus.olat_a == list(pattern)
+
+    # IOCON is back, GPB was not touched
+    assert board.read(0x0A, use_shadow=False) == 0
+    assert board.read_port() == 0x5A27
+
+
+class FailingBlockSMBus(BlockRecordingSMBus):
+    """fails after a block write once :fail_after: of them went through"""
+
+    fail_after = None
+
+    def write_i2c_block_data(self, address, register, data):
+        super().write_i2c_block_data(address, register, data)
+        if len(self.blocks) == self.fail_after:
+            raise OSError(errno.EIO, "emulated failure")
+
+
+def test_stream_port_failure_forgets_the_latch():
+    smbus = FailingBlockSMBus(1)
+    board = MCP23017(I2C(smbus), 0x20, shadow_registers=True)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+    board.write(0x14, 0x00)
+    smbus.blocks.clear()
+    smbus.fail_after = 2
+
+    with pytest.raises(OSError):
+        board.stream_port(0, bytes(range(1, 41)))
+    # the stream stopped after 32 values, the board knows it does not know
+    assert board.read(0x14) == 32
+    assert board.read(0x0A, use_shadow=False) == 0
+
+
+class DeadAfterBlockSMBus(FailingBlockSMBus):
+    """after the failed block nothing can be written anymore"""
+
+    def write_byte_data(self, address, register, value):
+        if self.fail_after is not None and len(self.blocks) >= self.fail_after:
+            raise OSError(errno.EIO, "bus is dead")
+        super().write_byte_data(address, register, value)
+
+
+def test_stream_port_failure_keeps_its_error():
+    smbus = DeadAfterBlockSMBus(1)
+    board = MCP23017(I2C(smbus), 0x20, shadow_registers=True)
+    board.set_gpio_mode_all(board.Consts.OUTPUT)
+    assert board.read(0x0A) == 0
+    smbus.blocks.clear()
+    smbus.fail_after = 1
+
+    with pytest.raises(OSError, match="emulated failure"):
+        board.stream_port(0, bytes(range(40)))
+    # IOCON could not be put back, the shadow does not claim it was
+    assert board.read(0x0A) == 1 << board.Consts.SettingBit.SEQOP
+
+
+def test_stream_port_inverted_and_in_byte_mode():
+    smbus = EmulatedSMBus(1)
+    board = MCP23017(I2C(smbus), 0x20, invert_io=True)
+    # byte mode already, it stays like that
+    board.write(0x0A, 0x20)
+
+    assert board.stream_port(1, b"\x01\x02\x03", chunk=2) == 3
+    assert smbus.read_byte_data(0x20, 0x15) == 0xFC
+    assert board.read(0x0A) == 0x20
+    assert board.stream_port(1, b"") == 0
@@ -2,7 +2,9 @@
 
 import random
 
-from mcp23017.emulated_smbus import EmulatedSMBus
+import pytest
+
+from mcp23017.emulated_smbus import EmulatedSMBus, EmulatedSMBusMCP23017
 from mcp23017.i2c import I2C
 
 
@@ -39,3 +41,122 @@ def test_virtual_smbus_read_write():
     for i, ii in data.items():
         for j in ii:
             assert ii[j] == v_smbus.read_byte_data(i, j)
+
+
+def test_virtual_smbus_block_access():
+    v_smbus = EmulatedSMBus(1, bugged=False)
+
+    v_smbus.write_i2c_block_data(0x20, 0x12, [0xAB, 0xCD])
+    assert v_smbus.read_byte_data(0x20, 0x12) == 0xAB
+    assert v_smbus.read_byte_data(0x20, 0x13) == 0xCD
+    assert v_smbus.read_i2c_block_data(0x20, 0x12, 2) == [0xAB, 0xCD]
+
+
+def test_virtual_smbus_block_access_byte_mode():
+    v_smbus = EmulatedSMBus(1, bugged=False)
+
+    # IOCON.SEQOP makes the pointer toggle between the A/B pair
+    v_smbus.write_byte_data(0x20, 0x0A, 1 << 5)
+    v_smbus.write_i2c_block_data(0x20, 0x14, [1, 2, 3, 4])
+
+    assert v_smbus.read_i2c_block_data(0x20, 0x14, 3) == [3, 4, 3]
+    assert v_smbus.read_byte_data(0x20, 0x16) == 0
+
+
+def test_chip_gpio_olat_iodir_ipol():
+    chip = EmulatedSMBusMCP23017(1)
+
+    # power on, all inputs and nothing driven
+    assert chip.read_byte_data(0x20, 0x00) == 0xFF
+    assert chip.read_byte_data(0x20, 0x12) == 0x00
+
+    # GPIO writes go to OLAT, only the outputs show it
+    chip.write_byte_data(0x20, 0x00, 0xF0)
+    chip.write_byte_data(0x20, 0x12, 0xFF)
+    assert chip.read_byte_data(0x20, 0x14) == 0xFF
+    assert chip.read_byte_data(0x20, 0x12) == 0x0F
+
+    # inputs are the outside levels, pulled up if not driven, IPOL inverts
+    chip.drive_pin(0x20, 4, True)
+    chip.write_byte_data(0x20, 0x0C, 1 << 5)
+    assert chip.read_byte_data(0x20, 0x12) == 0x3F
+    chip.write_byte_data(0x20, 0x02, 0xFF)
+    assert chip.read_byte_data(0x20, 0x12) == 0xCF
+    chip.release_pin(0x20, 4)
+    assert chip.read_byte_data(0x20, 0x12) == 0xDF
+
+
+def test_chip_iocon_and_bank1():
+    chip = EmulatedSMBusMCP23017(1)
+
+    # one IOCON at two addresses, bit 0 is not implemented
+    chip.write_byte_data(0x20, 0x0B, 0x21)
+    assert chip.read_byte_data(0x20, 0x0A) == 0x20
+
+    chip.write_byte_data(0x20, 0x14, 0xAA)
+    chip.write_byte_data(0x20, 0x15, 0xBB)
+
+    # with BANK=1 the ports are apart, IOCON moves to 0x05 and 0x15
+    chip.write_byte_data(0x20, 0x0A, 0x80)
+    assert chip.read_byte_data(0x20, 0x0A) == 0xAA
+    assert chip.read_byte_data(0x20, 0x1A) == 0xBB
+    assert chip.read_byte_data(0x20, 0x15) == 0x80
+    assert chip.registers(0x20)[0x0A] == 0x80
+
+    # sequential goes from OLATA to IODIRB
+    assert chip.read_i2c_block_data(0x20, 0x09, 3) == [0x00, 0xAA, 0xFF]
+
+    # byte mode stays on the register
+    chip.write_byte_data(0x20, 0x05, 0x80 | 1 << 5)
+    assert chip.read_i2c_block_data(0x20, 0x0A, 3) == [0xAA] * 3
+
+    chip.write_byte_data(0x20, 0x15, 0x00)
+    assert chip.read_byte_data(0x20, 0x14) == 0xAA
+
+
+def test_chip_sequential_wraps_and_pointer():
+    chip = EmulatedSMBusMCP23017(1)
+
+    chip.write_i2c_block_data(0x20, 0x14, [1, 2, 3])
+    # OLATB wraps to IODIRA
+    assert chip.read_byte_data(0x20, 0x00) == 3
+    # read_byte reads where the last transfer left the pointer
+    assert chip.read_byte(0x20) == 0xFF
+
+
+def test_chip_interrupts():
+    chip = EmulatedSMBusMCP23017(1)
+    fired = []
+    chip.connect_interrupt(0x20, fired.append)
+
+    # read only
+    chip.write_byte_data(0x20, 0x0E, 0xFF)
+    assert chip.read_byte_data(0x20, 0x0E) == 0
+
+    chip.write_byte_data(0x20, 0x05, 0x01)
+    chip.drive_pin(0x20, 8, True)
+    assert fired == [0x20]
+    assert chip.interrupt_active(0x20, 1)
+    assert not chip.interrupt_active(0x20, 0)
+
+    # MIRROR puts it on both lines
+    chip.write_byte_data(0x20, 0x0A, 1 << 6)
+    assert chip.interrupt_active(0x20, 0)
+
+    assert chip.read_byte_data(0x20, 0x0F) == 0x01
+    chip.drive_pin(0x20, 8, False)
+    assert chip.read_byte_data(0x20, 0x11) == 0x01
+    assert not chip.interrupt_active(0x20)
+
+    # outputs do not interrupt
+    chip.write_byte_data(0x20, 0x01, 0x00)
+    chip.write_byte_data(0x20, 0x13, 0xFF)
+    assert not chip.interrupt_active(0x20)
+
+
+def test_chip_only_known_addresses_answer():
+    chip = EmulatedSMBusMCP23017(1, addresses=[0x20])
+
+    chip.write_byte_data(0x20, 0x00, 0x00)
+    with pytest.raises(OSError):
+        chip.read_byte_data(0x21, 0x00)